@@ -0,0 +1,75 @@
+import sys
+import time
+import wave
+import argparse
+from pathlib import Path
+
+# Make the videofactory package importable when running this script directly
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_DIR))
+
+from videofactory.editors._pcm import (  # noqa: E402
+    pcm_to_float,
+    trim_silence,
+    integrated_loudness,
+    normalize_loudness
+)
+
+
+def benchmark_file(wav_file: Path, target_lufs: float, threshold_db: float, repeats: int):
+    with wave.open(str(wav_file), 'rb') as f:
+        channels, sampwidth, framerate = f.getnchannels(), f.getsampwidth(), f.getframerate()
+        frames = f.readframes(f.getnframes())
+
+    samples = pcm_to_float(frames, channels, sampwidth)
+    loudness_before = integrated_loudness(samples, framerate)
+
+    # Time the whole pass (decode to float, trim, measure and apply gain)
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        processed = trim_silence(pcm_to_float(frames, channels, sampwidth), framerate, threshold_db=threshold_db)
+        processed = normalize_loudness(processed, framerate, target_lufs=target_lufs)
+    elapsed_time = (time.perf_counter() - start_time) / repeats
+
+    return {
+        'duration_before': len(samples) / framerate,
+        'duration_after': len(processed) / framerate,
+        'loudness_before': loudness_before,
+        'loudness_after': integrated_loudness(processed, framerate),
+        'elapsed_ms': elapsed_time * 1000,
+    }
+
+
+def main(input_dir: Path, target_lufs: float, threshold_db: float, repeats: int):
+    total_before = total_after = 0.0
+
+    print(f'{"file":<24}{"dur (s)":>16}{"loudness (LUFS)":>22}{"time (ms)":>12}')
+    for wav_file in sorted(input_dir.glob('*.wav')):
+        try:
+            result = benchmark_file(wav_file, target_lufs, threshold_db, repeats)
+        except (wave.Error, EOFError, ValueError) as e:
+            print(f'{wav_file.name:<24}skipped ({e})')
+            continue
+
+        total_before += result['duration_before']
+        total_after += result['duration_after']
+        print(f'{wav_file.name:<24}'
+              f'{result["duration_before"]:>7.2f} -> {result["duration_after"]:<6.2f}'
+              f'{result["loudness_before"]:>10.1f} -> {result["loudness_after"]:<8.1f}'
+              f'{result["elapsed_ms"]:>12.2f}')
+
+    if total_before:
+        print(f'\nTotal audio: {total_before:.2f}s -> {total_after:.2f}s '
+              f'({total_before - total_after:.2f}s trimmed, {100 * (1 - total_after / total_before):.1f}%)')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark silence trimming and loudness normalization.")
+    parser.add_argument("--input-dir", type=Path, default=PROJECT_DIR / 'examples',
+                        help="Directory containing the WAV files (default: examples)")
+    parser.add_argument("--target-lufs", type=float, default=-16.0, help="Target loudness in LUFS")
+    parser.add_argument("--threshold-db", type=float, default=-50.0, help="Silence threshold in dBFS")
+    parser.add_argument("--repeats", type=int, default=20, help="Number of timed repetitions per file")
+    args = parser.parse_args()
+
+    main(args.input_dir, args.target_lufs, args.threshold_db, args.repeats)
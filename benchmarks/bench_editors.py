@@ -0,0 +1,299 @@
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import contextlib
+from pathlib import Path
+
+# Make the videofactory package importable when running this script directly
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_DIR))
+
+from videofactory.editors._ffmpeg import FFmpegCommand, run_command  # noqa: E402
+from videofactory.editors.audio_editor import AudioEditor  # noqa: E402
+from videofactory.editors.video_editor import VideoEditor  # noqa: E402
+from videofactory.settings import get_settings  # noqa: E402
+
+# Editor primitives that are benchmarked, each on synthetic media of --duration seconds at --width x --height
+PRIMITIVES = (
+    'remove_d_id_watermark',
+    'merge_audio_files_with_fading_effects',
+    'add_watermark_text',
+    'join_videos',  # Segments that share their streams: joined without re-encoding
+    'join_videos_reencode',  # Segments with different audio: joined with the concat filter
+    'merge_audios_with_padding',
+    'burn_subtitle',
+    'merge_images',
+    'extract_last_frame',
+    'grab_first_frame',
+    'grab_last_frame',
+)
+
+# Number of TTS-like segments merged by merge_audios_with_padding
+AUDIO_SEGMENTS = 4
+
+
+# region Fixtures
+def make_video(output_path: Path, duration: float, width: int, height: int, pattern: str = 'testsrc2',
+               sample_rate: int = 44100) -> Path:
+    # H.264/AAC video: an ffmpeg test pattern with a tone, like the talking head videos the editors get
+    command = FFmpegCommand()
+    command.input(f'{pattern}=size={width}x{height}:rate=25', '-f', 'lavfi')
+    command.input(f'sine=frequency=220:sample_rate={sample_rate}', '-f', 'lavfi')
+    command.output(output_path, '-map', '0:v', '-map', '1:a', '-t', f'{duration:.3f}', '-pix_fmt', 'yuv420p',
+                   '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', '-ac', '2', '-shortest')
+    if not run_command(command):
+        raise RuntimeError(f'Failed to generate "{output_path}"')
+    return output_path
+
+
+def make_image(output_path: Path, width: int, height: int) -> Path:
+    command = FFmpegCommand()
+    command.input(f'testsrc2=size={width}x{height}', '-f', 'lavfi')
+    command.output(output_path, '-frames:v', '1', '-f', 'image2', '-c:v', 'png')
+    if not run_command(command):
+        raise RuntimeError(f'Failed to generate "{output_path}"')
+    return output_path
+
+
+def make_wav(output_path: Path, duration: float, frequency: int) -> Path:
+    # 16-bit mono WAV, the format of the TTS segments
+    command = FFmpegCommand()
+    command.input(f'sine=frequency={frequency}:sample_rate=24000', '-f', 'lavfi')
+    command.output(output_path, '-t', f'{duration:.3f}', '-c:a', 'pcm_s16le', '-ac', '1')
+    if not run_command(command):
+        raise RuntimeError(f'Failed to generate "{output_path}"')
+    return output_path
+
+
+def make_subtitle(output_path: Path, duration: float, width: int, height: int) -> Path:
+    # One event every 2 seconds, styled like the generated subtitles (see assets/subtitle-styles.json)
+    def timestamp(seconds: float) -> str:
+        return f'{int(seconds // 3600)}:{int(seconds % 3600 // 60):02d}:{seconds % 60:05.2f}'
+
+    events = []
+    start = 0.0
+    while start < duration:
+        end = min(start + 2.0, duration)
+        events.append(f'Dialogue: 0,{timestamp(start)},{timestamp(end)},Default,,0,0,0,,Synthetic subtitle line '
+                      f'{len(events) + 1}')
+        start = end
+    output_path.write_text(
+        '[Script Info]\nScriptType: v4.00+\n'
+        f'PlayResX: {width}\nPlayResY: {height}\n\n'
+        '[V4+ Styles]\n'
+        'Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, '
+        'Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, '
+        'MarginL, MarginR, MarginV, Encoding\n'
+        'Style: Default,Arial,24,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,-1,0,0,0,100,100,0,0,1,2,0,2,10,10,'
+        '60,1\n\n'
+        '[Events]\nFormat: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n'
+        + '\n'.join(events) + '\n', encoding='utf-8')
+    return output_path
+
+
+def prepare_fixtures(work_dir: Path, duration: float, width: int, height: int) -> dict:
+    fixtures_dir = work_dir / 'fixtures'
+    fixtures_dir.mkdir(parents=True, exist_ok=True)
+
+    # "_d_id" suffix: remove_d_id_watermark derives its output name from it
+    video = make_video(fixtures_dir / 'bench_d_id.mp4', duration, width, height)
+    segments = [make_video(fixtures_dir / f'segment{i}.mp4', duration / 2, width, height) for i in (1, 2)]
+    # Another audio sample rate (like a segment from another TTS provider): can't be joined by stream copy
+    other_segment = make_video(fixtures_dir / 'segment_other.mp4', duration / 2, width, height, pattern='testsrc',
+                               sample_rate=48000)
+    wavs = [make_wav(fixtures_dir / f'line{i}.wav', duration / AUDIO_SEGMENTS, 200 + 40 * i)
+            for i in range(1, AUDIO_SEGMENTS + 1)]
+    return {
+        'video': video,
+        'image': make_image(fixtures_dir / 'bench.png', width, height),
+        'segments': segments,
+        'mixed_segments': [segments[0], other_segment],
+        'wavs': wavs,
+        'subtitle': make_subtitle(fixtures_dir / 'bench.ass', duration, width, height),
+    }
+# endregion
+
+
+# region Primitives
+def primitive_runners(fixtures: dict, work_dir: Path, settings, width: int, height: int) -> dict:
+    # {primitive: function running it once and returning its output (a path, or an in-memory image)}
+    outputs_dir = work_dir / 'outputs'
+    video_editor = VideoEditor(width, height, input_video=fixtures['video'], settings=settings)
+
+    def remove_d_id_watermark():
+        return Path(video_editor.remove_d_id_watermark(str(fixtures['image']),
+                                                       str(outputs_dir / 'bench_no_watermark.mp4')))
+
+    def merge_audio_files_with_fading_effects():
+        return video_editor.merge_audio_files_with_fading_effects(basename='bench')
+
+    def add_watermark_text():
+        return Path(video_editor.add_watermark_text(basename='bench'))
+
+    def join_videos():
+        return Path(video_editor.join_videos(fixtures['segments'], outputs_dir / 'joined.mp4'))
+
+    def join_videos_reencode():
+        return Path(video_editor.join_videos(fixtures['mixed_segments'], outputs_dir / 'joined_reencoded.mp4'))
+
+    def merge_audios_with_padding():
+        audio_editor = AudioEditor(input_audio_files=fixtures['wavs'], settings=settings)
+        return audio_editor.merge_audios_with_padding(outputs_dir, 'merged')
+
+    def burn_subtitle():
+        # Imports stable-whisper and pysubs2
+        from videofactory.generators.subtitle_generator import SubtitleGenerator
+        return SubtitleGenerator(settings=settings).burn_subtitle(fixtures['video'], fixtures['subtitle'])
+
+    def merge_images():
+        from videofactory.generators.thumbnail_generator import ThumbnailGenerator
+        # Written to the temp directory as "bench_thumbnail.png"
+        return Path(ThumbnailGenerator(settings=settings).merge_images(
+            'bench.png', 'glitch.png', 'A synthetic thumbnail text on two lines', input_image_path=fixtures['image']))
+
+    def extract_last_frame():
+        return video_editor.extract_last_frame(fixtures['video'], outputs_dir / 'last_frame')
+
+    def grab_first_frame():
+        from videofactory.generators.thumbnail_generator import ThumbnailGenerator
+        return ThumbnailGenerator(settings=settings).grab_first_frame(fixtures['video'])
+
+    def grab_last_frame():
+        return video_editor.grab_last_frame(fixtures['video'])
+
+    return {name: function for name, function in locals().items() if name in PRIMITIVES}
+
+
+def benchmark_primitive(function, repeats: int, verbose: bool) -> dict:
+    # Median and best wall time of 'repeats' runs; the output of the editors is hidden unless verbose
+    timings = []
+    for _ in range(repeats):
+        output = io.StringIO()
+        with contextlib.ExitStack() as stack:
+            if not verbose:
+                stack.enter_context(contextlib.redirect_stdout(output))
+            start_time = time.perf_counter()
+            try:
+                result = function()
+            except Exception as e:
+                return {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+            elapsed_time = time.perf_counter() - start_time
+
+        # Most editors report failures by printing them, so a missing output also means the run failed
+        if result is None or (isinstance(result, Path) and not result.exists()):
+            lines = [line for line in output.getvalue().splitlines() if line.strip()]
+            return {'ok': False, 'error': lines[-1] if lines else 'No output was created'}
+        if isinstance(result, Path) and result.is_file():
+            result.unlink()  # So the next run starts from the same state
+        timings.append(elapsed_time)
+
+    return {'ok': True, 'median_s': statistics.median(timings), 'best_s': min(timings), 'runs': len(timings)}
+# endregion
+
+
+# region Report
+def print_report(report: dict) -> None:
+    print(f'\nMedia: {report["duration"]:g} s at {report["width"]}x{report["height"]}, '
+          f'{report["repeats"]} run(s) per primitive\n')
+    print(f'{"primitive":<40}{"median (ms)":>13}{"best (ms)":>11}{"s/media-s":>11}{"x realtime":>12}')
+    for name, result in report['primitives'].items():
+        if not result['ok']:
+            print(f'{name:<40}' + '\033[93m' + f'skipped ({result["error"]})' + '\033[0m')
+            continue
+        per_second = f'{result["s_per_media_s"]:>11.4f}' if result['s_per_media_s'] is not None else f'{"-":>11}'
+        realtime = f'{1 / result["s_per_media_s"]:>11.1f}x' if result['s_per_media_s'] else f'{"-":>12}'
+        print(f'{name:<40}{result["median_s"] * 1000:>13.1f}{result["best_s"] * 1000:>11.1f}{per_second}{realtime}')
+
+
+def compare_reports(report: dict, baseline: dict, max_regression: float = None) -> bool:
+    # Print the change of every primitive's median time from the baseline; False if one of them got slower
+    # than allowed. Times are compared per media-second, so runs on media of different lengths can be compared.
+    print('\nChange from the baseline (per media-second, or per call for images):')
+    ok = True
+    for name, result in report['primitives'].items():
+        before = baseline.get('primitives', {}).get(name)
+        if not result['ok'] or not before or not before.get('ok'):
+            continue
+        key = 's_per_media_s' if result['s_per_media_s'] is not None and before.get('s_per_media_s') else 'median_s'
+        change = (result[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+        slower = max_regression is not None and change > max_regression
+        colour = '\033[91m' if slower else '\033[92m' if change < 0 else ''
+        print(f'  {name:<40}' + colour + f'{change:+.1f}%' + ('\033[0m' if colour else ''))
+        ok = ok and not slower
+    return ok
+# endregion
+
+
+def main(args) -> int:
+    primitives = args.primitives or PRIMITIVES
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix='videofactory-bench-editors-'))
+
+    settings = get_settings().with_overrides(
+        processed_dir=work_dir / 'fixtures',
+        processed_videos_dir=work_dir / 'outputs',
+        temp_dir=work_dir / 'temp',
+        encoder_profile=args.encoder_profile,
+    )
+    report = {'duration': args.duration, 'width': args.width, 'height': args.height, 'repeats': args.repeats,
+              'encoder_profile': settings.encoder_profile, 'primitives': {}}
+    try:
+        print(f'Generating {args.duration:g} s fixtures at {args.width}x{args.height} in "{work_dir}"...')
+        fixtures = prepare_fixtures(work_dir, args.duration, args.width, args.height)
+        (work_dir / 'outputs').mkdir(parents=True, exist_ok=True)
+        runners = primitive_runners(fixtures, work_dir, settings, args.width, args.height)
+
+        for name in primitives:
+            print(f'Benchmarking {name}...')
+            result = benchmark_primitive(runners[name], args.repeats, args.verbose)
+            if result['ok']:
+                # merge_images works on a single image, so it is only reported per call
+                result['s_per_media_s'] = result['median_s'] / args.duration if name != 'merge_images' else None
+            report['primitives'][name] = result
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        print(f'\nReport saved to "{args.output}"')
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        if not compare_reports(report, baseline, args.max_regression):
+            print('\033[91m' + f'A primitive got slower by more than {args.max_regression:g}%.' + '\033[0m')
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the editor primitives (ffmpeg steps, thumbnails, frame grabs) on synthetic media.")
+    parser.add_argument("--primitives", nargs='+', choices=PRIMITIVES,
+                        help=f'Primitives to run (default: all): {", ".join(PRIMITIVES)}.')
+    parser.add_argument("--duration", type=float, default=10.0, help="Length of the synthetic media in seconds.")
+    parser.add_argument("--width", type=int, default=540, help="Width of the synthetic videos and images.")
+    parser.add_argument("--height", type=int, default=960, help="Height of the synthetic videos and images.")
+    parser.add_argument("--repeats", type=int, default=3, help="Number of runs of every primitive.")
+    parser.add_argument("--encoder-profile", default='balanced', help="Encoder profile of the editors.")
+    parser.add_argument("--output", type=Path, help="Write the JSON report to this file.")
+    parser.add_argument("--baseline", type=Path, help="JSON report of a previous run to compare with.")
+    parser.add_argument("--max-regression", type=float,
+                        help="Fail (exit code 1) if the time per media-second of a primitive grew by more than this "
+                             "percentage from the baseline.")
+    parser.add_argument("--work-dir", type=Path, help="Directory of the fixtures and outputs (default: a temporary "
+                                                      "directory).")
+    parser.add_argument("--keep", action="store_true", help="Keep the fixtures and outputs after the run.")
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the editors.")
+    args = parser.parse_args()
+
+    if args.repeats < 1:
+        print('\033[91m' + "--repeats must be at least 1. Exiting..." + '\033[0m')
+        sys.exit(1)
+    sys.exit(main(args))
@@ -0,0 +1,85 @@
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# Heavy libraries that must not be imported just by importing the workflows and creating a WorkflowManager
+HEAVY_MODULES = ['pandas', 'langchain', 'g4f', 'webuiapi', 'stable_whisper', 'whisper', 'torch', 'PIL', 'numpy']
+
+DEFAULT_STATEMENT = 'from videofactory.workflows import WorkflowManager; WorkflowManager()'
+
+
+def run_importtime(statement: str):
+    # Run the statement in a fresh interpreter and parse the "-X importtime" report from stderr:
+    # import time: self [us] | cumulative | imported package
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=PROJECT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
+    modules = []
+    errors = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            errors.append(line)
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # Header line
+        self_us, cumulative_us, name = int(fields[0]), int(fields[1]), fields[2]
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append({'name': name.strip(), 'self_us': self_us, 'cumulative_us': cumulative_us, 'depth': depth})
+
+    if result.returncode != 0:
+        raise RuntimeError('\n'.join(errors[-20:]))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of the videofactory workflows.")
+    parser.add_argument("--statement", default=DEFAULT_STATEMENT,
+                        help=f'Python statement to time (default: "{DEFAULT_STATEMENT}").')
+    parser.add_argument("--repeats", type=int, default=5, help="Number of fresh interpreters to run (default: 5).")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest top-level imports to show.")
+    parser.add_argument("--max-ms", type=float,
+                        help="Fail (exit code 1) if the median total import time exceeds this budget.")
+    parser.add_argument("--allow", action="append", default=[],
+                        help="Heavy module that may be imported (can be repeated).")
+    args = parser.parse_args()
+
+    totals = []
+    for _ in range(args.repeats):
+        modules = run_importtime(args.statement)
+        totals.append(sum(module['cumulative_us'] for module in modules if module['depth'] == 0) / 1000)
+    median_ms = sorted(totals)[len(totals) // 2]
+
+    print(f'Statement: {args.statement}')
+    print(f'Total import time: median {median_ms:.1f} ms, min {min(totals):.1f} ms, max {max(totals):.1f} ms '
+          f'({args.repeats} runs)')
+    print()
+
+    # Slowest top-level imports of the last run
+    print(f'{"cumulative ms":>14} {"self ms":>9}  module')
+    top_level = sorted((m for m in modules if m['depth'] == 0), key=lambda m: m['cumulative_us'], reverse=True)
+    for module in top_level[:args.top]:
+        print(f'{module["cumulative_us"] / 1000:>14.1f} {module["self_us"] / 1000:>9.1f}  {module["name"]}')
+    print()
+
+    failed = False
+    imported = {module['name'].split('.')[0] for module in modules}
+    heavy = [name for name in HEAVY_MODULES if name in imported and name not in args.allow]
+    if heavy:
+        print('\033[91m' + f'Heavy modules imported eagerly: {", ".join(heavy)}' + '\033[0m')
+        failed = True
+    else:
+        print('\033[92m' + 'No heavy modules imported eagerly.' + '\033[0m')
+
+    if args.max_ms is not None and median_ms > args.max_ms:
+        print('\033[91m' + f'Import time {median_ms:.1f} ms exceeds the budget of {args.max_ms:.1f} ms.' + '\033[0m')
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import traceback
+import subprocess
+from pathlib import Path
+
+try:
+    import resource  # Not available on Windows: peak RSS is then left out of the report
+except ImportError:
+    resource = None
+
+# Make the videofactory package importable when running this script directly
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_DIR))
+
+# Entry points of the WorkflowManager that are benchmarked, each on N synthetic inputs:
+#   lines         generate_multiple_talking_head_videos: N lines, one talking head video each
+#   conversation  generate_talking_head_conversation_video: one video of N lines by two speakers
+#   edit          edit_talking_head_videos: N existing D-ID videos edited (watermark, subtitles, music, thumbnail)
+#   thumbnail     thumbnail image and intro of N finished videos
+#   ai-video      generate_single_ai_video_from_image: N Gen-2 videos chained from the last frames, then joined
+SCENARIOS = ('lines', 'conversation', 'edit', 'thumbnail', 'ai-video')
+
+# Metrics compared with a baseline report: (key, True if higher is better)
+COMPARED_METRICS = (
+    ('wall_s', False),
+    ('videos_per_hour', True),
+    ('peak_rss_mb', False),
+    ('children_peak_rss_mb', False),
+    ('peak_temp_mb', False),
+    ('process_spawns', False),
+)
+
+# Speaker images of the conversation scenario
+SPEAKERS = ('A', 'B')
+
+
+# region Fixtures
+def fixture_name(prefix: str, index: int, n: int) -> str:
+    # Zero-padded, so that "line01*.png" doesn't match "line010.png", and without "_" (used as separator)
+    return f'{prefix}{str(index).zfill(max(3, len(str(n))))}'
+
+
+def fixture_line(index: int) -> str:
+    return f'This is synthetic line number {index}, long enough to take a few seconds when it is spoken aloud.'
+
+
+def prepare_fixtures(scenario: str, n: int, work_dir: Path) -> None:
+    # Synthetic inputs of a scenario, made with the mock providers (see generators/apis/_mock.py)
+    from videofactory.generators.apis._mock import render_image, render_video
+    from videofactory.generators.apis.tts.mock_tts import MockTTS
+
+    input_dir = work_dir / 'input'
+    input_dir.mkdir(parents=True, exist_ok=True)
+    (work_dir / 'processed_videos').mkdir(parents=True, exist_ok=True)
+
+    if scenario == 'lines':
+        names = [fixture_name('line', i, n) for i in range(1, n + 1)]
+        (input_dir / 'lines.txt').write_text(
+            ''.join(f'[{name}] {fixture_line(i)}\n' for i, name in enumerate(names, start=1)), encoding='utf-8')
+        (input_dir / 'thumbnail_lines.txt').write_text(
+            ''.join(f'[{name}] Thumbnail {i}\n' for i, name in enumerate(names, start=1)), encoding='utf-8')
+        for name in names:
+            render_image(input_dir / f'{name}.png', text=name)
+
+    elif scenario == 'conversation':
+        (input_dir / 'bench.txt').write_text(
+            ''.join(f'[{SPEAKERS[i % len(SPEAKERS)]}] {fixture_line(i)}\n' for i in range(1, n + 1)),
+            encoding='utf-8')
+        for speaker in SPEAKERS:
+            render_image(input_dir / f'{speaker}.png', text=speaker)
+
+    elif scenario == 'edit':
+        tts = MockTTS()
+        names = [fixture_name('clip', i, n) for i in range(1, n + 1)]
+        (input_dir / 'thumbnail_lines.txt').write_text(
+            ''.join(f'[{name}] Thumbnail {i}\n' for i, name in enumerate(names, start=1)), encoding='utf-8')
+        for i, name in enumerate(names, start=1):
+            render_image(input_dir / f'{name}.png', text=name)
+            tts.generate_audio(fixture_line(i), output_path=str(input_dir / f'{name}.wav'))
+            render_video(input_dir / f'{name}_d_id.mp4', image=input_dir / f'{name}.png',
+                         audio=input_dir / f'{name}.wav')
+            (input_dir / f'{name}.wav').unlink()
+
+    elif scenario == 'thumbnail':
+        tts = MockTTS()
+        for i in range(1, n + 1):
+            name = fixture_name('thumb', i, n)
+            tts.generate_audio(fixture_line(i), output_path=str(input_dir / f'{name}.wav'))
+            render_video(work_dir / 'processed_videos' / f'{name}_output_wm.mp4', audio=input_dir / f'{name}.wav')
+            (input_dir / f'{name}.wav').unlink()
+
+    elif scenario == 'ai-video':
+        render_image(input_dir / 'seed.png', text='seed')
+# endregion
+
+
+# region Scenarios (run in a child process)
+def run_scenario(scenario: str, workflow_manager, work_dir: Path, n: int, pipelined: bool) -> dict:
+    # Run the entry point and return {'videos': finished videos, ...}
+    input_dir = work_dir / 'input'
+    processed_videos_dir = workflow_manager.settings.processed_videos_dir
+
+    if scenario == 'lines':
+        workflow_manager.generate_multiple_talking_head_videos(input_dir)
+        videos = [video for video in input_dir.glob('line*.mp4') if '_' not in video.stem]
+        return {'videos': len(videos)}
+
+    if scenario == 'conversation':
+        workflow_manager.generate_talking_head_conversation_video(input_dir / 'bench.txt', input_dir)
+        return {'videos': int((input_dir / 'bench.mp4').is_file()), 'lines': n}
+
+    if scenario == 'edit':
+        workflow_manager.edit_talking_head_videos(input_dir / 'thumbnail_lines.txt', input_dir, input_dir)
+        return {'videos': len(list(processed_videos_dir.glob('clip*_output_wm_thumbnail.mp4')))}
+
+    if scenario == 'thumbnail':
+        thumbnail_generator = workflow_manager.thumbnail_generator
+        for video in sorted(processed_videos_dir.glob('thumb*_output_wm.mp4')):
+            name = video.name.split('_')[0]
+            first_frame = thumbnail_generator.grab_first_frame(video_file=video)
+            thumbnail_image = Path(thumbnail_generator.generate_thumbnail_image(
+                input_filename=name, input_image_path=first_frame, text=f'Thumbnail {name}'))
+            thumbnail_generator.generate_thumbnail_video(thumbnail_image_name=thumbnail_image.name)
+        return {'videos': len(list(processed_videos_dir.glob('thumb*_output_wm_thumbnail.mp4')))}
+
+    if scenario == 'ai-video':
+        workflow_manager.generate_single_ai_video_from_image(input_dir / 'seed.png', n, keep_same_seed=False,
+                                                             pipelined=pipelined)
+        joined = list(input_dir.glob('seed_joined_*.mp4')) if n > 1 else list(input_dir.glob('seed_*.mp4'))
+        return {'videos': len(joined), 'segments': n}
+
+    raise ValueError(f'Unsupported scenario: {scenario}')
+
+
+def count_process_spawns() -> dict:
+    # Count the processes started from now on by program (ffmpeg, ffprobe, ...), including the workers of
+    # process pools. Counted by wrapping the constructors, which every way of starting them goes through.
+    # The ffmpeg count includes the renders of the mock D-ID and Gen-2 providers (one per generated video).
+    import multiprocessing.process
+
+    counts = {}
+    lock = threading.Lock()
+
+    def count(program: str) -> None:
+        with lock:
+            counts[program] = counts.get(program, 0) + 1
+
+    popen_init = subprocess.Popen.__init__
+
+    def counted_popen_init(self, args, *popen_args, **popen_kwargs):
+        program = args[0] if isinstance(args, (list, tuple)) else str(args).split()[0]
+        count(Path(str(program)).stem)
+        popen_init(self, args, *popen_args, **popen_kwargs)
+
+    process_start = multiprocessing.process.BaseProcess.start
+
+    def counted_process_start(self):
+        count('python (multiprocessing)')
+        process_start(self)
+
+    subprocess.Popen.__init__ = counted_popen_init
+    multiprocessing.process.BaseProcess.start = counted_process_start
+    return counts
+
+
+def directory_size(path: Path) -> int:
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        total += directory_size(Path(entry.path))
+                    else:
+                        total += entry.stat(follow_symlinks=False).st_size
+                except FileNotFoundError:
+                    pass  # Temporary file removed meanwhile
+    except FileNotFoundError:
+        pass
+    return total
+
+
+class DiskSampler(threading.Thread):
+    """Samples the size of directories in the background and keeps the peak of each."""
+
+    def __init__(self, directories: dict, interval: float) -> None:
+        super().__init__(name='disk-sampler', daemon=True)
+        self.directories = directories  # name -> path
+        self.interval = interval
+        self.peaks = {name: 0 for name in directories}
+        self._stopping = threading.Event()
+
+    def sample(self) -> None:
+        for name, path in self.directories.items():
+            self.peaks[name] = max(self.peaks[name], directory_size(path))
+
+    def run(self) -> None:
+        while not self._stopping.is_set():
+            self.sample()
+            self._stopping.wait(self.interval)
+
+    def stop(self) -> dict:
+        self._stopping.set()
+        self.join()
+        self.sample()
+        return self.peaks
+
+
+def latency_stats(durations) -> dict:
+    durations = sorted(durations)
+    count = len(durations)
+    return {
+        'count': count,
+        'total_s': round(sum(durations), 3),
+        'mean_s': round(sum(durations) / count, 3),
+        'p50_s': round(durations[count // 2], 3),
+        'p95_s': round(durations[min(count - 1, int(count * 0.95))], 3),
+        'max_s': round(durations[-1], 3),
+    }
+
+
+def peak_rss_mb(who) -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS; RUSAGE_CHILDREN is the largest finished child
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(who).ru_maxrss
+    return round(maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_child(args) -> dict:
+    from videofactory.settings import get_settings
+    from videofactory.utils.timing import get_run_report
+    from videofactory.workflows import WorkflowManager
+
+    work_dir = Path(args.work_dir)
+    settings = get_settings().with_overrides(
+        mock_providers=True,
+        tts_provider='mock',
+        d_id_keys='bench-1,bench-2',
+        gen_2_keys='bench-1,bench-2',
+        output_dir=work_dir,
+        processed_dir=work_dir / 'processed',
+        processed_videos_dir=work_dir / 'processed_videos',
+        temp_dir=work_dir / 'temp',
+        state_db=work_dir / 'state.db',
+        encoder_profile=args.encoder_profile,
+        report_dir=args.trace_dir,
+    )
+    for directory in (settings.processed_dir, settings.processed_videos_dir, settings.temp_dir):
+        directory.mkdir(parents=True, exist_ok=True)
+
+    workflow_manager = WorkflowManager(settings=settings)
+    spawns = count_process_spawns()
+    sampler = DiskSampler({'temp': settings.temp_dir, 'work': work_dir}, args.sample_interval)
+    sampler.start()
+
+    result = {'scenario': args.child, 'n': args.n, 'ok': False, 'error': None, 'videos': 0}
+    start = time.perf_counter()
+    stages = {}
+    try:
+        with workflow_manager.job_scope(f'bench-{args.child}') as job_workflow_manager:
+            report = get_run_report()
+            try:
+                result.update(run_scenario(args.child, job_workflow_manager, work_dir, args.n, args.pipelined))
+                result['ok'] = result['videos'] > 0
+                if not result['ok']:
+                    result['error'] = 'No video was made (see the output above)'
+            finally:
+                for event in report.events:
+                    stages.setdefault(event['name'], []).append(event['wall_s'])
+    except Exception as e:
+        traceback.print_exc()
+        result['error'] = f'{type(e).__name__}: {e}'
+    wall_s = time.perf_counter() - start
+    peaks = sampler.stop()
+
+    result.update({
+        'wall_s': round(wall_s, 3),
+        'videos_per_hour': round(result['videos'] / wall_s * 3600, 2) if wall_s else 0,
+        'peak_rss_mb': peak_rss_mb(resource.RUSAGE_SELF if resource else None),
+        'children_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN if resource else None),
+        'peak_temp_mb': round(peaks['temp'] / 2**20, 1),
+        'peak_work_mb': round(peaks['work'] / 2**20, 1),
+        'process_spawns': sum(spawns.values()),
+        'process_spawns_by_program': dict(sorted(spawns.items())),
+        # Timed stages of the run report (editors, ffmpeg processes) and stages recorded in the state store
+        'stages': {name: latency_stats(durations) for name, durations in sorted(stages.items())},
+        'workflow_stages': {name: latency_stats(durations)
+                            for name, durations in sorted(workflow_manager.state.stage_timings().items())},
+    })
+    return result
+# endregion
+
+
+# region Report
+def compare_reports(report: dict, baseline: dict, max_regression: float = None) -> bool:
+    # Print the change of every metric from the baseline; returns False if the throughput of a scenario
+    # dropped by more than max_regression percent
+    ok = True
+    print(f'\n{"scenario":<14}{"metric":<22}{"baseline":>12}{"current":>12}{"change":>10}')
+    for scenario, result in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(scenario)
+        if previous is None:
+            print(f'{scenario:<14}(not in the baseline)')
+            continue
+        if previous.get('n') != result.get('n'):
+            print(f'{scenario:<14}(baseline ran with N={previous.get("n")}, not comparable)')
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            before, after = previous.get(metric), result.get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else 0.0
+            better = change > 0 if higher_is_better else change < 0
+            color = '' if abs(change) < 1 else ('\033[92m' if better else '\033[91m')
+            print(f'{scenario:<14}{metric:<22}{before:>12g}{after:>12g}{color}{change:>+9.1f}%\033[0m')
+            if metric == 'videos_per_hour' and max_regression is not None and -change > max_regression:
+                ok = False
+    return ok
+
+
+def print_report(report: dict) -> None:
+    print(f'\n{"scenario":<14}{"N":>5}{"videos":>8}{"wall s":>10}{"videos/h":>11}{"RSS MB":>9}'
+          f'{"child MB":>10}{"temp MB":>9}{"spawns":>8}  status')
+    for scenario, result in report['scenarios'].items():
+        status = '\033[92mok\033[0m' if result.get('ok') else f'\033[91m{result.get("error")}\033[0m'
+        print(f'{scenario:<14}{result.get("n", 0):>5}{result.get("videos", 0):>8}{result.get("wall_s", 0):>10.1f}'
+              f'{result.get("videos_per_hour", 0):>11.1f}{result.get("peak_rss_mb") or 0:>9.1f}'
+              f'{result.get("children_peak_rss_mb") or 0:>10.1f}{result.get("peak_temp_mb", 0):>9.1f}'
+              f'{result.get("process_spawns", 0):>8}  {status}')
+
+
+def run_benchmarks(args) -> int:
+    scenarios = args.scenarios or list(SCENARIOS)
+    work_root = Path(args.work_dir or tempfile.mkdtemp(prefix='videofactory-bench-'))
+    # The mock providers read their settings from the environment of the child processes
+    env = {**os.environ, 'MOCK_LATENCY': str(args.latency), 'MOCK_FAILURE_RATE': str(args.failure_rate),
+           'MOCK_CREDITS': str(args.credits), 'MOCK_SEED': str(args.seed)}
+    os.environ.update(env)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpu_count': os.cpu_count()},
+        'options': {'n': args.n, 'latency': args.latency, 'failure_rate': args.failure_rate,
+                    'credits': args.credits, 'seed': args.seed, 'pipelined': args.pipelined,
+                    'encoder_profile': args.encoder_profile},
+        'scenarios': {},
+    }
+
+    try:
+        for scenario in scenarios:
+            work_dir = work_root / scenario
+            shutil.rmtree(work_dir, ignore_errors=True)
+            print(f'\033[1;33m{scenario}: preparing {args.n} synthetic inputs...\033[0m')
+            prepare_fixtures(scenario, args.n, work_dir)
+
+            # Every scenario runs in a fresh interpreter, so its peak RSS and process counts are its own
+            print(f'\033[1;33m{scenario}: running...\033[0m')
+            result_file = work_dir / 'result.json'
+            command = [sys.executable, str(Path(__file__).resolve()), '--child', scenario, '--n', str(args.n),
+                       '--work-dir', str(work_dir), '--result-file', str(result_file),
+                       '--encoder-profile', args.encoder_profile, '--sample-interval', str(args.sample_interval)]
+            if args.pipelined:
+                command.append('--pipelined')
+            if args.trace_dir:
+                command += ['--trace-dir', str(args.trace_dir)]
+            output = None if args.verbose else subprocess.DEVNULL
+            process = subprocess.run(command, cwd=PROJECT_DIR, env=env, stdout=output, stderr=output)
+            if result_file.is_file():
+                report['scenarios'][scenario] = json.loads(result_file.read_text(encoding='utf-8'))
+            else:
+                report['scenarios'][scenario] = {'scenario': scenario, 'n': args.n, 'ok': False,
+                                                 'error': f'Benchmark process exited with status {process.returncode}'}
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        print(f'\nReport saved to "{args.output}"')
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        if not compare_reports(report, baseline, args.max_regression):
+            print('\033[91m' + f'Throughput dropped by more than {args.max_regression:g}%.' + '\033[0m')
+            return 1
+    return 0
+# endregion
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the workflows end to end on synthetic inputs with the offline mock providers.")
+    parser.add_argument("--scenarios", nargs='+', choices=SCENARIOS,
+                        help=f'Scenarios to run (default: all): {", ".join(SCENARIOS)}.')
+    parser.add_argument("--n", type=int, default=3,
+                        help="Number of inputs per scenario: lines, conversation lines, videos or Gen-2 iterations.")
+    parser.add_argument("--output", type=Path, help="Write the JSON report to this file.")
+    parser.add_argument("--baseline", type=Path, help="JSON report of a previous run to compare with.")
+    parser.add_argument("--max-regression", type=float,
+                        help="Fail (exit code 1) if the videos/hour of a scenario dropped by more than this "
+                             "percentage from the baseline.")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds every mock provider request takes (MOCK_LATENCY, default: 0).")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="Probability that a mock provider request fails (MOCK_FAILURE_RATE, default: 0).")
+    parser.add_argument("--credits", type=int, default=1000, help="Credits of every mock key (MOCK_CREDITS).")
+    parser.add_argument("--seed", default='0', help="Seed of the mock providers (MOCK_SEED).")
+    parser.add_argument("--pipelined", action="store_true", help="Run the ai-video scenario in pipelined mode.")
+    parser.add_argument("--encoder-profile", default='balanced', help="Encoder profile of the workflows.")
+    parser.add_argument("--sample-interval", type=float, default=0.2,
+                        help="Seconds between two measures of the temporary disk usage.")
+    parser.add_argument("--trace-dir", type=Path,
+                        help="Also write the run report and Chrome trace of every scenario to this directory.")
+    parser.add_argument("--work-dir", type=Path, help="Directory of the synthetic inputs and outputs (default: a "
+                                                      "temporary directory).")
+    parser.add_argument("--keep", action="store_true", help="Keep the inputs and outputs after the run.")
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the workflows.")
+    # Internal: run one scenario in this process and write its result (used by the parent run)
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_child(args)
+        args.result_file.write_text(json.dumps(result, indent=2), encoding='utf-8')
+        return 0
+    return run_benchmarks(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,11 @@
-import argparse
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
 from videofactory.workflows import WorkflowManager
+from videofactory.cli import build_parser, run_cli
+from videofactory.settings import reload_settings
 
 # Load environment variables from .env file
 load_dotenv()
@@ -228,7 +230,18 @@ def generate_single_ai_video_from_image(workflow_manager: WorkflowManager):
         else:
             print("Invalid input. Please enter 'y' or 'n'.")
 
-    workflow_manager.generate_single_ai_video_from_image(image_file, num_videos_to_generate, keep_same_seed)
+    pipelined = False
+    if num_videos_to_generate > 1:
+        while True:
+            pipelined_input = input("Do you want to overlap uploads and downloads between videos? (y/n): ").lower()
+            if pipelined_input in ['y', 'n']:
+                pipelined = pipelined_input == 'y'
+                break
+            else:
+                print("Invalid input. Please enter 'y' or 'n'.")
+
+    workflow_manager.generate_single_ai_video_from_image(image_file, num_videos_to_generate, keep_same_seed,
+                                                         pipelined=pipelined)
 
 
 def generate_multiple_ai_videos_from_images(workflow_manager: WorkflowManager):
@@ -277,10 +290,13 @@ def main(selected_option=None):
                         print("\033[91m" + "Invalid input. Please enter a valid number." + "\033[0m")
                 break
         else:
+            # Option given on the command line (--option): run it, then show the menu as usual
             selected_option = int(selected_option)
-            if 1 <= selected_option <= 7:
-                print()
-                break
+            if not 1 <= selected_option <= 9:
+                print("\033[91m" + "Invalid option. Please enter a number between 1 and 9." + "\033[0m")
+                selected_option = None
+                continue
+            print()
 
         # Call methods from the WorkflowManager class as needed
         if selected_option == 1:
@@ -319,6 +335,8 @@ def main(selected_option=None):
             print()
             user_input = input("Enter environment variable assignments: ")
             set_env_variables(user_input)
+            # Settings are read once; reload them so the following workflows use the new values
+            workflow_manager = workflow_manager.with_settings(reload_settings())
             selected_option = None
         elif selected_option == 7:
             print()
@@ -342,8 +360,9 @@ def main(selected_option=None):
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="VideoFactory workflow options.")
-    parser.add_argument("--option", help="Select a workflow option (1-7).")
-    args = parser.parse_args()
+    # Without a command the interactive menu is shown; with one the workflow runs without prompts
+    args = build_parser().parse_args()
 
+    if args.command:
+        sys.exit(run_cli(args))
     main(args.option)
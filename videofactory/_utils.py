@@ -4,7 +4,6 @@ import re
 import csv
 from pathlib import Path
 from typing import List
-import pandas as pd
 
 
 def read_lines(file_path):
@@ -301,6 +300,8 @@ def combine_csv_files(directory: Path, output_path: Path = None) -> Path:
 
 
 def generate_line_files(input_csv: Path):
+    import pandas as pd  # pandas is only needed here, so it isn't imported with the package
+
     # Read the CSV file into a DataFrame
     df = pd.read_csv(input_csv)
 
@@ -0,0 +1,433 @@
+import sys
+import json
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .settings import Settings, load_settings
+from .utils.scheduler import get_scheduler
+from .workflows import WorkflowManager
+
+
+# Options that override fields of the settings (see videofactory/settings.py); they can also be set per job
+SETTINGS_OPTIONS = (
+    'tts_provider', 'subtitle_style', 'subtitle_case', 'thumbnail_overlay', 'thumbnail_font', 'watermark_text',
+    'd_id_keys', 'gen_2_keys', 'processed_dir', 'processed_videos_dir', 'temp_dir',
+    'scratch_on_tmpfs', 'keep_failed_scratch', 'report_dir', 'ffmpeg_progress', 'encoder_profile',
+    'renditions', 'state_db', 'resume', 'task_queue', 'task_lease_seconds', 'mock_providers',
+)
+
+# Options of the scheduler shared by every job of the process (see utils/scheduler.py). They are read once, from
+# the command line (or the batch options of a job file) and the environment, when the process starts: the jobs
+# of "jobs", "serve" and "watch" can't change them
+SCHEDULER_OPTIONS = ('max_cores', 'max_memory_mb', 'ffmpeg_threads', 'whisper_threads')
+
+
+# region Workflows
+def run_talking_head(workflow_manager: WorkflowManager, line: str, thumbnail_line: str, image: str):
+    return workflow_manager.generate_talking_head_video(line, thumbnail_line, Path(image))
+
+
+def run_talking_heads(workflow_manager: WorkflowManager, input_dir: str, distributed: bool = False):
+    if distributed:
+        return workflow_manager.distribute_talking_head_videos(Path(input_dir))
+    return workflow_manager.generate_multiple_talking_head_videos(Path(input_dir))
+
+
+def run_quotes(workflow_manager: WorkflowManager, query: str, generate_videos: bool = False):
+    result = workflow_manager.generate_quotes(input_query=query)
+    if result is None:
+        raise RuntimeError(f'Failed to generate quotes for "{query}"')
+    quotes_file_path, _ = result
+    csv_dir = workflow_manager.generate_image_prompts_from_txt(input_file=quotes_file_path)
+    generated_images_dir = workflow_manager.generate_images_from_csv(csv_dir, output_dir=quotes_file_path.parent)
+    if generate_videos:
+        workflow_manager.generate_multiple_talking_head_videos(generated_images_dir)
+    return generated_images_dir
+
+
+def run_conversation(workflow_manager: WorkflowManager, input_file: str, images_dir: str):
+    return workflow_manager.generate_talking_head_conversation_video(Path(input_file), Path(images_dir))
+
+
+def run_edit(workflow_manager: WorkflowManager, thumbnail_lines_file: str, images_dir: str, videos_dir: str):
+    return workflow_manager.edit_talking_head_videos(Path(thumbnail_lines_file), Path(images_dir), Path(videos_dir))
+
+
+def run_enhance(workflow_manager: WorkflowManager, videos_dir: str, encoder: str = 'prores'):
+    return workflow_manager.enhance_videos_with_ai(Path(videos_dir), encoder=encoder)
+
+
+def run_ai_video(workflow_manager: WorkflowManager, image: str, count: int = 1,
+                 same_seed: bool = False, pipelined: bool = False):
+    return workflow_manager.generate_single_ai_video_from_image(Path(image), count, same_seed, pipelined=pipelined)
+
+
+def run_ai_videos(workflow_manager: WorkflowManager, images_dir: str, repeats: int = 1, images_at_a_time: int = 1):
+    return workflow_manager.generate_multiple_ai_videos_from_images(Path(images_dir), num_repeats=repeats,
+                                                                    images_at_a_time=images_at_a_time)
+
+
+WORKFLOWS = {
+    'talking-head': run_talking_head,
+    'talking-heads': run_talking_heads,
+    'quotes': run_quotes,
+    'conversation': run_conversation,
+    'edit': run_edit,
+    'enhance': run_enhance,
+    'ai-video': run_ai_video,
+    'ai-videos': run_ai_videos,
+}
+# endregion
+
+
+# region Options
+def merge_options(options: dict, overrides: dict) -> dict:
+    # Layer 'overrides' on top of 'options'; unset (None) values don't override and 'env' entries are merged
+    merged = dict(options or {})
+    for option, value in (overrides or {}).items():
+        if option == 'env':
+            merged['env'] = {**merged.get('env', {}), **(value or {})}
+        elif value is not None:
+            merged[option] = value
+    return merged
+
+
+def build_settings(options: dict) -> Settings:
+    # Variables set with --env (or "env" in a job file) feed the settings and are carried in them for the
+    # API clients of the job (see job_scope); the named options are applied on top as overrides
+    settings = load_settings(env=options.get('env'))
+    return settings.with_overrides(**{option: options.get(option) for option in SETTINGS_OPTIONS + SCHEDULER_OPTIONS})
+
+
+def configure_scheduler(settings: Settings) -> None:
+    # Create the process-wide scheduler from these settings, before a job creates it from its own
+    get_scheduler(settings)
+
+
+def parse_env_assignments(assignments) -> dict:
+    # Parse ['KEY=VALUE', ...] from the command line
+    env = {}
+    for assignment in assignments or []:
+        var, separator, value = assignment.partition('=')
+        if not separator:
+            raise ValueError(f'Invalid environment assignment: "{assignment}" (expected KEY=VALUE)')
+        env[var.strip()] = value.strip().strip('"')
+    return env
+# endregion
+
+
+# region Jobs
+def run_job(workflow_manager: WorkflowManager, job: dict, options: dict = None):
+    # Run one job in its own job scope; returns the result of the workflow (e.g. the path of the final video)
+    job = dict(job)
+    workflow = job.pop('workflow', None)
+    if workflow not in WORKFLOWS:
+        raise ValueError(f'Unsupported workflow: {workflow}')
+
+    name = job.pop('name', None)
+
+    # Job options, including its variables, are layered on top of the batch options and carried by the job's
+    # own settings, so they never leak into the other jobs
+    job_overrides = dict(job.pop('options', None) or {})
+    ignored = [option for option in SCHEDULER_OPTIONS if job_overrides.pop(option, None) is not None]
+    if ignored:
+        print('\033[93m' + f'{name or workflow}: {", ".join(ignored)} can only be set for the whole process. '
+              'Ignoring...' + '\033[0m')
+
+    job_options = merge_options(options, job_overrides)
+    with workflow_manager.job_scope(name or workflow, build_settings(job_options)) as job_workflow_manager:
+        return WORKFLOWS[workflow](job_workflow_manager, **job)
+
+
+_worker_workflow_manager = None
+
+
+def _init_worker(options: dict) -> None:
+    # The scheduler of each worker process uses the batch options, like the scheduler of the parent process
+    configure_scheduler(build_settings(options))
+
+
+def _run_job_in_worker(job: dict, options: dict) -> None:
+    # Each worker process keeps one WorkflowManager; every job gets its own settings from it
+    global _worker_workflow_manager
+    if _worker_workflow_manager is None:
+        _worker_workflow_manager = WorkflowManager()
+    run_job(_worker_workflow_manager, job, options)
+
+
+def run_jobs(job_file: Path, concurrency: int = None, options: dict = None) -> int:
+    with open(job_file, 'r', encoding='utf-8') as f:
+        job_data = json.load(f)
+
+    # The job file is either a list of jobs or {"concurrency": ..., "options": {...}, "jobs": [...]}
+    if isinstance(job_data, list):
+        job_data = {'jobs': job_data}
+    jobs = job_data.get('jobs', [])
+    batch_options = merge_options(job_data.get('options'), options)
+    concurrency = concurrency or job_data.get('concurrency', 1)
+    configure_scheduler(build_settings(batch_options))
+
+    failed = []
+    if concurrency <= 1:
+        # Run sequentially in this process
+        workflow_manager = WorkflowManager()
+        for index, job in enumerate(jobs, start=1):
+            name = job.get('name', f'job {index}')
+            print(f'\033[1;33m[{index}/{len(jobs)}] {name} ({job.get("workflow")})\033[0m')
+            try:
+                run_job(workflow_manager, job, batch_options)
+            except Exception as e:
+                print('\033[91m' + f'{name} failed: {e}' + '\033[0m')
+                failed.append(name)
+    else:
+        # Jobs run in worker processes, each with its own settings
+        with ProcessPoolExecutor(max_workers=concurrency, initializer=_init_worker,
+                                 initargs=(batch_options,)) as executor:
+            futures = {
+                executor.submit(_run_job_in_worker, job, batch_options): job.get('name', f'job {index}')
+                for index, job in enumerate(jobs, start=1)
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                    print('\033[92m' + f'{name} finished' + '\033[0m')
+                except Exception as e:
+                    print('\033[91m' + f'{name} failed: {e}' + '\033[0m')
+                    failed.append(name)
+
+    print(f'{len(jobs) - len(failed)}/{len(jobs)} jobs succeeded.')
+    return 1 if failed else 0
+# endregion
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="VideoFactory workflow options.")
+    parser.add_argument("--option", help="Select a workflow option (1-9) of the interactive menu.")
+
+    # Options shared by every subcommand
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--env", action="append", metavar="KEY=VALUE",
+                        help="Set an environment variable (can be repeated).")
+    common.add_argument("--tts-provider", choices=['coqui', 'elevenlabs', 'fpt'], help="TTS provider.")
+    common.add_argument("--subtitle-style", help="Subtitle style from assets/subtitle-styles.json.")
+    common.add_argument("--subtitle-case", choices=['uppercase', 'lowercase', 'titlecase'], help="Subtitle case.")
+    common.add_argument("--thumbnail-overlay", choices=['glitch', 'tint', 'skew'], help="Thumbnail overlay.")
+    common.add_argument("--thumbnail-font", help="Thumbnail font (file name in assets/fonts without .ttf).")
+    common.add_argument("--watermark-text", help="Watermark text.")
+    common.add_argument("--encoder-profile",
+                        help="Encoder profile from assets/encoder-profiles.json "
+                             "(draft, balanced, archive, tiktok, reels, shorts).")
+    # Scheduler options apply to the whole process (every job of "jobs", "serve" and "watch")
+    common.add_argument("--max-cores", type=int,
+                        help="Cores shared by the ffmpeg and whisper jobs of the process (default: all).")
+    common.add_argument("--max-memory-mb", type=int,
+                        help="Memory shared by the ffmpeg and whisper jobs of the process (default: all).")
+    common.add_argument("--ffmpeg-threads", type=int,
+                        help="Threads per ffmpeg command (default: chosen from the measured throughput).")
+    common.add_argument("--whisper-threads", type=int,
+                        help="Threads per transcription (default: chosen from the measured throughput).")
+    common.add_argument("--state-db", type=Path, help="SQLite state store (default: <output_dir>/state.db).")
+    common.add_argument("--resume", action="store_const", const=True,
+                        help="Skip the stages whose artifact matches the one recorded in the state store.")
+    common.add_argument("--task-queue",
+                        help="Task queue of the distributed mode: a directory on a shared mount or "
+                             "redis://host:port/db (default: <output_dir>/queue).")
+    common.add_argument("--task-lease-seconds", type=float,
+                        help="Seconds without heartbeat after which the task of a worker is queued again.")
+    common.add_argument("--mock-providers", action="store_const", const=True,
+                        help="Use offline stand-ins for the TTS, D-ID, Gen-2, LLM and image services "
+                             "(see MOCK_LATENCY, MOCK_FAILURE_RATE, MOCK_CREDITS and MOCK_SEED).")
+    common.add_argument("--renditions",
+                        help='Extra renditions of the final video, e.g. "tiktok@1080x1920,reels,shorts@540x960".')
+    common.add_argument("--d-id-keys", help="Comma-separated D-ID Basic tokens.")
+    common.add_argument("--gen-2-keys", help="Comma-separated Gen-2 Bearer tokens.")
+    common.add_argument("--processed-dir", type=Path, help="Directory for processed files.")
+    common.add_argument("--processed-videos-dir", type=Path, help="Directory for processed videos.")
+    common.add_argument("--temp-dir", type=Path, help="Directory for temporary files.")
+    common.add_argument("--scratch-on-tmpfs", action="store_const", const=True,
+                        help="Create the per-job scratch directories in /dev/shm when available.")
+    common.add_argument("--keep-failed-scratch", action="store_const", const=True,
+                        help="Keep the scratch directory of a failed job for inspection.")
+    common.add_argument("--report-dir", type=Path,
+                        help="Write a per-stage timing report of each job (JSON and Chrome trace) to this directory.")
+    common.add_argument("--progress", dest="ffmpeg_progress", action="store_const", const=True,
+                        help="Show the progress (time, speed, fps) of every ffmpeg command.")
+
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+
+    sub = subparsers.add_parser("talking-head", parents=[common], help="Generate single talking head video.")
+    sub.add_argument("--line", required=True, help="Text to generate TTS from.")
+    sub.add_argument("--thumbnail-line", required=True, help="Text to generate thumbnail from.")
+    sub.add_argument("--image", required=True, type=Path, help="Path to the image.")
+
+    sub = subparsers.add_parser("talking-heads", parents=[common], help="Generate multiple talking head videos.")
+    sub.add_argument("--input-dir", required=True, type=Path,
+                     help='Directory containing "lines.txt", "thumbnail_lines.txt" and matching PNG files.')
+    sub.add_argument("--distributed", action="store_true",
+                     help="Run the TTS and D-ID stages here and queue the editing stages for the workers.")
+
+    sub = subparsers.add_parser("quotes", parents=[common], help="Generate quotes and images.")
+    sub.add_argument("--query", required=True, help="Query to generate quotes from.")
+    sub.add_argument("--generate-videos", action="store_true",
+                     help="Generate talking head videos using the generated lines and images.")
+
+    sub = subparsers.add_parser("conversation", parents=[common],
+                                help="Generate single talking head conversation video.")
+    sub.add_argument("--input-file", required=True, type=Path, help="Text file to generate TTS from.")
+    sub.add_argument("--images-dir", required=True, type=Path, help="Directory containing the speaker images.")
+
+    sub = subparsers.add_parser("edit", parents=[common], help="Edit generated talking head videos.")
+    sub.add_argument("--thumbnail-lines-file", required=True, type=Path, help="Path to the thumbnail lines file.")
+    sub.add_argument("--images-dir", required=True, type=Path, help="Directory containing the images.")
+    sub.add_argument("--videos-dir", required=True, type=Path, help="Directory containing the D-ID videos.")
+
+    sub = subparsers.add_parser("enhance", parents=[common], help="Enhance videos with AI.")
+    sub.add_argument("--videos-dir", required=True, type=Path, help="Directory containing the videos.")
+    sub.add_argument("--encoder", choices=['prores', 'vp9'], default='prores', help="Encoder (default: prores).")
+
+    sub = subparsers.add_parser("ai-video", parents=[common], help="Generate single AI video from image.")
+    sub.add_argument("--image", required=True, type=Path, help="Path to the image.")
+    sub.add_argument("--count", type=int, default=1, help="Number of 4-second videos to chain (default: 1).")
+    sub.add_argument("--same-seed", action="store_true", help="Keep the same seed across videos.")
+    sub.add_argument("--pipelined", action="store_true", help="Overlap uploads and downloads between videos.")
+
+    sub = subparsers.add_parser("ai-videos", parents=[common], help="Generate multiple AI videos from images.")
+    sub.add_argument("--images-dir", required=True, type=Path, help="Directory containing PNG files.")
+    sub.add_argument("--repeats", type=int, default=1, help="Number of times to process each image (default: 1).")
+    sub.add_argument("--images-at-a-time", type=int, default=1,
+                     help="Number of images to process at a time when --repeats is 1 (default: 1).")
+
+    sub = subparsers.add_parser("jobs", parents=[common], help="Run every job listed in a JSON job file.")
+    sub.add_argument("job_file", type=Path, help="Path to the JSON job file.")
+    sub.add_argument("--concurrency", type=int, help="Number of jobs to run in parallel processes.")
+
+    sub = subparsers.add_parser("worker", parents=[common], help="Run the tasks queued by distributed workflows.")
+    sub.add_argument("--kinds", help="Comma-separated stages to run (default: all).")
+    sub.add_argument("--concurrency", type=int, default=1, help="Number of tasks to run at a time (default: 1).")
+    sub.add_argument("--max-idle", type=float, help="Exit after this many seconds without tasks (default: never).")
+    sub.add_argument("--worker-id", help="Name of this worker in the queue (default: <host>-<pid>).")
+
+    sub = subparsers.add_parser("serve", parents=[common], help="Run the HTTP job submission service.")
+    sub.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1).")
+    sub.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765).")
+    sub.add_argument("--concurrency", type=int, default=1, help="Number of jobs to run at a time (default: 1).")
+    sub.add_argument("--jobs-dir", type=Path, help="Directory of the submitted jobs (default: <input_dir>/jobs).")
+    sub.add_argument("--no-warm", dest="warm", action="store_false",
+                     help="Don't load the models and generators before accepting jobs.")
+
+    sub = subparsers.add_parser("watch", parents=[common],
+                                help="Make the videos of new or changed input sets dropped in a directory.")
+    sub.add_argument("--dir", dest="watch_dir", type=Path, help="Directory to watch (default: <input_dir>).")
+    sub.add_argument("--debounce", type=float, default=10.0,
+                     help="Seconds an input set must stay unchanged before it is processed (default: 10).")
+    sub.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between checks (default: 2).")
+    sub.add_argument("--concurrency", type=int, default=1, help="Number of videos to make at a time (default: 1).")
+    sub.add_argument("--once", action="store_true", help="Process every input set once and exit (e.g. from cron).")
+
+    sub = subparsers.add_parser("status", parents=[common], help="Report the stages recorded in the state store.")
+    sub.add_argument("--workflow", help="Only report this workflow (e.g. talking-head, edit).")
+    sub.add_argument("--errors", action="store_true", help="List the failed stages with their errors.")
+
+    return parser
+
+
+def print_status(workflow_manager: WorkflowManager, workflow: str = None, errors: bool = False) -> int:
+    # Stages by status, e.g. to follow a large backlog, straight from the state store
+    state = workflow_manager.state
+    summary = state.summary(workflow)
+    if not summary:
+        print('No stages recorded.')
+        return 0
+
+    statuses = sorted({status for counts in summary.values() for status in counts})
+    print(f'{"stage":<20}' + ''.join(f'{status:>10}' for status in statuses))
+    for stage, counts in summary.items():
+        print(f'{stage:<20}' + ''.join(f'{counts.get(status, 0):>10}' for status in statuses))
+
+    if errors:
+        print()
+        for error in state.errors(workflow):
+            print('\033[91m' + f'{error["workflow"]} {error["key"]} [{error["stage"]}]: {error["error"]}' + '\033[0m')
+    return 0
+
+
+def run_worker(workflow_manager: WorkflowManager, kinds: str = None, concurrency: int = 1, max_idle: float = None,
+               worker_id: str = None) -> int:
+    from .worker import Worker
+
+    kinds = [kind.strip() for kind in kinds.split(',') if kind.strip()] if kinds else None
+    worker = Worker(workflow_manager.task_queue, workflow_manager, kinds=kinds, worker_id=worker_id)
+    print(f'Worker {worker.worker_id} waiting for tasks ({", ".join(worker.kinds)})...')
+    try:
+        worker.run(concurrency=concurrency, max_idle=max_idle)
+    except KeyboardInterrupt:
+        print('Stopping...')
+    return 0
+
+
+def run_watcher(workflow_manager: WorkflowManager, watch_dir: Path = None, debounce: float = 10.0,
+                poll_interval: float = 2.0, concurrency: int = 1, once: bool = False) -> int:
+    from .watcher import FolderWatcher
+
+    watcher = FolderWatcher(workflow_manager, watch_dir, debounce=debounce, poll_interval=poll_interval,
+                            concurrency=concurrency)
+    try:
+        watcher.run(once=once)
+    except KeyboardInterrupt:
+        print('Stopping...')
+    return 0
+
+
+def run_cli(args: argparse.Namespace) -> int:
+    values = vars(args).copy()
+    command = values.pop('command')
+    values.pop('option', None)
+
+    # Split the parsed values into options (environment, directories) and workflow arguments
+    options = {'env': parse_env_assignments(values.pop('env', None))}
+    for option in SETTINGS_OPTIONS + SCHEDULER_OPTIONS:
+        options[option] = values.pop(option, None)
+
+    if command == 'jobs':
+        # The scheduler is configured with the batch options of the job file
+        return run_jobs(values['job_file'], concurrency=values.get('concurrency'), options=options)
+
+    settings = build_settings(options)
+    configure_scheduler(settings)
+
+    if command == 'status':
+        return print_status(WorkflowManager(settings=settings), **values)
+
+    if command == 'serve':
+        from .service import run_service
+        return run_service(WorkflowManager(settings=settings), options=options, **values)
+
+    if command == 'watch':
+        return run_watcher(WorkflowManager(settings=settings), **values)
+
+    if command == 'worker':
+        return run_worker(WorkflowManager(settings=settings), **values)
+
+    if command == 'ai-videos' and (values['repeats'] <= 0 or values['images_at_a_time'] <= 0):
+        print('--repeats and --images-at-a-time must be positive integers.')
+        return 2
+
+    workflow_manager = WorkflowManager(settings=settings)
+    with workflow_manager.job_scope(command) as job_workflow_manager:
+        WORKFLOWS[command](job_workflow_manager, **values)
+    return 0
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    # Load environment variables from .env file
+    load_dotenv()
+
+    parsed_args = build_parser().parse_args()
+    if parsed_args.command is None:
+        build_parser().print_help()
+        sys.exit(2)
+    sys.exit(run_cli(parsed_args))
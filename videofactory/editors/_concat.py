@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from ._ffmpeg import FFmpegCommand, run_command
+from ._probe import can_concat_with_stream_copy
+
+
+def concat_with_stream_copy(input_videos, output_filepath, with_audio: bool = True):
+    # The concat demuxer can only copy streams that share codec, resolution and timebase
+    if not can_concat_with_stream_copy(input_videos, with_audio=with_audio):
+        return None
+
+    # Write the list of input files for the concat demuxer next to the output file
+    list_filepath = Path(f'{output_filepath}.concat.txt')
+    with open(list_filepath, 'w', encoding='utf-8') as list_file:
+        for input_video in input_videos:
+            escaped_path = Path(input_video).resolve().as_posix().replace("'", "'\\''")
+            list_file.write(f"file '{escaped_path}'\n")
+
+    command = FFmpegCommand()
+    command.input(list_filepath, '-f', 'concat', '-safe', '0')
+    command.output(output_filepath, '-c', 'copy', *([] if with_audio else ['-an']))
+
+    try:
+        if not run_command(command):
+            return None
+    finally:
+        list_filepath.unlink(missing_ok=True)
+
+    return output_filepath
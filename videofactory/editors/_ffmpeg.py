@@ -0,0 +1,252 @@
+import os
+import contextvars
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+from ..utils.atomic import PART_SUFFIX, part_path
+from ..utils.scheduler import current_allocation, get_scheduler
+from ..utils.timing import stage
+
+
+# Output formats written to a ".part" file first (the format can't be guessed from that name, so it is given
+# with -f). Images are left out: the image2 muxer also picks the codec from the extension.
+ATOMIC_FORMATS = {'.mp4': 'mp4', '.mov': 'mov', '.mkv': 'matroska', '.webm': 'webm', '.m4a': 'ipod',
+                  '.mp3': 'mp3', '.wav': 'wav'}
+
+
+class FFmpegError(Exception):
+    """An ffmpeg (or ffprobe) process exited with a non-zero status; carries the tail of its stderr."""
+
+    def __init__(self, argv: Sequence[str], returncode: int, stderr: str = '') -> None:
+        self.argv = list(argv)
+        self.returncode = returncode
+        self.stderr = stderr or ''
+        # The last lines of stderr hold the actual error; the beginning is mostly stream information
+        tail = '\n'.join(self.stderr.strip().splitlines()[-10:])
+        super().__init__(f'{self.argv[0]} exited with status {returncode}' + (f':\n{tail}' if tail else ''))
+
+
+def escape_filter_value(value) -> str:
+    # Escape a value used inside a filtergraph (e.g. a path or a text), following the two levels of
+    # escaping described in the ffmpeg documentation: first for the filter option, then for the filtergraph
+    value = str(value)
+    for char in ('\\', "'", ':'):
+        value = value.replace(char, '\\' + char)
+    for char in ('\\', "'", '[', ']', ',', ';'):
+        value = value.replace(char, '\\' + char)
+    return value
+
+
+def filter_path(path) -> str:
+    # Paths inside filter options: forward slashes work on every platform and need no escaping
+    return escape_filter_value(Path(path).as_posix())
+
+
+def filter_node(name: str, args: str = None, inputs: Sequence[str] = (), outputs: Sequence[str] = ()) -> str:
+    # Build one filtergraph node, e.g. filter_node('vstack', 'inputs=2', ['top', 'bottom'], ['v'])
+    # gives "[top][bottom]vstack=inputs=2[v]"
+    labels_in = ''.join(f'[{label}]' for label in inputs)
+    labels_out = ''.join(f'[{label}]' for label in outputs)
+    return f'{labels_in}{name}{"=" + str(args) if args is not None else ""}{labels_out}'
+
+
+def codec_args(video_codec: str = None, audio_codec: str = None, **options) -> List[str]:
+    # Build codec arguments, e.g. codec_args('libx264', 'aac', crf=23, preset='veryfast', **{'b:a': '128k'})
+    args = []
+    if video_codec:
+        args += ['-c:v', video_codec]
+    if audio_codec:
+        args += ['-c:a', audio_codec]
+    for option, value in options.items():
+        if value is not None:
+            args += [f'-{option}', str(value)]
+    return args
+
+
+class FFmpegCommand:
+    """
+    Builder for one ffmpeg invocation, run as an argv list (no shell).
+
+        command = FFmpegCommand()
+        video = command.input('in.mp4')
+        command.filter(filter_node('scale', '540:960', [f'{video}:v'], ['v']))
+        command.output('out.mp4', '-map', '[v]', *codec_args('libx264', crf=23))
+        command.run()
+    """
+
+    def __init__(self, *global_args: str, overwrite: bool = True, loglevel: str = 'error',
+                 executable: str = 'ffmpeg') -> None:
+        self.executable = executable
+        self.global_args = ['-hide_banner', '-nostdin', '-loglevel', loglevel] + list(global_args)
+        if overwrite:
+            self.global_args.append('-y')
+        self.inputs: List[List[str]] = []
+        self.filters: List[str] = []
+        self.outputs: List[List[str]] = []
+
+    def input(self, path, *options: str) -> int:
+        # Options are placed before '-i' (e.g. '-loop', '1' or '-f', 'lavfi'); returns the input index
+        self.inputs.append([str(option) for option in options] + ['-i', str(path)])
+        return len(self.inputs) - 1
+
+    def filter(self, *nodes: str) -> 'FFmpegCommand':
+        # Add nodes to the -filter_complex graph (joined with ';')
+        self.filters.extend(nodes)
+        return self
+
+    def output(self, path, *options: str) -> 'FFmpegCommand':
+        # Options are placed before the output path (maps, codecs, -shortest, ...)
+        self.outputs.append([str(option) for option in options] + [str(path)])
+        return self
+
+    def partial_outputs(self) -> dict:
+        # {final path: ".part" path} of the outputs that are written atomically
+        outputs = {}
+        for output_args in self.outputs:
+            path = Path(output_args[-1])
+            if path.suffix.lower() in ATOMIC_FORMATS and '-f' not in output_args[:-1]:
+                outputs[output_args[-1]] = str(part_path(path))
+        return outputs
+
+    def argv(self, threads: int = None, partial: bool = False) -> List[str]:
+        # With 'threads' (the cores allocated by the scheduler), decoders, filters and encoders are limited to
+        # that many threads instead of one per core each. With 'partial', outputs go to their ".part" file.
+        partial_outputs = self.partial_outputs() if partial else {}
+        thread_args = ['-threads', str(threads)] if threads else []
+        argv = [self.executable] + self.global_args
+        if threads:
+            argv += ['-filter_threads', str(threads), '-filter_complex_threads', str(threads)]
+        for input_args in self.inputs:
+            argv += thread_args + input_args
+        if self.filters:
+            argv += ['-filter_complex', ';'.join(self.filters)]
+        for output_args in self.outputs:
+            encoder_args = list(thread_args)
+            if threads and 'libx264' in output_args:
+                encoder_args += ['-x264-params', f'threads={threads}']
+            path = output_args[-1]
+            if path in partial_outputs:
+                encoder_args += ['-f', ATOMIC_FORMATS[Path(path).suffix.lower()]]
+                path = partial_outputs[path]
+            # Placed last, so they override the threads of the encoder profile
+            argv += output_args[:-1] + encoder_args + [path]
+        return argv
+
+    def run(self) -> None:
+        # Wait for cores and memory from the scheduler (or use the allocation of the job running in this thread).
+        # Outputs are renamed from ".part" to their final name only if ffmpeg succeeds, so an interrupted or
+        # failed command never leaves a truncated file that a later run would take as complete.
+        partial_outputs = self.partial_outputs()
+        try:
+            with get_scheduler().allocate('ffmpeg') as allocation:
+                run(self.argv(threads=allocation.cores, partial=True))
+        except BaseException:
+            for part in partial_outputs.values():
+                Path(part).unlink(missing_ok=True)
+            raise
+        for path, part in partial_outputs.items():
+            os.replace(part, path)
+
+    def __str__(self) -> str:
+        return subprocess.list2cmdline(self.argv())
+
+
+# Called with the progress of every ffmpeg process (see set_progress_callback). A context variable, so each job
+# (thread) of a service has its own
+_progress_callback = contextvars.ContextVar('ffmpeg_progress_callback', default=None)
+
+
+def set_progress_callback(callback: Optional[Callable[[dict], None]]):
+    # Set the function called with the parsed progress of every ffmpeg process of the current context, e.g.
+    # print_progress; returns the previous callback so it can be restored
+    previous = _progress_callback.get()
+    _progress_callback.set(callback)
+    return previous
+
+
+def _parse_number(value: str, suffix: str = ''):
+    # Values are "N/A" until ffmpeg knows them (e.g. the speed during the first second)
+    try:
+        return float(value[:-len(suffix)] if suffix and value.endswith(suffix) else value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_progress(block: dict, output: str = None) -> dict:
+    # Convert one "-progress" block (key=value lines ending with progress=continue|end) to numbers
+    out_time_us = _parse_number(block.get('out_time_us'))
+    frame = _parse_number(block.get('frame'))
+    return {
+        'output': output,
+        'frame': int(frame) if frame is not None else None,
+        'fps': _parse_number(block.get('fps')),
+        'out_time': out_time_us / 1e6 if out_time_us is not None and out_time_us >= 0 else None,
+        'speed': _parse_number(block.get('speed'), 'x'),
+        'done': block.get('progress') == 'end',
+    }
+
+
+def print_progress(progress: dict) -> None:
+    # Progress callback for the command line: one line per output, updated in place
+    out_time = f'{progress["out_time"]:.1f}s' if progress['out_time'] is not None else '-'
+    speed = f'{progress["speed"]:.2f}x' if progress['speed'] is not None else '-'
+    fps = f'{progress["fps"]:.1f}' if progress['fps'] is not None else '-'
+    print(f'\r{progress["output"]}: time {out_time}, speed {speed}, fps {fps}\033[K',
+          end='\n' if progress['done'] else '', flush=True)
+
+
+def run(argv: Sequence[str], progress: Callable[[dict], None] = None) -> None:
+    # Run ffmpeg without a shell. Progress is read from "-progress pipe:1" and published to the progress
+    # callback; stderr goes to a temporary file (no pipe to drain) so a failure can be reported with its cause.
+    argv = [str(arg) for arg in argv]
+    argv = argv[:1] + ['-progress', 'pipe:1', '-nostats'] + argv[1:]
+    callback = progress or _progress_callback.get()
+    output = Path(argv[-1]).name.removesuffix(PART_SUFFIX)
+
+    with stage('ffmpeg', category='ffmpeg', output=output) as stage_args, tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            block = {}
+            for line in process.stdout:
+                key, _, value = line.decode('utf-8', errors='replace').strip().partition('=')
+                block[key] = value
+                if key == 'progress':
+                    info = parse_progress(block, output)
+                    block = {}
+                    # The last values are kept in the run report (speed tells how far from real time we are)
+                    stage_args.update({name: info[name] for name in ('frame', 'fps', 'out_time', 'speed')})
+                    if callback is not None:
+                        callback(info)
+            returncode = process.wait()
+            # Report the media time processed, from which the scheduler measures the throughput of each width
+            allocation = current_allocation()
+            if allocation is not None and returncode == 0:
+                allocation.record(stage_args.get('out_time'))
+        finally:
+            # Don't leave ffmpeg running if reading the progress (or the callback) failed
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+        if returncode != 0:
+            stderr.seek(0)
+            raise FFmpegError(argv, returncode, stderr.read().decode('utf-8', errors='replace'))
+
+
+def run_command(command) -> bool:
+    # Shared by the editors and generators: run an FFmpegCommand (or an argv list), print the error on failure
+    # and return whether it succeeded, so that a chain of commands can stop at the first failure
+    try:
+        if isinstance(command, FFmpegCommand):
+            command.run()
+        else:
+            run(command)
+        return True
+    except FFmpegError as e:
+        print(f"Command failed: {e}")
+    except OSError as e:
+        print(f"Command failed: {e}")
+    return False
@@ -0,0 +1,72 @@
+import subprocess
+from fractions import Fraction
+
+from ._ffmpeg import FFmpegError
+from ._probe import get_stream, get_duration
+
+
+def _frame_size(video_file):
+    video = get_stream(video_file, 'video')
+    if video is None:
+        raise ValueError(f'No video stream found in "{video_file}"')
+    return int(video['width']), int(video['height'])
+
+
+def _frame_duration(video_file) -> float:
+    video = get_stream(video_file, 'video')
+    try:
+        return float(1 / Fraction(video.get('avg_frame_rate') or video.get('r_frame_rate')))
+    except (TypeError, ValueError, ZeroDivisionError):
+        return 1 / 30
+
+
+def _read_frames(video_file, seek_args, max_frames: int = None):
+    # Decode into raw RGB over stdout; no image is encoded or written to disk
+    command = ['ffmpeg', '-v', 'error'] + seek_args + ['-i', str(video_file), '-an']
+    if max_frames is not None:
+        command += ['-frames:v', str(max_frames)]
+    command += ['-f', 'rawvideo', '-pix_fmt', 'rgb24', 'pipe:1']
+    result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise FFmpegError(command, result.returncode, result.stderr.decode('utf-8', errors='replace'))
+    return result.stdout
+
+
+def _to_frame(data: bytes, size, as_array: bool):
+    width, height = size
+    if as_array:
+        import numpy as np
+        return np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+    from PIL import Image
+    return Image.frombytes('RGB', size, data)
+
+
+def grab_frame(video_file, timestamp: float = 0.0, as_array: bool = False):
+    # Return the frame shown at 'timestamp' (seconds) as a PIL Image, or a NumPy array if as_array is True
+    size = _frame_size(video_file)
+    frame_bytes = size[0] * size[1] * 3
+    data = _read_frames(video_file, ['-ss', f'{timestamp:.3f}'], max_frames=1)
+    if len(data) < frame_bytes:
+        return None
+    return _to_frame(data[:frame_bytes], size, as_array)
+
+
+def grab_first_frame(video_file, as_array: bool = False):
+    return grab_frame(video_file, 0.0, as_array=as_array)
+
+
+def grab_last_frame(video_file, as_array: bool = False):
+    size = _frame_size(video_file)
+    frame_bytes = size[0] * size[1] * 3
+
+    # Seek straight to the timestamp of the last frame instead of decoding up to the end of the file
+    timestamp = max(get_duration(video_file) - _frame_duration(video_file), 0.0)
+    data = _read_frames(video_file, ['-ss', f'{timestamp:.3f}'])
+    if len(data) < frame_bytes:
+        # The container duration overshot the last frame; decode the final second and keep its last frame
+        data = _read_frames(video_file, ['-sseof', '-1'])
+        if len(data) < frame_bytes:
+            return None
+
+    last_frame_start = (len(data) // frame_bytes - 1) * frame_bytes
+    return _to_frame(data[last_frame_start:last_frame_start + frame_bytes], size, as_array)
@@ -0,0 +1,134 @@
+import numpy as np
+
+# NumPy sample types for the PCM sample widths (in bytes) handled in-process
+PCM_DTYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+
+def pcm_to_float(frames: bytes, channels: int, sampwidth: int) -> np.ndarray:
+    # Return the samples as a (frames, channels) float array in the range [-1, 1)
+    if sampwidth not in PCM_DTYPES:
+        raise ValueError(f'Unsupported sample width: {sampwidth}')
+    samples = np.frombuffer(frames, dtype=PCM_DTYPES[sampwidth]).astype(np.float64)
+    if sampwidth == 1:
+        samples -= 128  # Unsigned 8-bit PCM is centred on 128
+    return samples.reshape(-1, channels) / (2 ** (8 * sampwidth - 1))
+
+
+def float_to_pcm(samples: np.ndarray, sampwidth: int) -> bytes:
+    if sampwidth not in PCM_DTYPES:
+        raise ValueError(f'Unsupported sample width: {sampwidth}')
+    scale = 2 ** (8 * sampwidth - 1)
+    samples = np.clip(samples * scale, -scale, scale - 1)
+    if sampwidth == 1:
+        samples += 128
+    return samples.astype(PCM_DTYPES[sampwidth]).tobytes()
+
+
+def convert(samples: np.ndarray, framerate: int, channels: int, target_framerate: int) -> np.ndarray:
+    # Match the channel count (mono is duplicated, anything else is downmixed)
+    if samples.shape[1] != channels:
+        samples = np.repeat(samples.mean(axis=1, keepdims=True), channels, axis=1)
+
+    # Resample every channel to the target frame rate with linear interpolation
+    if framerate != target_framerate and len(samples):
+        num_frames = int(round(len(samples) * target_framerate / framerate))
+        source_times = np.arange(len(samples)) / framerate
+        target_times = np.arange(num_frames) / target_framerate
+        samples = np.column_stack([np.interp(target_times, source_times, samples[:, channel])
+                                   for channel in range(channels)])
+
+    return samples
+
+
+def trim_silence(samples: np.ndarray, framerate: int, threshold_db: float = -50.0,
+                 window_ms: int = 10, keep_ms: int = 50) -> np.ndarray:
+    # Drop leading and trailing audio whose RMS (per window) stays below threshold_db (dBFS),
+    # keeping keep_ms of margin around the speech so consonants aren't clipped
+    window = max(1, int(framerate * window_ms / 1000))
+    num_windows = len(samples) // window
+    if num_windows == 0:
+        return samples
+
+    windows = samples[:num_windows * window].reshape(num_windows, window, -1)
+    rms = np.sqrt(np.mean(windows ** 2, axis=(1, 2)))
+    loud = np.flatnonzero(rms > 10 ** (threshold_db / 20))
+    if len(loud) == 0:
+        return samples[:0]
+
+    keep = int(framerate * keep_ms / 1000)
+    start = max(loud[0] * window - keep, 0)
+    end = min((loud[-1] + 1) * window + keep, len(samples))
+    return samples[start:end]
+
+
+def _k_weighting_power(frequencies: np.ndarray, framerate: int) -> np.ndarray:
+    # Squared magnitude response of the ITU-R BS.1770 K-weighting filter (high shelf + high pass)
+    def biquad_power(b, a):
+        z = np.exp(-1j * 2 * np.pi * frequencies / framerate)
+        return np.abs((b[0] + b[1] * z + b[2] * z ** 2) / (a[0] + a[1] * z + a[2] * z ** 2)) ** 2
+
+    # Stage 1: high shelf, +4 dB above ~1.5 kHz
+    gain, q, fc = 10 ** (4.0 / 40), 1 / np.sqrt(2), 1500.0
+    w0 = 2 * np.pi * fc / framerate
+    alpha, cos_w0 = np.sin(w0) / (2 * q), np.cos(w0)
+    shelf_b = (gain * ((gain + 1) + (gain - 1) * cos_w0 + 2 * np.sqrt(gain) * alpha),
+               -2 * gain * ((gain - 1) + (gain + 1) * cos_w0),
+               gain * ((gain + 1) + (gain - 1) * cos_w0 - 2 * np.sqrt(gain) * alpha))
+    shelf_a = ((gain + 1) - (gain - 1) * cos_w0 + 2 * np.sqrt(gain) * alpha,
+               2 * ((gain - 1) - (gain + 1) * cos_w0),
+               (gain + 1) - (gain - 1) * cos_w0 - 2 * np.sqrt(gain) * alpha)
+
+    # Stage 2: high pass at ~38 Hz
+    q, fc = 0.5, 38.0
+    w0 = 2 * np.pi * fc / framerate
+    alpha, cos_w0 = np.sin(w0) / (2 * q), np.cos(w0)
+    pass_b = ((1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2)
+    pass_a = (1 + alpha, -2 * cos_w0, 1 - alpha)
+
+    return biquad_power(shelf_b, shelf_a) * biquad_power(pass_b, pass_a)
+
+
+def integrated_loudness(samples: np.ndarray, framerate: int) -> float:
+    # Gated integrated loudness (LUFS) following ITU-R BS.1770: 400 ms blocks with 75% overlap,
+    # an absolute gate at -70 LUFS and a relative gate 10 LU below the absolute-gated loudness.
+    # The K-weighting is applied per block in the frequency domain, which keeps the whole pass vectorized.
+    block = int(0.4 * framerate)
+    step = int(0.1 * framerate)
+    if len(samples) < block:
+        block = step = len(samples)
+    if block == 0:
+        return float('-inf')
+
+    starts = np.arange(0, len(samples) - block + 1, step)
+    blocks = samples[starts[:, None] + np.arange(block)]  # (blocks, block, channels)
+
+    spectrum = np.abs(np.fft.rfft(blocks, axis=1)) ** 2
+    spectrum *= _k_weighting_power(np.fft.rfftfreq(block, 1 / framerate), framerate)[None, :, None]
+    # Parseval: every bin except DC (and Nyquist for even lengths) stands for two conjugate bins
+    spectrum[:, 1:(block + 1) // 2] *= 2
+    mean_square = spectrum.sum(axis=1) / block ** 2  # (blocks, channels)
+    block_power = mean_square.sum(axis=1)  # Channel weights are 1.0 for mono/stereo
+
+    with np.errstate(divide='ignore'):
+        block_loudness = -0.691 + 10 * np.log10(block_power)
+
+    gated = block_power[block_loudness > -70.0]
+    if len(gated) == 0:
+        return float('-inf')
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) - 10.0
+    gated = block_power[(block_loudness > -70.0) & (block_loudness > relative_gate)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def normalize_loudness(samples: np.ndarray, framerate: int, target_lufs: float = -16.0,
+                       peak_ceiling_db: float = -1.0) -> np.ndarray:
+    loudness = integrated_loudness(samples, framerate)
+    if not np.isfinite(loudness):
+        return samples
+
+    # Apply the gain towards the target, but never push the peak above the ceiling
+    gain_db = target_lufs - loudness
+    peak = np.abs(samples).max()
+    if peak > 0:
+        gain_db = min(gain_db, peak_ceiling_db - 20 * np.log10(peak))
+    return samples * 10 ** (gain_db / 20)
@@ -0,0 +1,59 @@
+import os
+import json
+import subprocess
+from functools import lru_cache
+from pathlib import Path
+
+
+@lru_cache(maxsize=512)
+def _probe(path: str, mtime_ns: int, size: int) -> dict:
+    command = ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_streams', '-show_format', path]
+    return json.loads(subprocess.check_output(command))
+
+
+def probe(path) -> dict:
+    # Results are cached by path, modification time and size, so a rewritten file is probed again
+    stat = os.stat(path)
+    return _probe(str(Path(path)), stat.st_mtime_ns, stat.st_size)
+
+
+def get_stream(path, codec_type: str) -> dict:
+    # Return the first stream of the given type ('video' or 'audio'), or None if there is none
+    for stream in probe(path).get('streams', []):
+        if stream.get('codec_type') == codec_type:
+            return stream
+    return None
+
+
+def get_duration(path) -> float:
+    return float(probe(path).get('format', {}).get('duration', 0.0))
+
+
+def concat_signature(path, with_audio: bool = True) -> tuple:
+    # Stream parameters that must be identical for the concat demuxer to join files with stream copy
+    video = get_stream(path, 'video')
+    if video is None:
+        return None
+
+    signature = (
+        video.get('codec_name'), video.get('profile'), video.get('width'), video.get('height'),
+        video.get('pix_fmt'), video.get('sample_aspect_ratio', '1:1'), video.get('r_frame_rate'),
+        video.get('time_base'),
+    )
+    if with_audio:
+        audio = get_stream(path, 'audio')
+        if audio is None:
+            return None
+        signature += (
+            audio.get('codec_name'), audio.get('sample_rate'), audio.get('channels'), audio.get('channel_layout'),
+        )
+
+    return signature
+
+
+def can_concat_with_stream_copy(paths, with_audio: bool = True) -> bool:
+    try:
+        signatures = {concat_signature(path, with_audio) for path in paths}
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return False
+    return len(signatures) == 1 and None not in signatures
@@ -0,0 +1,124 @@
+import json
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    """
+    Encoding settings shared by every encode of a job (see assets/encoder-profiles.json).
+
+    Keeps preset, CRF/bitrate, threads, GOP and audio bitrate consistent between the editors and generators,
+    and lets a job trade quality for speed (e.g. "draft" to preview a batch) or target a platform.
+    """
+
+    name: str
+    description: str = ''
+    video_codec: str = 'libx264'
+    preset: str = None
+    crf: int = None
+    video_bitrate: str = None
+    maxrate: str = None
+    bufsize: str = None
+    tune: str = None
+    gop: int = None
+    closed_gop: bool = False
+    threads: int = None
+    pix_fmt: str = None
+    profile: str = None
+    level: str = None
+    audio_codec: str = 'aac'
+    audio_bitrate: str = None
+    audio_sample_rate: int = None
+    faststart: bool = False
+
+    def video_args(self) -> List[str]:
+        args = ['-c:v', self.video_codec]
+        options = [
+            ('-preset', self.preset), ('-tune', self.tune),
+            ('-crf', self.crf), ('-b:v', self.video_bitrate), ('-maxrate', self.maxrate), ('-bufsize', self.bufsize),
+            ('-g', self.gop), ('-threads', self.threads),
+            ('-pix_fmt', self.pix_fmt), ('-profile:v', self.profile), ('-level:v', self.level),
+        ]
+        args += [str(arg) for option, value in options if value is not None for arg in (option, value)]
+        if self.closed_gop:
+            args += ['-flags', '+cgop']
+        return args
+
+    def speed_args(self) -> List[str]:
+        # Only the encoder speed settings, for encodes whose other parameters must match an existing stream
+        options = [('-preset', self.preset), ('-crf', self.crf), ('-threads', self.threads)]
+        return [str(arg) for option, value in options if value is not None for arg in (option, value)]
+
+    def audio_args(self) -> List[str]:
+        args = ['-c:a', self.audio_codec]
+        if self.audio_bitrate is not None:
+            args += ['-b:a', str(self.audio_bitrate)]
+        if self.audio_sample_rate is not None:
+            args += ['-ar', str(self.audio_sample_rate)]
+        return args
+
+    def output_args(self, audio: str = 'encode') -> List[str]:
+        # Arguments for an mp4 output; audio is 'encode', 'copy' (already encoded upstream) or None (no audio)
+        args = self.video_args()
+        if audio == 'encode':
+            args += self.audio_args()
+        elif audio == 'copy':
+            args += ['-c:a', 'copy']
+        else:
+            args += ['-an']
+        if self.faststart:
+            args += ['-movflags', '+faststart']
+        return args
+
+
+@lru_cache(maxsize=None)
+def _read_profiles(profiles_path: Path) -> Dict[str, dict]:
+    # Parse the profiles file once per process
+    with open(profiles_path, 'r', encoding='utf-8') as f:
+        return json.load(f)['profiles']
+
+
+def load_encoder_profile(name: str, assets_dir: Path) -> EncoderProfile:
+    profiles = _read_profiles(Path(assets_dir) / 'encoder-profiles.json')
+    if name not in profiles:
+        raise ValueError(f"Unsupported encoder profile: {name} (available: {', '.join(profiles)})")
+
+    # Ignore unknown keys, so the file can hold notes for other tools
+    known = {field.name for field in fields(EncoderProfile)}
+    return EncoderProfile(name=name, **{key: value for key, value in profiles[name].items() if key in known})
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """One output of a rendition ladder: an encoder profile and an optional size (e.g. "tiktok@1080x1920")."""
+
+    profile: EncoderProfile
+    width: int = None
+    height: int = None
+
+    @property
+    def name(self) -> str:
+        return self.profile.name + (f'_{self.width}x{self.height}' if self.width else '')
+
+
+def parse_renditions(spec, assets_dir: Path) -> List[Rendition]:
+    # Parse "tiktok@1080x1920,reels,shorts@540x960" (or a list of such items); without a size, the rendition
+    # keeps the size of the input video
+    items = spec.split(',') if isinstance(spec, str) else list(spec or [])
+    renditions = []
+    for item in items:
+        item = item.strip()
+        if not item:
+            continue
+        profile_name, _, size = item.partition('@')
+        width = height = None
+        if size:
+            try:
+                width, height = (int(value) for value in size.lower().split('x'))
+            except ValueError:
+                raise ValueError(f'Invalid rendition size: "{item}" (expected PROFILE@WIDTHxHEIGHT)')
+        renditions.append(Rendition(load_encoder_profile(profile_name.strip(), assets_dir), width, height))
+    return renditions
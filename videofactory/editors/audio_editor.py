@@ -1,23 +1,110 @@
-import subprocess
+import wave
 from pathlib import Path
 from typing import List
 
+from ._ffmpeg import FFmpegCommand, filter_node, run_command
+from ..settings import Settings, get_settings
+from ..utils.atomic import atomic_write
+from ..utils.timing import timed
+
 
 class AudioEditor:
-    def __init__(self, input_audio_file: Path = None, input_audio_files: List[Path] = None):
+    def __init__(self, input_audio_file: Path = None, input_audio_files: List[Path] = None,
+                 normalize: bool = None, target_lufs: float = None, silence_threshold_db: float = None,
+                 settings: Settings = None):
         self.input_audio_file = input_audio_file
         self.input_audio_files = input_audio_files
 
+        # Trim silence and normalize the loudness of each TTS segment before padding (WAV inputs only)
+        self.settings = settings or get_settings()
+        self.normalize = normalize if normalize is not None else self.settings.audio_normalize
+        self.target_lufs = target_lufs if target_lufs is not None else self.settings.audio_target_lufs
+        self.silence_threshold_db = (silence_threshold_db if silence_threshold_db is not None
+                                     else self.settings.audio_silence_threshold_db)
+
+    @staticmethod
+    def run_command(command) -> bool:
+        # Run an FFmpegCommand (or argv list) without a shell. On failure the captured stderr is printed
+        # and False is returned.
+        return run_command(command)
+
+    @staticmethod
+    def _read_wav(audio_file: Path) -> dict:
+        with wave.open(str(audio_file), 'rb') as wav_file:
+            return {
+                'channels': wav_file.getnchannels(),
+                'sampwidth': wav_file.getsampwidth(),
+                'framerate': wav_file.getframerate(),
+                'frames': wav_file.readframes(wav_file.getnframes()),
+            }
+
     @staticmethod
-    def run_command(command):
-        # Run the command with subprocess, using shell mode to execute the command as a string.
-        # Set check=True to raise an exception if the command returns a non-zero exit code.
-        # Redirect the standard output (stdout) and standard error (stderr) to /dev/null to suppress any output.
+    def _convert_pcm(segment: dict, channels: int, sampwidth: int, framerate: int) -> bytes:
+        # Convert PCM frames to the given layout, resampling once with linear interpolation if needed
+        from ._pcm import pcm_to_float, float_to_pcm, convert
+
+        samples = pcm_to_float(segment['frames'], segment['channels'], segment['sampwidth'])
+        samples = convert(samples, segment['framerate'], channels, framerate)
+        return float_to_pcm(samples, sampwidth)
+
+    def trim_and_normalize(self, frames: bytes, channels: int, sampwidth: int, framerate: int) -> bytes:
+        # Trim leading/trailing silence by RMS threshold, then apply a gain towards the target loudness
+        from ._pcm import pcm_to_float, float_to_pcm, trim_silence, normalize_loudness
+
+        samples = pcm_to_float(frames, channels, sampwidth)
+        samples = trim_silence(samples, framerate, threshold_db=self.silence_threshold_db)
+        samples = normalize_loudness(samples, framerate, target_lufs=self.target_lufs)
+        return float_to_pcm(samples, sampwidth)
+
+    def _merge_wavs_with_padding(self, output_path: Path, begin_end_delay: int, between_delay: int) -> bool:
+        # Assemble the padded audio in-process: read the PCM data, insert silence buffers, write a single WAV file.
+        # Returns False when an input can't be handled here (not a PCM WAV file), so ffmpeg can be used instead.
         try:
-            subprocess.run(command, shell=True, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except subprocess.CalledProcessError as e:
-            print(f"Command failed: {e}")
+            segments = [self._read_wav(audio_file) for audio_file in self.input_audio_files]
+        except (wave.Error, EOFError, OSError):
+            return False
+        if not segments:
+            return False
 
+        # The first segment defines the output format; the others are converted to it when they differ
+        channels, sampwidth, framerate = segments[0]['channels'], segments[0]['sampwidth'], segments[0]['framerate']
+        frames = []
+        for segment in segments:
+            if (segment['channels'], segment['sampwidth'], segment['framerate']) == (channels, sampwidth, framerate):
+                frames.append(segment['frames'])
+            else:
+                try:
+                    frames.append(self._convert_pcm(segment, channels, sampwidth, framerate))
+                except (ImportError, ValueError):
+                    return False
+
+        if self.normalize:
+            try:
+                frames = [self.trim_and_normalize(segment_frames, channels, sampwidth, framerate)
+                          for segment_frames in frames]
+            except (ImportError, ValueError) as e:
+                print(f"Audio normalization skipped: {e}")
+
+        # Unsigned 8-bit PCM is centred on 128, every other width on 0
+        silence_byte = b'\x80' if sampwidth == 1 else b'\x00'
+
+        def silence(milliseconds):
+            return silence_byte * (int(round(milliseconds * framerate / 1000)) * channels * sampwidth)
+
+        with atomic_write(output_path) as part, wave.open(str(part), 'wb') as wav_file:
+            wav_file.setnchannels(channels)
+            wav_file.setsampwidth(sampwidth)
+            wav_file.setframerate(framerate)
+            wav_file.writeframes(silence(begin_end_delay))
+            for i, segment_frames in enumerate(frames):
+                if i > 0:
+                    wav_file.writeframes(silence(between_delay))
+                wav_file.writeframes(segment_frames)
+            wav_file.writeframes(silence(begin_end_delay))
+
+        return True
+
+    @timed('tts_merge')
     def merge_audios_with_padding(self, output_dir: Path, name: str = None,
                                   begin_end_delay: int = 500, between_delay: int = 1000) -> Path:
         # If the 'name' argument is not provided, set it to None
@@ -27,39 +114,34 @@ class AudioEditor:
         # Create the output path for the audio file
         output_path = f'{basepath}.wav'
 
-        # Create the filter complex argument
-        filter_complex_args = []
-        for i, audio_file in enumerate(self.input_audio_files):
-            if i == 0:
-                filter_complex_args.append(f"[{i}:a]adelay={begin_end_delay}|{begin_end_delay}[a{i}];")
-            else:
-                filter_complex_args.append(f"[{i}:a]adelay={between_delay}|{between_delay}[a{i}];")
+        # WAV inputs are merged in-process; ffmpeg is only needed for other formats
+        if self._merge_wavs_with_padding(Path(output_path), begin_end_delay, between_delay):
+            print(f'Audio saved successfully to "{output_path}"')
+            return Path(output_path)
 
-        # Append the concat argument to the filter complex argument
-        filter_complex_args.append("[{}]concat=n={}:v=0:a=1[out]".format(']['.join(
-                                    ['a'+str(i) for i in range(len(self.input_audio_files))]),
-                                    len(self.input_audio_files)))
-        filter_complex_arg = ''.join(filter_complex_args)
+        if self.normalize:
+            print("Audio normalization is only applied to WAV inputs. Merging without it...")
 
-        # Create the input arguments
-        input_args = []
+        # Delay every input (the first one by begin_end_delay, the others by between_delay) and concatenate them
+        command = FFmpegCommand()
+        concat_inputs = []
         for audio_file in self.input_audio_files:
-            input_args.append(f"-i \"{audio_file}\"")
-        input_arg = ' '.join(input_args)
-
-        # Create the command
-        # command = f"ffmpeg {input_arg} -filter_complex \"{filter_complex_arg}\" -map \"[out]\" \"{output}.wav\""
-        command = (
-                    f'ffmpeg {input_arg} -filter_complex \"{filter_complex_arg}\" '
-                    f'-map \"[out]\" \"{basepath}_temp.wav\" -y && '
-                    f'ffmpeg -i \"{basepath}_temp.wav\" -af apad=pad_dur={begin_end_delay / 1000.0:.1f}s '
-                    f'\"{output_path}\" -y && '
-                    f'del \"{basepath}_temp.wav\"'
-                )
-
-        # Execute the command
-        # print(command)
-        self.run_command(command)
+            i = command.input(audio_file)
+            delay = begin_end_delay if i == 0 else between_delay
+            command.filter(filter_node('adelay', f'{delay}|{delay}', [f'{i}:a'], [f'a{i}']))
+            concat_inputs.append(f'a{i}')
+        command.filter(filter_node('concat', f'n={len(self.input_audio_files)}:v=0:a=1', concat_inputs, ['out']))
+        command.output(f'{basepath}_temp.wav', '-map', '[out]')
+
+        # Pad the end with begin_end_delay of silence
+        cmd_pad = FFmpegCommand()
+        cmd_pad.input(f'{basepath}_temp.wav')
+        cmd_pad.output(output_path, '-af', f'apad=pad_dur={begin_end_delay / 1000.0:.1f}s')
+
+        # Execute the commands
+        if self.run_command(command):
+            self.run_command(cmd_pad)
+        Path(f'{basepath}_temp.wav').unlink(missing_ok=True)
         print(f'Audio saved successfully to "{output_path}"')
 
         return Path(output_path)
@@ -1,80 +1,75 @@
+import io
 import subprocess
 import os
-import configparser
 from pathlib import Path
 
+from ._concat import concat_with_stream_copy
+from ._ffmpeg import (
+    FFmpegCommand,
+    FFmpegError,
+    escape_filter_value,
+    filter_node,
+    filter_path,
+    run_command
+)
+from ._frames import grab_last_frame
+from ._probe import get_duration
+from ._profiles import load_encoder_profile, parse_renditions
+from ..settings import Settings, get_settings
+from ..utils.timing import timed
+
 
 class VideoEditor:
     def __init__(self, width, height,
                  input_video=None, input_dir=None,
                  processed_dir=None, temp_dir=None, audio_dir=None,
                  processed_videos_dir=None, assets_dir=None,
-                 watermark_text=None):
+                 watermark_text=None, encoder_profile=None, settings: Settings = None):
 
         self.input_video = input_video
         self.width = width
         self.height = height
+        self.settings = settings or get_settings()
 
-        # Get the path of the current script (absolute path)
-        current_script_path = Path(__file__).resolve()
-        # Get the project folder (VideoFactory)
-        project_folder = current_script_path.parent.parent.parent
-        # Construct the path to config.ini in the parent folder
-        config_path = project_folder / "config.ini"
-        # Read the configuration file
-        config = configparser.ConfigParser()
-        config.read(config_path)
-
-        # Use Path concatenation for input_dir, processed_dir, temp_dir, audio_dir, and processed_videos_dir
-        self.input_dir = input_video or project_folder / config.get('paths', 'input_dir')
-        self.processed_dir = processed_dir or project_folder / config.get('paths', 'processed_dir')
-        self.temp_dir = temp_dir or project_folder / config.get('paths', 'temp_dir')
-        self.audio_dir = audio_dir or project_folder / config.get('paths', 'audio_dir')
-        self.processed_videos_dir = processed_videos_dir or project_folder / config.get('paths', 'processed_videos_dir')
-        self.assets_dir = assets_dir or project_folder / config.get('paths', 'assets_dir')
-
-        self.watermark_text = watermark_text or os.environ.get('WATERMARK_TEXT', '@YourChannel')
+        # Explicit arguments take precedence over the paths from the settings (config.ini)
+        self.input_dir = input_dir or self.settings.input_dir
+        self.processed_dir = processed_dir or self.settings.processed_dir
+        self.temp_dir = temp_dir or self.settings.temp_dir
+        self.audio_dir = audio_dir or self.settings.audio_dir
+        self.processed_videos_dir = processed_videos_dir or self.settings.processed_videos_dir
+        self.assets_dir = assets_dir or self.settings.assets_dir
 
-    @staticmethod
-    def run_command(command):
-        # Run the command with subprocess, using shell mode to execute the command as a string.
-        # Set check=True to raise an exception if the command returns a non-zero exit code.
-        # Redirect the standard output (stdout) and standard error (stderr) to /dev/null to suppress any output.
-        try:
-            subprocess.run(command, shell=True, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except subprocess.CalledProcessError as e:
-            print(f"Command failed: {e}")
+        self.watermark_text = watermark_text or self.settings.watermark_text
 
-    @staticmethod
-    def find_closest_audio_match(mp4_file, videos_dir=None):
-        # Get the project folder (VideoFactory)
-        project_folder = Path(__file__).resolve().parent.parent.parent
+        # Encoding settings (preset, CRF/bitrate, GOP, audio bitrate) used by every encode of this editor
+        self.encoder_profile = load_encoder_profile(encoder_profile or self.settings.encoder_profile,
+                                                    self.assets_dir)
 
-        # Read the configuration file
-        config = configparser.ConfigParser()
-        config_path = project_folder / "config.ini"
-        config.read(config_path)
+    @staticmethod
+    def run_command(command) -> bool:
+        # Run an FFmpegCommand (or argv list) without a shell. On failure the captured stderr is printed
+        # and False is returned.
+        return run_command(command)
 
-        # Use Path concatenation for audio_dir, and processed_dir
-        audio_dir = Path(project_folder / config.get('paths', 'audio_dir'))
-        processed_dir = Path(project_folder / config.get('paths', 'processed_dir'))
-        # print(processed_dir)
+    @staticmethod
+    def find_closest_audio_match(mp4_file, videos_dir=None, settings: Settings = None):
+        settings = settings or get_settings()
+        audio_dir = Path(settings.audio_dir)
 
         if videos_dir is None:
-            videos_dir = processed_dir
+            videos_dir = settings.processed_dir
 
         audio_files = []
 
         # Scan all mp3 files in the "audio" directory and append their names and lengths to the audio_files list
+        # (durations are cached by the probe, so the music library is only probed once per process)
         for file in os.listdir(audio_dir):
             if file.endswith(".mp3"):
-                mp3_filepath = os.path.join(audio_dir, file).replace("\\", "/")  # Use forward slash instead of backslash
-                length = int(round(float(subprocess.check_output(f'ffprobe -i "{mp3_filepath}" -show_entries format=duration -v quiet -of csv="p=0"', shell=True).decode())))
+                length = int(round(get_duration(audio_dir / file)))
 
                 audio_files.append({"name": file, "length": length})
 
-        mp4_filepath = os.path.join(videos_dir, mp4_file).replace("\\", "/")  # Use forward slash instead of backslash
-        mp4_duration = int(round(float(subprocess.check_output(f'ffprobe -i "{mp4_filepath}" -show_entries format=duration -v quiet -of csv="p=0"', shell=True).decode())))
+        mp4_duration = int(round(get_duration(Path(videos_dir) / mp4_file)))
 
         equal_match = None
         longest_match = None
@@ -114,66 +109,65 @@ class VideoEditor:
         # print(f"{mp4_file} ({mp4_duration}s) - {closest_match}")
         return closest_match
 
+    @timed('watermark_removal')
     def remove_d_id_watermark(self, input_image, output_video=None):
-        output_video = output_video or self.input_video.replace("_d_id.mp4", "_no_watermark.mp4")
+        input_video = str(self.input_video)
+        output_video = output_video or input_video.replace("_d_id.mp4", "_no_watermark.mp4")
+        resized_video = input_video.replace(".mp4", "_resized.mp4")
+        cropped_top_video = input_video.replace(".mp4", "_cropped_top.mp4")
+        resized_image = input_image.replace(".png", "_resized.png")
+        cropped_bottom_image = input_image.replace(".png", "_cropped_bottom.png")
 
         # Resize video
-        cmd_resize_video = (
-            f'ffmpeg -i \"{self.input_video}\" -vf scale={self.width}:{self.height} '
-            f'\"{self.input_video.replace(".mp4", "_resized.mp4")}\" -y'
-        )
-        self.run_command(cmd_resize_video)
+        cmd_resize_video = FFmpegCommand()
+        cmd_resize_video.input(input_video)
+        cmd_resize_video.output(resized_video, '-vf', f'scale={self.width}:{self.height}',
+                                *self.encoder_profile.output_args())
 
         # Crop top portion of video
         crop_height = self.height * (862/960)
-        cmd_crop_top_video = (
-            f'ffmpeg -i \"{self.input_video.replace(".mp4", "_resized.mp4")}\" '
-            f'-filter:v "crop=in_w:{crop_height}:0:0" '
-            f'\"{self.input_video.replace(".mp4", "_cropped_top.mp4")}\" -y'
-        )
-        self.run_command(cmd_crop_top_video)
+        cmd_crop_top_video = FFmpegCommand()
+        cmd_crop_top_video.input(resized_video)
+        cmd_crop_top_video.output(cropped_top_video, '-filter:v', f'crop=in_w:{crop_height}:0:0',
+                                  *self.encoder_profile.output_args())
 
         # Resize image
-        cmd_resize_png = (
-            f'ffmpeg -i \"{input_image}\" -vf scale={self.width}:{self.height} '
-            f'\"{input_image.replace(".png", "_resized.png")}\" -y'
-        )
-        self.run_command(cmd_resize_png)
+        cmd_resize_png = FFmpegCommand()
+        cmd_resize_png.input(input_image)
+        cmd_resize_png.output(resized_image, '-vf', f'scale={self.width}:{self.height}')
 
         # Crop bottom portion of image
         crop_height = self.height * (98/960)
-        cmd_crop_bottom_png = (
-            f'ffmpeg -i \"{input_image.replace(".png", "_resized.png")}\" '
-            f'-filter:v "crop=in_w:{crop_height}:0:{self.height}" '
-            f'\"{input_image.replace(".png", "_cropped_bottom.png")}\" -y'
-        )
-        self.run_command(cmd_crop_bottom_png)
+        cmd_crop_bottom_png = FFmpegCommand()
+        cmd_crop_bottom_png.input(resized_image)
+        cmd_crop_bottom_png.output(cropped_bottom_image, '-filter:v', f'crop=in_w:{crop_height}:0:{self.height}')
 
         # Combine top portion of the video with bottom portion of the image
-        cmd_vstack_videos = (
-            f'ffmpeg -i \"{self.input_video.replace(".mp4", "_cropped_top.mp4")}\" '
-            f'-i \"{input_image.replace(".png", "_cropped_bottom.png")}\" '
-            f'-filter_complex vstack=inputs=2 '
-            f'\"{output_video}\" -y'
-        )
-        self.run_command(cmd_vstack_videos)
+        cmd_vstack_videos = FFmpegCommand()
+        cmd_vstack_videos.input(cropped_top_video)
+        cmd_vstack_videos.input(cropped_bottom_image)
+        cmd_vstack_videos.filter(filter_node('vstack', 'inputs=2'))
+        cmd_vstack_videos.output(output_video, *self.encoder_profile.output_args())
+
+        for command in (cmd_resize_video, cmd_crop_top_video, cmd_resize_png, cmd_crop_bottom_png, cmd_vstack_videos):
+            if not self.run_command(command):
+                break
 
-        # Deleting temporary files (For Unix-based systems: Use the 'rm' command)
-        self.run_command(f'del \"{self.input_video.replace(".mp4", "_resized.mp4")}\"')
-        self.run_command(f'del \"{self.input_video.replace(".mp4", "_cropped_top.mp4")}\"')
-        self.run_command(f'del \"{input_image.replace(".png", "_resized.png")}\"')
-        self.run_command(f'del \"{input_image.replace(".png", "_cropped_bottom.png")}\"')
+        # Deleting temporary files
+        for temp_file in (resized_video, cropped_top_video, resized_image, cropped_bottom_image):
+            Path(temp_file).unlink(missing_ok=True)
 
         return output_video
 
+    @timed('music_merge')
     def merge_audio_files_with_fading_effects(self, basename=None):
 
-        if not self.temp_dir.exists():  # Check if temp directory does not exist
-            self.temp_dir.mkdir()  # Create temp directory
+        self.temp_dir = Path(self.temp_dir)
+        self.temp_dir.mkdir(parents=True, exist_ok=True)  # Create temp directory (a per-job scratch directory in jobs)
         if basename is None:
             basename = Path(self.input_video).stem.split("_")[0]
 
-        audio_filename = Path(self.find_closest_audio_match(self.input_video)).stem
+        audio_filename = Path(self.find_closest_audio_match(self.input_video, settings=self.settings)).stem
 
         # Merge audio files (narration from the video & music) with fading effects and color correction
         mp4_volume_temp_filepath = self.temp_dir / f"{basename}_volume_temp.mp4"
@@ -184,84 +178,141 @@ class VideoEditor:
         mp4_shortest_temp_filepath = self.temp_dir / f"{basename}_shortest_temp.mp4"
         mp4_output_filepath = self.processed_videos_dir / f"{basename}_output.mp4"
 
-        cmd_merge_audio_files_with_fading_effects = (
-            f'ffmpeg -i "{self.input_video}" -af "volume=12dB" -c:v copy "{mp4_volume_temp_filepath}" -y && '
-            f'ffmpeg -i "{audio_filepath}" -af "volume=-18.5dB" "{audio_volume_temp_filepath}" -y && '
-            f'ffmpeg -i "{mp4_volume_temp_filepath}" -i "{audio_volume_temp_filepath}" '
-            f'-filter_complex amix=inputs=2:duration=first "{merged_audio_temp_filepath}" -y && '
-            f'ffmpeg -i "{merged_audio_temp_filepath}" -filter_complex "afade=d=0.3, areverse, afade=d=0.3, areverse" '
-            f'"{merged_audio_faded_temp_filepath}" -y && '
-            f'ffmpeg -i "{merged_audio_faded_temp_filepath}" -i "{mp4_volume_temp_filepath}" -map 0:a -map 1:v '
-            f'-c:v copy -shortest "{mp4_shortest_temp_filepath}" -y && '
-            f'ffmpeg -i "{mp4_shortest_temp_filepath}" -c:v libx264 -crf 18 -preset slow -profile:v high -level:v 4.1 '
-            f'-pix_fmt yuv420p -colorspace bt709 -color_trc bt709 -color_primaries bt709 -c:a copy "{mp4_output_filepath}" -y'
-        )
-        # print("#######################################################################################################")
-        # print('cmd_merge_audio_files_with_fading_effects')
-        # print(cmd_merge_audio_files_with_fading_effects)
-        # print("#######################################################################################################")
-        self.run_command(cmd_merge_audio_files_with_fading_effects)
+        commands = []
+
+        # Raise the narration volume
+        command = FFmpegCommand()
+        command.input(self.input_video)
+        command.output(mp4_volume_temp_filepath, '-af', 'volume=12dB', '-c:v', 'copy')
+        commands.append(command)
+
+        # Lower the music volume
+        command = FFmpegCommand()
+        command.input(audio_filepath)
+        command.output(audio_volume_temp_filepath, '-af', 'volume=-18.5dB')
+        commands.append(command)
+
+        # Mix narration and music
+        command = FFmpegCommand()
+        command.input(mp4_volume_temp_filepath)
+        command.input(audio_volume_temp_filepath)
+        command.filter(filter_node('amix', 'inputs=2:duration=first'))
+        command.output(merged_audio_temp_filepath)
+        commands.append(command)
+
+        # Fade in and out
+        command = FFmpegCommand()
+        command.input(merged_audio_temp_filepath)
+        command.filter('afade=d=0.3, areverse, afade=d=0.3, areverse')
+        command.output(merged_audio_faded_temp_filepath)
+        commands.append(command)
+
+        # Put the mixed audio back on the video
+        command = FFmpegCommand()
+        command.input(merged_audio_faded_temp_filepath)
+        command.input(mp4_volume_temp_filepath)
+        command.output(mp4_shortest_temp_filepath, '-map', '0:a', '-map', '1:v', '-c:v', 'copy',
+                       *self.encoder_profile.audio_args(), '-shortest')
+        commands.append(command)
+
+        # Color correction
+        command = FFmpegCommand()
+        command.input(mp4_shortest_temp_filepath)
+        command.output(mp4_output_filepath,
+                       *self.encoder_profile.output_args(audio='copy'),
+                       '-colorspace', 'bt709', '-color_trc', 'bt709', '-color_primaries', 'bt709')
+        commands.append(command)
+
+        for command in commands:
+            if not self.run_command(command):
+                break
 
         # Remove temporary files
-        mp4_volume_temp_filepath.unlink()
-        audio_volume_temp_filepath.unlink()
-        merged_audio_temp_filepath.unlink()
-        merged_audio_faded_temp_filepath.unlink()
-        mp4_shortest_temp_filepath.unlink()
+        for temp_file in (mp4_volume_temp_filepath, audio_volume_temp_filepath, merged_audio_temp_filepath,
+                          merged_audio_faded_temp_filepath, mp4_shortest_temp_filepath):
+            temp_file.unlink(missing_ok=True)
 
         return mp4_output_filepath
 
+    @timed('watermark_text')
     def add_watermark_text(self, basename=None):
-        if not os.path.exists(self.temp_dir):  # Check if temp directory does not exist
-            os.mkdir(self.temp_dir)  # Create temp directory
         if basename is None:
             basename = Path(self.input_video).stem.split("_")[0]
 
         # Add watermark text
-        fontfile_filepath = os.path.join(self.assets_dir, 'fonts', 'Anton-Regular.ttf').replace("\\", "/").replace(":", "\\\\:")
-        mp4_output_wm_filepath = os.path.join(self.processed_videos_dir, f'{basename}_output_wm.mp4').replace("\\", "/")
-        cmd_add_watermark_text = (
-            f'ffmpeg -i \"{self.input_video}\" -vf "drawtext=fontfile=\"{fontfile_filepath}\": text=\'{self.watermark_text}\': fontcolor=white@0.7: '
-            f'fontsize=18: x=(w-text_w)/2: y=(h-text_h)*0.78" -codec:a copy \"{mp4_output_wm_filepath}\" -y && '
-            f'rmdir /q \"{self.temp_dir}\"'
+        fontfile_filepath = Path(self.assets_dir) / 'fonts' / 'Anton-Regular.ttf'
+        mp4_output_wm_filepath = (Path(self.processed_videos_dir) / f'{basename}_output_wm.mp4').as_posix()
+        drawtext = (
+            f'drawtext=fontfile={filter_path(fontfile_filepath)}: text={escape_filter_value(self.watermark_text)}: '
+            f'fontcolor=white@0.7: fontsize=18: x=(w-text_w)/2: y=(h-text_h)*0.78'
         )
-        # print("#######################################################################################################")
-        # print('cmd_add_watermark_text')
-        # print(cmd_add_watermark_text)
-        # print("#######################################################################################################")
+        cmd_add_watermark_text = FFmpegCommand()
+        cmd_add_watermark_text.input(self.input_video)
+        cmd_add_watermark_text.output(mp4_output_wm_filepath, '-vf', drawtext,
+                                      *self.encoder_profile.output_args(audio='copy'))
         self.run_command(cmd_add_watermark_text)
 
         return mp4_output_wm_filepath
 
+    @timed('join_videos')
     def join_videos(self, input_videos, output_filepath=None):
         if not output_filepath:
             output_filepath = "output.mp4"
 
-        # Create a string of input options for FFmpeg
-        input_options = ""
-        for input_video in input_videos:
-            input_options += f'-i "{input_video}" '
-
-        # Construct the FFmpeg command to join the videos
-        filter_complex = ""
-        stream_concatenation = ""
+        # Fast path: segments that share codec, resolution and timebase are joined without re-encoding
+        if self.concat_videos_with_stream_copy(input_videos, output_filepath, with_audio=True):
+            return output_filepath
 
-        for i in range(len(input_videos)):
-            filter_complex += f"[{i}:v:0]setsar=1[sar{i}];"
-            stream_concatenation += f"[sar{i}][{i}:a:0]"
-
-        command = (
-            f'ffmpeg {input_options}-filter_complex '
-            f'"{filter_complex}{stream_concatenation}concat=n={len(input_videos)}:v=1:a=1[outv][outa]" '
-            f'-map "[outv]" -map "[outa]" \"{output_filepath}\" -y'
-        )
+        # Join the videos with the concat filter (re-encoding), resetting the sample aspect ratio of each input
+        command = FFmpegCommand()
+        concat_inputs = []
+        for input_video in input_videos:
+            i = command.input(input_video)
+            command.filter(filter_node('setsar', '1', [f'{i}:v:0'], [f'sar{i}']))
+            concat_inputs += [f'sar{i}', f'{i}:a:0']
+        command.filter(filter_node('concat', f'n={len(input_videos)}:v=1:a=1', concat_inputs, ['outv', 'outa']))
+        command.output(output_filepath, '-map', '[outv]', '-map', '[outa]', *self.encoder_profile.output_args())
 
         # Execute the FFmpeg command
-        # print(command)
         self.run_command(command)
 
         return output_filepath
 
+    @timed('renditions')
+    def render_renditions(self, input_video, renditions, output_dir=None, basename=None) -> dict:
+        # Write every rendition (e.g. "tiktok@1080x1920,reels,shorts") of the input video with a single ffmpeg
+        # process: the video is decoded once, split, then scaled and encoded with the profile of each rendition.
+        # Returns {rendition name: output path}.
+        input_video = Path(input_video)
+        output_dir = Path(output_dir or input_video.parent)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        basename = basename or input_video.stem
+        renditions = parse_renditions(renditions, self.assets_dir)
+        if not renditions:
+            return {}
+
+        command = FFmpegCommand()
+        video = command.input(input_video)
+        labels = [f'v{index}' for index in range(len(renditions))]
+        command.filter(filter_node('split', len(renditions), [f'{video}:v:0'], labels))
+
+        output_filepaths = {}
+        for label, rendition in zip(labels, renditions):
+            output_label = label
+            if rendition.width:
+                output_label = f'{label}_scaled'
+                command.filter(filter_node('scale', f'{rendition.width}:{rendition.height}:flags=lanczos,setsar=1',
+                                           [label], [output_label]))
+            output_filepath = output_dir / f'{basename}_{rendition.name}.mp4'
+            # The audio stream is decoded once as well and encoded for every output
+            command.output(output_filepath, '-map', f'[{output_label}]', '-map', f'{video}:a?',
+                           *rendition.profile.output_args())
+            output_filepaths[rendition.name] = output_filepath
+
+        if not self.run_command(command):
+            return {}
+        return output_filepaths
+
     def extract_last_frame(self, video_file, output_path=None) -> Path:
         if output_path is None:
             output_path = Path(video_file).parent / Path(video_file).stem
@@ -270,15 +321,9 @@ class VideoEditor:
         output_path = Path(output_path)
         video_file = Path(video_file)
 
-        command = [
-            'ffmpeg',
-            '-sseof', '-1',
-            '-i', str(video_file),
-            '-update', '1',
-            '-q:v', '1',
-            str(output_path.with_suffix('.png')),
-            '-y'
-        ]
+        command = FFmpegCommand()
+        command.input(video_file, '-sseof', '-1')
+        command.output(output_path.with_suffix('.png'), '-update', '1', '-q:v', '1')
 
         # Execute the command
         self.run_command(command)
@@ -286,31 +331,55 @@ class VideoEditor:
         # Return the output path
         return output_path.with_suffix('.png')
 
-    def join_videos_without_audio(self, input_videos, output_filepath=None):
+    def grab_last_frame(self, video_file, as_array=False):
+        # Return the last frame as a PIL Image (or a NumPy array) decoded straight from an ffmpeg pipe
+        try:
+            return grab_last_frame(video_file, as_array=as_array)
+        except (OSError, ValueError, subprocess.CalledProcessError, FFmpegError) as e:
+            print(f"Frame grab failed ({e}), extracting the last frame to a PNG file instead...")
+
+        last_frame_path = self.extract_last_frame(video_file)
+        if not last_frame_path.is_file():
+            return None
+        from PIL import Image
+        with Image.open(last_frame_path) as last_frame:
+            last_frame = last_frame.convert('RGB')
+        last_frame_path.unlink()
+        return last_frame
+
+    def extract_last_frame_data(self, video_file) -> bytes:
+        # Encode the last frame as PNG bytes in memory, so it can be uploaded without a round trip to the disk
+        last_frame = self.grab_last_frame(video_file)
+        if last_frame is None:
+            return None
+
+        buffer = io.BytesIO()
+        last_frame.save(buffer, format='PNG', compress_level=1)
+        return buffer.getvalue()
+
+    def concat_videos_with_stream_copy(self, input_videos, output_filepath=None, with_audio=True):
         if not output_filepath:
             output_filepath = "output.mp4"
 
-        # Create a string of input options for FFmpeg
-        input_options = ""
-        for input_video in input_videos:
-            input_options += f'-i "{input_video}" '
+        # Returns None when the streams are not compatible, so the caller can fall back to re-encoding
+        return concat_with_stream_copy(input_videos, output_filepath, with_audio=with_audio)
 
-        # Construct the FFmpeg command to join the videos without audio
-        filter_complex = ""
+    @timed('join_videos')
+    def join_videos_without_audio(self, input_videos, output_filepath=None):
+        if not output_filepath:
+            output_filepath = "output.mp4"
 
-        for i in range(len(input_videos)):
-            if i == len(input_videos) - 1:
-                filter_complex += f" concat=n={len(input_videos)}:v=1 [v]"
-            else:
-                filter_complex += f" [{i}:v]"
+        # Fast path: segments that share codec, resolution and timebase are joined without re-encoding
+        if self.concat_videos_with_stream_copy(input_videos, output_filepath, with_audio=False):
+            return output_filepath
 
-        command = (
-            f'ffmpeg {input_options}-filter_complex "{filter_complex}" '
-            f'-map "[v]" "{output_filepath}" -y'
-        )
+        # Join the videos without audio with the concat filter (re-encoding)
+        command = FFmpegCommand()
+        concat_inputs = [f'{command.input(input_video)}:v' for input_video in input_videos]
+        command.filter(filter_node('concat', f'n={len(input_videos)}:v=1', concat_inputs, ['v']))
+        command.output(output_filepath, '-map', '[v]', *self.encoder_profile.output_args(audio=None))
 
         # Execute the FFmpeg command
-        # print(command)
         self.run_command(command)
 
         return output_filepath
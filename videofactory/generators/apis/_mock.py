@@ -0,0 +1,132 @@
+import os
+import time
+import random
+import hashlib
+import threading
+import subprocess
+from pathlib import Path
+
+from ...settings import getenv
+from ...utils.atomic import atomic_write
+
+# Offline stand-ins for the live services, used with MOCK_PROVIDERS=true (see generators/apis/*/mock_*.py).
+# They are deterministic for a given MOCK_SEED and configured with environment variables:
+#   MOCK_LATENCY       seconds every request "takes" (default: 0), with +/-25% jitter
+#   MOCK_FAILURE_RATE  probability (0 to 1) that a request fails (default: 0)
+#   MOCK_CREDITS       credits of every key: D-ID talks or Gen-2 videos (default: 100)
+#   MOCK_SEED          seed of the jitter, the failures and the generated media (default: 0)
+
+# Size of the generated images and videos (the size of the portrait videos made by the workflows)
+MOCK_WIDTH = 540
+MOCK_HEIGHT = 960
+
+# Credits left per (provider, key); shared by every instance, like the account of a real key
+_credits = {}
+_credits_lock = threading.Lock()
+
+
+class MockProviderError(Exception):
+    """A failure simulated by a mock provider (see MOCK_FAILURE_RATE)."""
+
+
+class MockBehaviour:
+    """Latency, failures and credits of one mock provider."""
+
+    def __init__(self, provider: str) -> None:
+        self.provider = provider
+        self.latency = max(0.0, float(getenv('MOCK_LATENCY', 0)))
+        self.failure_rate = min(1.0, max(0.0, float(getenv('MOCK_FAILURE_RATE', 0))))
+        self.seed = getenv('MOCK_SEED', '0')
+        self._random = random.Random(f'{self.seed}:{provider}')
+        self._lock = threading.Lock()
+
+    def _uniform(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def wait(self, scale: float = 1.0) -> None:
+        # Sleep like a request to the service would
+        if self.latency:
+            time.sleep(self.latency * scale * (0.75 + 0.5 * self._uniform()))
+
+    def fails(self) -> bool:
+        return bool(self.failure_rate) and self._uniform() < self.failure_rate
+
+    def request(self, what: str, scale: float = 1.0) -> None:
+        # Wait, then raise MockProviderError for the requests picked to fail
+        self.wait(scale)
+        if self.fails():
+            raise MockProviderError(f'{self.provider}: simulated failure of {what}')
+
+    def credits(self, key) -> int:
+        with _credits_lock:
+            return _credits.setdefault((self.provider, key), int(getenv('MOCK_CREDITS', 100)))
+
+    def spend(self, key, amount: int = 1) -> bool:
+        # Take 'amount' credits from the key; False (and nothing taken) if it hasn't enough left
+        with _credits_lock:
+            left = _credits.setdefault((self.provider, key), int(getenv('MOCK_CREDITS', 100)))
+            if left < amount:
+                return False
+            _credits[(self.provider, key)] = left - amount
+            return True
+
+
+def mock_number(*parts) -> int:
+    # Deterministic number derived from the seed and the given parts (e.g. the text of a line)
+    text = ':'.join(str(part) for part in (getenv('MOCK_SEED', '0'),) + parts)
+    return int(hashlib.sha1(text.encode('utf-8')).hexdigest()[:8], 16)
+
+
+def _run_ffmpeg(command) -> None:
+    # The real services render on their side: run ffmpeg directly, outside the scheduler and the run report
+    # (so the mock renders don't take cores or show up as stages of the workflows), into the ".part" files
+    partial_outputs = command.partial_outputs()
+    try:
+        subprocess.run(command.argv(partial=True), check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except BaseException:
+        for part in partial_outputs.values():
+            Path(part).unlink(missing_ok=True)
+        raise
+    for path, part in partial_outputs.items():
+        os.replace(part, path)
+
+
+def render_video(output_path, duration: float = None, image=None, audio=None, pattern: str = 'testsrc2') -> Path:
+    # Write an H.264 video: the image looped (or an ffmpeg test pattern) with the audio (or silence), lasting
+    # 'duration' seconds or as long as the audio
+    from ...editors._ffmpeg import FFmpegCommand
+
+    command = FFmpegCommand()
+    if image is not None and Path(image).is_file():
+        command.input(image, '-loop', '1', '-framerate', '25')
+        video_filters = f'scale={MOCK_WIDTH}:{MOCK_HEIGHT},setsar=1,format=yuv420p'
+    else:
+        command.input(f'{pattern}=size={MOCK_WIDTH}x{MOCK_HEIGHT}:rate=25', '-f', 'lavfi')
+        video_filters = 'format=yuv420p'
+    if audio is not None and Path(audio).is_file():
+        command.input(audio)
+    else:
+        command.input('anullsrc=channel_layout=stereo:sample_rate=44100', '-f', 'lavfi')
+    duration_args = ['-t', f'{duration:.3f}'] if duration else []
+    command.output(output_path, '-map', '0:v', '-map', '1:a', *duration_args, '-vf', video_filters,
+                   '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', '-shortest')
+    _run_ffmpeg(command)
+    return Path(output_path)
+
+
+def render_image(output_path, text: str = '') -> Path:
+    # Write a PNG whose colours are derived from the text, so different prompts give different images
+    from ...editors._ffmpeg import FFmpegCommand
+
+    number = mock_number(text)
+    color = f'0x{number & 0xFFFFFF:06x}'
+    command = FFmpegCommand()
+    command.input(f'color=c={color}:size={MOCK_WIDTH}x{MOCK_HEIGHT}', '-f', 'lavfi')
+    command.input(f'testsrc2=size={MOCK_WIDTH // 2}x{MOCK_HEIGHT // 2}', '-f', 'lavfi')
+    command.filter(f'[0:v][1:v]overlay=x={MOCK_WIDTH // 4}:y={MOCK_HEIGHT // 4}')
+    # Image outputs aren't written atomically by FFmpegCommand, so write the .part file here
+    with atomic_write(output_path) as part:
+        command.output(part, '-frames:v', '1', '-f', 'image2', '-c:v', 'png')
+        _run_ffmpeg(command)
+    return Path(output_path)
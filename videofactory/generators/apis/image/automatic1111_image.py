@@ -1,9 +1,8 @@
 import os
 import sys
 import json
-import webuiapi
 
-from PIL import PngImagePlugin
+from ....utils.atomic import atomic_write
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
@@ -19,6 +18,8 @@ except ImportError:
 class AutomaticImage(ImageGenerator):
     def __init__(self) -> None:
         super().__init__('automatic1111')
+        import webuiapi  # Imported here so that importing the module stays cheap
+
         # Instantiate the WebUIApi here with custom attributes if provided
         self.api = webuiapi.WebUIApi()
 
@@ -37,6 +38,9 @@ class AutomaticImage(ImageGenerator):
             sd_model_checkpoint = "juggernaut_final.safetensors [88967f03f2]"
         output_path = output_path or 'automatic1111_image.png'
 
+        import webuiapi
+        from PIL import PngImagePlugin
+
         result1 = self.api.txt2img(
             prompt=prompt,
             negative_prompt=negative_prompt,
@@ -62,7 +66,9 @@ class AutomaticImage(ImageGenerator):
         pnginfo = PngImagePlugin.PngInfo()
         pnginfo.add_text("parameters", json.dumps(result1.info))
 
-        result1.image.save(output_path, pnginfo=pnginfo)
+        # Save to a .part file and rename it, so an interrupted write never looks complete
+        with atomic_write(output_path) as part:
+            result1.image.save(part, format='PNG', pnginfo=pnginfo)
 
         return output_path
 
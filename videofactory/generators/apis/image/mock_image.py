@@ -0,0 +1,44 @@
+import os
+import sys
+
+from .._mock import MockBehaviour, render_image
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+try:
+    from image import ImageGenerator
+except ImportError:
+    # Handle the case where the module cannot be imported
+    ImageGenerator = None
+    # Log an error or raise an exception, as appropriate
+
+
+class MockImage(ImageGenerator):
+    """Offline stand-in for Stable Diffusion: writes a 540x960 test pattern on a colour derived from the prompt."""
+
+    def __init__(self) -> None:
+        super().__init__('mock')
+        self.behaviour = MockBehaviour('mock-image')
+
+    def generate_image_from_text(
+            self,
+            prompt: str,
+            output_path: str = None,
+            **kwargs
+            ) -> str:
+        # Options meant for the real generator (negative_prompt, sd_model_checkpoint, ...) are accepted and ignored
+        output_path = output_path or 'mock_image.png'
+
+        # A generation takes several times longer than the other requests
+        self.behaviour.request('txt2img', scale=5)
+        render_image(output_path, text=prompt)
+
+        return output_path
+
+
+# # Usage:
+# # To use the MockImage class, create an instance:
+# image_generator = MockImage()
+# # Then, call the generate_image_from_text method to write an image for a prompt:
+# print(image_generator.generate_image_from_text(prompt='An old monk'))
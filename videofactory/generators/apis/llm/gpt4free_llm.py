@@ -1,7 +1,6 @@
 import os
 import sys
 from typing import List
-import g4f
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
@@ -19,6 +18,8 @@ class gpt4freeLLM(LargeLanguageModel):
         super().__init__('gpt4free')
 
     def generate_chat_response(self, provider, stream: bool, content: str) -> str:
+        import g4f  # Imported on first use; g4f pulls in many provider modules
+
         # print(g4f.Provider.DeepAi.params) # supported args
         try:
             response = g4f.ChatCompletion.create(
@@ -33,6 +34,8 @@ class gpt4freeLLM(LargeLanguageModel):
             return ""
 
     def generate_chat_responses(self, query: str) -> List:
+        import g4f
+
         providers = {
             "DeepAi": {
                 "provider": g4f.Provider.DeepAi,
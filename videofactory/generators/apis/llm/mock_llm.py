@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+from typing import List
+
+from .._mock import MockBehaviour, mock_number
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+try:
+    from llm import LargeLanguageModel
+except ImportError:
+    # Handle the case where the module cannot be imported
+    LargeLanguageModel = None
+    # Log an error or raise an exception, as appropriate
+
+
+class MockLLM(LargeLanguageModel):
+    """
+    Offline stand-in for the chat providers: answers the few-shot prompts of _prompts.py with JSON in the format
+    the examples ask for (quotes, or an image prompt when the examples have "media"), derived from the query.
+    """
+
+    PROVIDERS = ('MockA', 'MockB')  # Several answers per query, like the real providers
+    QUOTES_PER_ANSWER = 3
+
+    def __init__(self) -> None:
+        super().__init__('mock')
+        self.behaviour = MockBehaviour('mock-llm')
+
+    @staticmethod
+    def _user_query(query: str) -> str:
+        # The few-shot prompt ends with "User: <query>\n AI:"; a plain query is used as it is
+        if 'User:' in query:
+            query = query.rsplit('User:', 1)[1].rsplit('AI:', 1)[0]
+        return ' '.join(query.split()) or 'Nothing'
+
+    def generate_chat_response(self, provider, stream: bool, content: str) -> str:
+        try:
+            self.behaviour.request(f'chat completion ({provider})')
+        except Exception as e:
+            print(f"Unknown error occurred for provider {provider}: {e}")
+            return ""
+
+        topic = self._user_query(content)
+        number = mock_number(provider, topic)
+        if '"media"' in content:
+            answer = {
+                'topic': topic,
+                'prompt': {
+                    'media': 'masterpiece, best quality, highres',
+                    'subject': topic,
+                    'describe': f'variation {number % 1000}, soft light, calm expression',
+                    'art': 'digital painting'
+                }
+            }
+        else:
+            answer = {
+                'topic': topic,
+                'quotes': [{
+                    'quote': f'{topic} is a journey: take step {number % 100 + i} with patience and keep going.',
+                    'short': f'{topic} step {number % 100 + i}'
+                } for i in range(self.QUOTES_PER_ANSWER)]
+            }
+        return json.dumps(answer)
+
+    def generate_chat_responses(self, query: str) -> List:
+        responses = []  # Store the responses
+        for provider_name in self.PROVIDERS:
+            response = self.generate_chat_response(provider=provider_name, stream=False, content=query)
+            if response:
+                # Append the response and provider name to the list
+                responses.append((response, provider_name))
+        return responses
+
+
+# # Usage:
+# # To use the MockLLM class, create an instance:
+# llm = MockLLM()
+# # Then, call the generate_chat_responses function with a query:
+# for response, provider_name in llm.generate_chat_responses(query='Family'):
+#     print(f'{provider_name}:', response)
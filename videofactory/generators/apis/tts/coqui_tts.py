@@ -2,6 +2,9 @@ import os
 import sys
 import requests
 
+from ....settings import getenv
+from ....utils.atomic import atomic_write
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
@@ -17,7 +20,7 @@ class CoquiTTS(TextToSpeech):
 
     def __init__(self, key: str = None) -> None:
         super().__init__('coqui')
-        self.key: str = key or os.environ.get('COQUI_BEARER_TOKEN', None)
+        self.key: str = key or getenv('COQUI_BEARER_TOKEN', None)
 
     def generate_audio(
         self,
@@ -29,11 +32,11 @@ class CoquiTTS(TextToSpeech):
     ) -> None:
         # Check if the arguments are provided, if not, fetch from environment variables or use defaults
         if voice_id is None:
-            voice_id = os.environ.get('COQUI_VOICE_ID', '6720d486-5d43-4d92-8893-57a1b58b334d')  # Default voice: 'Dionisio Schuyler'  # noqa
+            voice_id = getenv('COQUI_VOICE_ID', '6720d486-5d43-4d92-8893-57a1b58b334d')  # Default voice: 'Dionisio Schuyler'  # noqa
         if emotion is None:
-            emotion = os.environ.get('COQUI_VOICE_EMOTION', 'Neutral')
+            emotion = getenv('COQUI_VOICE_EMOTION', 'Neutral')
         if speed is None:
-            speed = float(os.environ.get('COQUI_VOICE_SPEED', 0.85))
+            speed = float(getenv('COQUI_VOICE_SPEED', 0.85))
 
         url: str = 'https://app.coqui.ai/api/v2/samples'
         headers: dict = {
@@ -65,7 +68,8 @@ class CoquiTTS(TextToSpeech):
 
         if response.status_code == 201:
             # Save the response to a file
-            with open(output_path, 'wb') as f:
+            # Write to a .part file and rename it, so an interrupted write never looks complete
+            with atomic_write(output_path) as part, open(part, 'wb') as f:
                 f.write(r.content)
         else:
             print(f'Error: ({os.path.basename(output_path)})', response.status_code)
@@ -2,6 +2,9 @@ import os
 import sys
 import requests
 
+from ....settings import getenv
+from ....utils.atomic import atomic_write
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
@@ -18,7 +21,7 @@ class ElevenLabsTTS(TextToSpeech):
 
     def __init__(self, key: str = None) -> None:
         super().__init__('elevenlabs')
-        self.key: str = key or os.environ.get('ELEVENLABS_API_KEY', None)
+        self.key: str = key or getenv('ELEVENLABS_API_KEY', None)
 
     def _get_url(self, voice_id: str) -> str:
         return f'{self.BASE_URL}/{voice_id}?optimize_streaming_latency=0'
@@ -33,11 +36,11 @@ class ElevenLabsTTS(TextToSpeech):
     ) -> None:
         # Check if the arguments are provided, if not, fetch from environment variables or use defaults
         if voice_id is None:
-            voice_id = os.environ.get('ELEVENLABS_VOICE_ID', 'pNInz6obpgDQGcFmaJgB')  # Default voice: 'Adam'
+            voice_id = getenv('ELEVENLABS_VOICE_ID', 'pNInz6obpgDQGcFmaJgB')  # Default voice: 'Adam'
         if stability is None:
-            stability = float(os.environ.get('ELEVENLABS_STABILITY', 0.5))
+            stability = float(getenv('ELEVENLABS_STABILITY', 0.5))
         if similarity_boost is None:
-            similarity_boost = float(os.environ.get('ELEVENLABS_SIMILARITY_BOOST', 0.75))
+            similarity_boost = float(getenv('ELEVENLABS_SIMILARITY_BOOST', 0.75))
 
         url: str = self._get_url(voice_id)
         headers: dict = {
@@ -57,8 +60,8 @@ class ElevenLabsTTS(TextToSpeech):
         # Make the API request
         response = requests.post(url, headers=headers, json=payload)
 
-        # Save the response to a file
-        with open(output_path, 'wb') as f:
+        # Save the response to a .part file and rename it, so an interrupted write never looks complete
+        with atomic_write(output_path) as part, open(part, 'wb') as f:
             f.write(response.content)
 
 
@@ -3,6 +3,9 @@ import sys
 import time
 import requests
 
+from ....settings import getenv
+from ....utils.atomic import atomic_write
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
@@ -18,7 +21,7 @@ class FptTTS(TextToSpeech):
 
     def __init__(self, key: str = None) -> None:
         super().__init__('fpt')
-        self.key: str = key or os.environ.get('FPT_API_KEY', None)
+        self.key: str = key or getenv('FPT_API_KEY', None)
 
     def generate_audio(
         self,
@@ -29,9 +32,9 @@ class FptTTS(TextToSpeech):
     ) -> None:
         # Check if the arguments are provided, if not, fetch from environment variables or use defaults
         if voice is None:
-            voice = os.environ.get('FPT_VOICE', 'leminh'),  # Default: 'leminh' (male northern)
+            voice = getenv('FPT_VOICE', 'leminh'),  # Default: 'leminh' (male northern)
         if speed is None:
-            speed = float(os.environ.get('FPT_SPEED', '0'))
+            speed = float(getenv('FPT_SPEED', '0'))
 
         url: str = 'https://api.fpt.ai/hmi/tts/v5'
         headers: dict = {
@@ -57,7 +60,8 @@ class FptTTS(TextToSpeech):
             r = requests.get(async_url, stream=True)
             if r.status_code == 200 and error == 0:
                 # Write the content of the response to the file
-                with open(output_path, 'wb') as f:
+                # Write to a .part file and rename it, so an interrupted write never looks complete
+                with atomic_write(output_path) as part, open(part, 'wb') as f:
                     f.write(r.content)
                 break
             else:
@@ -0,0 +1,76 @@
+import os
+import sys
+import math
+import wave
+import array
+
+from .._mock import MockBehaviour, mock_number
+from ....settings import getenv
+from ....utils.atomic import atomic_write
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+try:
+    from tts import TextToSpeech
+except ImportError:
+    # Handle the case where the module cannot be imported
+    TextToSpeech = None
+    # Log an error or raise an exception, as appropriate
+
+
+class MockTTS(TextToSpeech):
+    """
+    Offline stand-in for the TTS services: writes a WAV tone (or silence) instead of speech.
+    The duration follows the length of the text, like speech would, and the pitch is derived from the text.
+    """
+
+    SAMPLE_RATE = 22050
+    SECONDS_PER_CHARACTER = 0.06  # About 15 characters per second, a calm speaking pace
+
+    def __init__(self, key: str = None) -> None:
+        super().__init__('mock')
+        self.key: str = key or 'mock'
+        self.behaviour = MockBehaviour('mock-tts')
+
+    def generate_audio(
+        self,
+        text: str,
+        silence: bool = None,
+        output_path: str = 'mock_tts.wav',
+        **kwargs
+    ) -> None:
+        # Per-line configs meant for the real providers (voice, speed, ...) are accepted and ignored
+        if silence is None:
+            silence = getenv('MOCK_TTS_SILENCE', 'false').lower() in ('1', 'true', 'yes', 'on')
+
+        try:
+            self.behaviour.request('generate_audio')
+        except Exception as e:
+            # Same as the real providers: report the error and leave no file
+            print(f'Error: ({os.path.basename(str(output_path))})', e)
+            return
+
+        duration = max(1.0, len(text.strip()) * self.SECONDS_PER_CHARACTER)
+        frequency = 220 + mock_number(text) % 440
+        samples = array.array('h', bytes(2 * int(duration * self.SAMPLE_RATE)))
+        if not silence:
+            for i in range(len(samples)):
+                # Fade in and out over 50ms, so the tone doesn't click when audios are joined
+                t = i / self.SAMPLE_RATE
+                fade = min(1.0, t / 0.05, (duration - t) / 0.05)
+                samples[i] = int(8000 * fade * math.sin(2 * math.pi * frequency * t))
+
+        # Write to a .part file and rename it, so an interrupted write never looks complete
+        with atomic_write(output_path) as part, wave.open(str(part), 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(self.SAMPLE_RATE)
+            f.writeframes(samples.tobytes())
+
+
+# # Usage:
+# # To use the MockTTS class, create an instance (no key is needed):
+# tts = MockTTS()
+# # Then, call the generate_audio method to write a tone as long as the text would be spoken:
+# tts.generate_audio(text='Hello, world!')
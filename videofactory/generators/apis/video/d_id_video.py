@@ -4,6 +4,9 @@ import requests
 import json
 import time
 
+from ....settings import getenv
+from ....utils.atomic import atomic_write
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
@@ -18,7 +21,7 @@ except ImportError:
 class DidVideo(VideoGenerator):
     def __init__(self, key: str = None) -> None:
         super().__init__('d-id')
-        self.key: str = key or os.environ.get('D-ID_BASIC_TOKEN', None)
+        self.key: str = key or getenv('D-ID_BASIC_TOKEN', None)
 
     @staticmethod
     def download_video(token: str, url: str, output_path: str) -> None:
@@ -33,9 +36,10 @@ class DidVideo(VideoGenerator):
             res_data = response.json()
             if res_data['status'] == 'done':
                 r = requests.get(res_data['result_url'])
-                with open(output_path, 'wb') as file_handle:
+                # Write to a .part file and rename it, so an interrupted download never looks complete
+                with atomic_write(output_path) as part, open(part, 'wb') as file_handle:
                     file_handle.write(r.content)
-                    print(f'Downloaded successfully: {output_path}')
+                print(f'Downloaded successfully: {output_path}')
             else:
                 print("Status is not 'done'")
                 raise requests.RequestException("Status is not 'done'")
@@ -0,0 +1,181 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+import requests
+
+
+class Gen2TaskPoller:
+    """
+    Shared status poller for in-flight Gen-2 tasks.
+
+    A single background thread checks every submitted task, grouped by API key so that all tasks of one key
+    are checked in the same pass over one pooled HTTP session. The interval between two checks of a task
+    adapts to its `progressRatio`: slow while the task has just started, fast when it is about to finish.
+    Waiters receive a `concurrent.futures.Future` that resolves to the artifact URL (or None on failure).
+    """
+
+    API_URL = 'https://api.runwayml.com/v1/tasks'
+
+    def __init__(self, min_interval: float = 1.0, max_interval: float = 10.0, timeout: float = 300.0) -> None:
+        self.min_interval = min_interval  # Interval used when a task is (almost) complete
+        self.max_interval = max_interval  # Interval used when a task has just started
+        self.timeout = timeout  # Maximum time to wait for a task (default 5 minutes, as before)
+
+        self._condition = threading.Condition()
+        self._schedule = []  # Heap of (due_time, sequence, task_id)
+        self._tasks: Dict[str, dict] = {}  # task_id -> task state
+        self._sessions: Dict[str, requests.Session] = {}  # authorization header -> pooled session
+        self._sequence = itertools.count()
+        self._thread = None
+
+    def submit(self, task_id: str, team_id, headers: dict,
+               callback: Optional[Callable[[Future], None]] = None) -> Future:
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+
+        with self._condition:
+            if task_id in self._tasks:
+                # The task is already being polled; attach the waiter to the existing future instead
+                existing = self._tasks[task_id]['future']
+                existing.add_done_callback(lambda f: future.set_result(f.result()))
+                return future
+
+            now = time.monotonic()
+            self._tasks[task_id] = {
+                'team_id': team_id,
+                'headers': dict(headers),
+                'future': future,
+                'deadline': now + self.timeout,
+                'attempts': 0,
+            }
+            heapq.heappush(self._schedule, (now, next(self._sequence), task_id))
+            self._ensure_thread()
+            self._condition.notify()
+
+        return future
+
+    def wait(self, task_id: str, team_id, headers: dict) -> Optional[str]:
+        return self.submit(task_id, team_id, headers).result()
+
+    def next_interval(self, progress_ratio) -> float:
+        # Interpolate linearly between max_interval (progress 0) and min_interval (progress 1)
+        try:
+            progress = min(max(float(progress_ratio), 0.0), 1.0)
+        except (TypeError, ValueError):
+            progress = 0.0
+        return self.max_interval - (self.max_interval - self.min_interval) * progress
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='gen-2-task-poller', daemon=True)
+            self._thread.start()
+
+    def _session(self, authorization: str) -> requests.Session:
+        session = self._sessions.get(authorization)
+        if session is None:
+            session = self._sessions[authorization] = requests.Session()
+        return session
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                # Wait until at least one task is due, waking up early if a new task is submitted
+                while True:
+                    if not self._schedule:
+                        if not self._condition.wait(timeout=60):
+                            if not self._schedule:
+                                self._thread = None
+                                return
+                        continue
+                    delay = self._schedule[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(timeout=delay)
+
+                # Collect every due task, grouped by key, so they are all checked in the same pass
+                now = time.monotonic()
+                due_by_key: Dict[str, list] = {}
+                while self._schedule and self._schedule[0][0] <= now:
+                    _, _, task_id = heapq.heappop(self._schedule)
+                    task = self._tasks.get(task_id)
+                    if task is not None:
+                        due_by_key.setdefault(task['headers'].get('Authorization', ''), []).append(task_id)
+
+            for authorization, task_ids in due_by_key.items():
+                self._check_tasks(authorization, task_ids)
+
+    def _check_tasks(self, authorization: str, task_ids: list) -> None:
+        session = self._session(authorization)
+
+        for task_id in task_ids:
+            try:
+                self._check_task(session, task_id)
+            except Exception as e:
+                # Never let one task kill the poller thread (and leave the other tasks' waiters blocked forever)
+                print('\033[91m' + f'Failed to check task {task_id}: {e!r}' + '\033[0m')
+                self._finish(task_id, None)
+
+    def _finish(self, task_id: str, url: Optional[str]) -> None:
+        with self._condition:
+            task = self._tasks.pop(task_id, None)
+        if task is not None and not task['future'].done():
+            task['future'].set_result(url)
+
+    def _check_task(self, session: requests.Session, task_id: str) -> None:
+        task = self._tasks[task_id]
+        task['attempts'] += 1
+        url, progress_ratio = None, 0.0
+        finished = False
+
+        try:
+            response = session.get(f"{self.API_URL}/{task_id}?asTeamId={task['team_id']}",
+                                   headers=task['headers'])
+            if response.status_code == 200:
+                task_data = response.json()["task"]
+                task_status = task_data["status"]
+                task_artifacts = task_data["artifacts"]
+                progress_ratio = task_data["progressRatio"]
+
+                print(f'Task status: {task_status}; Progress Ratio: {progress_ratio}')
+
+                if (task_status == "SUCCEEDED" and task_artifacts
+                        and len(task_artifacts) > 0 and "url" in task_artifacts[0]):
+                    url, finished = task_artifacts[0]["url"], True
+                elif task_status == "FAILED":
+                    print('\033[91m' + f'Task failed after {task["attempts"]} attempts.' + '\033[0m')
+                    finished = True
+        except requests.RequestException as e:
+            print(f'Failed to fetch task status: {e}')
+        except (KeyError, TypeError, ValueError) as e:
+            # Unexpected response (not JSON, or without the task fields): the task is reported as failed
+            print('\033[91m' + f'Unexpected task status response: {e!r}' + '\033[0m')
+            finished = True
+
+        if not finished and time.monotonic() + self.next_interval(progress_ratio) > task['deadline']:
+            print('Maximum attempts reached. Task status remains unknown.')
+            finished = True
+
+        if finished:
+            self._finish(task_id, url)
+            return
+        with self._condition:
+            due = time.monotonic() + self.next_interval(progress_ratio)
+            heapq.heappush(self._schedule, (due, next(self._sequence), task_id))
+
+
+# Poller shared by every Gen2Video instance in the process
+_shared_poller = None
+_shared_poller_lock = threading.Lock()
+
+
+def get_shared_poller() -> Gen2TaskPoller:
+    global _shared_poller
+    with _shared_poller_lock:
+        if _shared_poller is None:
+            _shared_poller = Gen2TaskPoller()
+        return _shared_poller
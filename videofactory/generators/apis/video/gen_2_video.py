@@ -4,11 +4,14 @@ import requests
 from pathlib import Path
 
 import uuid
-import time
 import random
+from concurrent.futures import Future
 
 import string
 
+from .gen_2_task_poller import get_shared_poller
+from ....settings import getenv
+from ....utils.atomic import atomic_write
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
@@ -24,7 +27,7 @@ except ImportError:
 class Gen2Video(VideoGenerator):
     def __init__(self, key: str = None) -> None:
         super().__init__('gen-2')
-        self.key: str = key or os.environ.get('GEN_2_BEARER_TOKEN', None)  # F12 > Local storage > RW_USER_TOKEN
+        self.key: str = key or getenv('GEN_2_BEARER_TOKEN', None)  # F12 > Local storage > RW_USER_TOKEN
         self.headers = {
             "Authorization": f"Bearer {self.key}",
             "Origin": "https://app.runwayml.com",
@@ -46,7 +49,8 @@ class Gen2Video(VideoGenerator):
         success_status_codes = {200, 206}
 
         if response.status_code in success_status_codes:
-            with open(output_path, "wb") as f:
+            # Write to a .part file and rename it, so an interrupted download never looks complete
+            with atomic_write(output_path) as part, open(part, "wb") as f:
                 for chunk in response.iter_content(chunk_size=8192):
                     f.write(chunk)
             print('\033[92m' + f'Video downloaded successfully to "{output_path}"' + '\033[0m')
@@ -97,8 +101,12 @@ class Gen2Video(VideoGenerator):
             'Content-Type': 'image/png'
         }
 
-        with open(image_path, 'rb') as image_file:
-            image_data = image_file.read()
+        # Accept either a path to a PNG file or the PNG bytes themselves (e.g. a frame grabbed in memory)
+        if isinstance(image_path, (bytes, bytearray)):
+            image_data = image_path
+        else:
+            with open(image_path, 'rb') as image_file:
+                image_data = image_file.read()
 
         response = requests.put(upload_url, data=image_data, headers=headers)
         etag = response.headers.get('ETag')
@@ -304,30 +312,13 @@ class Gen2Video(VideoGenerator):
             print("Failed to perform generation")
 
     def step_13_check_task_status_and_get_url(self, task_id, team_id):
-        url = f"https://api.runwayml.com/v1/tasks/{task_id}?asTeamId={team_id}"
-        max_attempts = 60  # Maximum number of attempts to check task status (60 * 5 seconds = 5 minutes)
-
-        for attempt in range(1, max_attempts + 1):
-            response = requests.get(url, headers=self.headers)
-            if response.status_code == 200:
-                task_data = response.json()["task"]
-                task_status = task_data["status"]
-                task_artifacts = task_data["artifacts"]
-                task_progressRatio = task_data["progressRatio"]
-
-                print(f'Task status: {task_status}; Progress Ratio: {task_progressRatio}')
-
-                if (task_status == "SUCCEEDED" and task_artifacts
-                        and len(task_artifacts) > 0 and "url" in task_artifacts[0]):
-                    return task_artifacts[0]["url"]
-                elif task_status == "FAILED":
-                    print('\033[91m' + f'Task failed after {attempt} attempts.' + '\033[0m')
-                    return
-
-            time.sleep(5)  # Wait for 5 seconds before checking the task status again
+        # Block until the shared poller reports the task as finished (5 minutes at most)
+        return self.step_13_watch_task(task_id, team_id).result()
 
-        print('Maximum attempts reached. Task status remains unknown.')
-        return
+    def step_13_watch_task(self, task_id, team_id, callback=None) -> Future:
+        # Hand the task over to the poller shared by all Gen2Video instances.
+        # The returned future resolves to the generated video URL, or None if the task failed or timed out.
+        return get_shared_poller().submit(task_id, team_id, self.headers, callback=callback)
     # endregion
 
 
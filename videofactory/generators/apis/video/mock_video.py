@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import uuid
+import base64
+import random
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from concurrent.futures import Future
+
+from .._mock import MockBehaviour, render_video
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+try:
+    from video import VideoGenerator
+except ImportError:
+    # Handle the case where the module cannot be imported
+    VideoGenerator = None
+    # Log an error or raise an exception, as appropriate
+
+
+def _encode_id(prefix: str, data: dict) -> str:
+    # Ids carry their inputs, so any instance (or a later run) can render the result, like a real talk id
+    return prefix + base64.urlsafe_b64encode(json.dumps(data).encode('utf-8')).decode('ascii')
+
+
+def _decode_id(prefix: str, id: str) -> dict:
+    if not id or not id.startswith(prefix):
+        raise ValueError(f'Not a mock id: {id}')
+    return json.loads(base64.urlsafe_b64decode(id[len(prefix):].encode('ascii')))
+
+
+class MockDidVideo(VideoGenerator):
+    """
+    Offline stand-in for D-ID: a "talk" is the image looped for as long as the audio.
+    Every talk takes one credit of the key (MOCK_CREDITS); create_talk fails like D-ID once none are left.
+    """
+
+    TALK_PREFIX = 'tlk_mock_'
+    ANIMATION_PREFIX = 'anm_mock_'
+    ANIMATION_SECONDS = 5
+    RENDER_SCALE = 5  # A talk takes several times longer to render than the other requests
+
+    def __init__(self, key: str = None) -> None:
+        super().__init__('d-id')
+        self.key: str = key or 'mock'
+        self.behaviour = MockBehaviour('mock-d-id')
+
+    def get_credits(self) -> int:
+        self.behaviour.wait()
+        return self.behaviour.credits(self.key)
+
+    def upload_image(self, image) -> str:
+        try:
+            self.behaviour.request('upload_image')
+            image_url = f'mock://d-id/images/{Path(image).resolve().as_posix()}'
+            print('Image URL:', image_url)
+            return image_url
+        except Exception as e:
+            print(f"An error occurred in upload_image function: {str(e)}")
+
+    def upload_audio(self, audio) -> str:
+        try:
+            self.behaviour.request('upload_audio')
+            audio_url = f'mock://d-id/audios/{Path(audio).resolve().as_posix()}'
+            print('Audio URL:', audio_url)
+            return audio_url
+        except Exception as e:
+            print(f"An error occurred in upload_audio function: {str(e)}")
+
+    @staticmethod
+    def _local_path(url: str) -> str:
+        # mock://d-id/images/<path> -> <path>
+        return url.split('/', 4)[4] if url and url.startswith('mock://') else None
+
+    def create_talk(
+            self,
+            audio_url: str,
+            image_url: str,
+            expression: str = 'neutral',
+            intensity: float = 1) -> str:
+        try:
+            self.behaviour.request('create_talk')
+        except Exception as e:
+            print("Error: POST request was not successful:", e)
+            return None
+        if not self.behaviour.spend(self.key):
+            raise Exception("Not enough credits.")
+        return _encode_id(self.TALK_PREFIX, {'image': self._local_path(image_url), 'audio': self._local_path(audio_url),
+                                             'expression': expression})
+
+    def get_talk(self, id: str, output_path: str = 'd_id_talk.mp4') -> None:
+        print('Talk Video URL:', f'mock://d-id/talks/{id}')
+        try:
+            talk = _decode_id(self.TALK_PREFIX, id)
+            self.behaviour.request('get_talk', scale=self.RENDER_SCALE)
+            render_video(output_path, image=talk['image'], audio=talk['audio'])
+            print(f'Downloaded successfully: {output_path}')
+        except Exception as e:
+            print(f"Failed to download video from mock://d-id/talks/{id}: {e}")
+
+    def create_animation(self, image_url: str, driver: str = 'subtle') -> str:
+        self.behaviour.request('create_animation')
+        if not self.behaviour.spend(self.key):
+            raise Exception("Not enough credits.")
+        return _encode_id(self.ANIMATION_PREFIX, {'image': self._local_path(image_url), 'driver': driver})
+
+    def get_animation(self, id: str, output_path: str = 'd_id_animation.mp4') -> None:
+        try:
+            animation = _decode_id(self.ANIMATION_PREFIX, id)
+            self.behaviour.request('get_animation', scale=self.RENDER_SCALE)
+            render_video(output_path, duration=self.ANIMATION_SECONDS, image=animation['image'])
+            print(f'Downloaded successfully: {output_path}')
+        except Exception as e:
+            print(f"Failed to download video from mock://d-id/animations/{id}: {e}")
+
+
+# Uploads and tasks of the mock Gen-2 service, shared by every instance like the server side of the real one
+_uploads = {}  # upload id -> PNG path or bytes
+_tasks = {}  # task id -> {'image': upload URL, 'seed': seed}
+_gen_2_lock = threading.Lock()
+
+
+class MockGen2Video(VideoGenerator):
+    """
+    Offline stand-in for Gen-2: a generation is the uploaded image looped for 4 seconds.
+    Every video takes one credit of the key (MOCK_CREDITS). The profile reports them as GPU credits the way
+    Gen-2 does, so VideoGenerator.rotate_key moves to the next key, and raises LastKeyReachedException after the
+    last one, when they run out.
+    """
+
+    VIDEO_SECONDS = 4
+    GPU_USAGE_LIMIT = 5  # GPU credits per second of video
+    GENERATION_SCALE = 20  # A generation takes much longer than the other requests
+
+    def __init__(self, key: str = None) -> None:
+        super().__init__('gen-2')
+        self.key: str = key or 'mock'
+        self.headers = {"Authorization": f"Bearer {self.key}"}
+        self.behaviour = MockBehaviour('mock-gen-2')
+
+    @staticmethod
+    def _upload_url(upload_id) -> str:
+        return f'mock://gen-2/uploads/{upload_id}'
+
+    def step_0_get_profile(self, key=None):
+        key = key or self.key
+        self.behaviour.wait()
+        # The extra GPU_USAGE_LIMIT makes an exhausted key report "gpuCredits == gpuUsageLimit", which is what
+        # rotate_key_for_gen_2 takes as out of credits
+        gpuCredits = self.behaviour.credits(key) * self.VIDEO_SECONDS * self.GPU_USAGE_LIMIT + self.GPU_USAGE_LIMIT
+        gpuUsageLimit = self.GPU_USAGE_LIMIT
+        seconds_left = int(gpuCredits / gpuUsageLimit)
+        return f'mock-{key}', gpuCredits, gpuUsageLimit, seconds_left
+
+    def step_1_upload_image(self, image_filename):
+        self.behaviour.request('upload_image')
+        upload_id = str(uuid.uuid4())
+        return upload_id, self._upload_url(upload_id)
+
+    def step_2_put_image(self, upload_url, image_path):
+        self.behaviour.request('put_image')
+        # 'image_path' is a path to a PNG file or the PNG bytes themselves
+        data = image_path if isinstance(image_path, (bytes, bytearray)) else str(Path(image_path).resolve())
+        with _gen_2_lock:
+            _uploads[upload_url.rsplit('/', 1)[1]] = data
+        etag = hashlib.md5(data if isinstance(data, (bytes, bytearray)) else data.encode('utf-8')).hexdigest()
+        return 200, etag
+
+    def step_3_complete_upload(self, upload_id, etag):
+        self.behaviour.wait()
+        return self._upload_url(upload_id)
+
+    def step_4_upload_preview_image(self, image_filename):
+        return self.step_1_upload_image(image_filename)
+
+    def step_5_complete_upload_preview(self, preview_upload_id, etag):
+        return self.step_3_complete_upload(preview_upload_id, etag)
+
+    def step_6_complete_upload_preview(self, preview_upload_id, etag):
+        return self.step_3_complete_upload(preview_upload_id, etag)
+
+    def step_7_create_dataset(self, image_filename, upload_id, preview_upload_id):
+        self.behaviour.wait()
+        return str(uuid.uuid4())
+
+    @staticmethod
+    def generate_random_seed() -> int:
+        return random.randint(0, 4294967295)
+
+    def step_8_get_teams(self):
+        self.behaviour.wait()
+        return 1
+
+    def step_9_send_mp_user_event(self, username, seed, image_prompt, init_image, sessionId=None, interpolate=False):
+        pass
+
+    def step_10_create_task(self, team_id, seed, image_prompt, init_image, interpolate=False):
+        try:
+            self.behaviour.request('create_task')
+        except Exception as e:
+            print(f"Error creating task: {e}")
+            return None
+        if not self.behaviour.spend(self.key):
+            print("Error creating task: not enough credits.")
+            return None
+        task_id = str(uuid.uuid4())
+        with _gen_2_lock:
+            _tasks[task_id] = {'image': init_image, 'seed': seed}
+        return task_id
+
+    def step_11_check_task_status(self, task_id, team_id):
+        self.behaviour.wait()
+        return 'PENDING' if task_id in _tasks else None
+
+    def step_12_perform_generation(self, task_id, image_prompt, init_image, seed, interpolate=False):
+        self.behaviour.wait()
+        with _gen_2_lock:
+            if task_id not in _tasks:
+                return None
+            # The generation uses the full image; the task was created with its preview
+            _tasks[task_id]['image'] = init_image
+        return str(uuid.uuid4())
+
+    def step_13_check_task_status_and_get_url(self, task_id, team_id):
+        # Block until the task finishes and return the generated video URL, or None if it failed
+        return self.step_13_watch_task(task_id, team_id).result()
+
+    def step_13_watch_task(self, task_id, team_id, callback=None) -> Future:
+        # Resolves to the video URL (or None if the task failed) once the simulated generation is over
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+
+        def finish():
+            failed = task_id not in _tasks or self.behaviour.fails()
+            future.set_result(None if failed else f'mock://gen-2/videos/{task_id}.mp4')
+
+        if task_id is None or not self.behaviour.latency:
+            finish()
+        else:
+            timer = threading.Timer(self.behaviour.latency * self.GENERATION_SCALE, finish)
+            timer.daemon = True
+            timer.start()
+        return future
+
+    @classmethod
+    def download_video(cls, url: str, output_path: Path) -> None:
+        task_id = url.rsplit('/', 1)[1][:-len('.mp4')] if url and url.startswith('mock://gen-2/videos/') else None
+        task = _tasks.get(task_id)
+        if task is None:
+            print(f'Failed to download video. Unknown URL: {url}')
+            return
+
+        with _gen_2_lock:
+            image = _uploads.get(str(task['image']).rsplit('/', 1)[1])
+        temporary_image = None
+        if isinstance(image, (bytes, bytearray)):
+            # Frames grabbed in memory are uploaded as bytes; ffmpeg needs a file
+            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as f:
+                f.write(image)
+            image = temporary_image = f.name
+        try:
+            render_video(output_path, duration=cls.VIDEO_SECONDS, image=image, pattern='testsrc')
+            print('\033[92m' + f'Video downloaded successfully to "{output_path}"' + '\033[0m')
+        except Exception as e:
+            print(f'Failed to download video: {e}')
+        finally:
+            if temporary_image:
+                Path(temporary_image).unlink(missing_ok=True)
+
+
+# # Usage:
+# # To use the mock classes, create instances with any key (credits are counted per key):
+# d_id = MockDidVideo(key='key1')
+# talk_id = d_id.create_talk(audio_url=d_id.upload_audio('line.wav'), image_url=d_id.upload_image('01.png'))
+# d_id.get_talk(talk_id, output_path='01_d_id.mp4')
@@ -1,17 +1,20 @@
 from .apis.image.automatic1111_image import AutomaticImage
+from .apis.image.mock_image import MockImage
 
 
 class ImageGenerator:
     IMGGEN_CLASSES = {
         'automatic1111': AutomaticImage,
+        'mock': MockImage,
     }
 
-    def __init__(self, imggen_provider):
+    def __init__(self, imggen_provider, mock: bool = False):
         self.imggen_provider = imggen_provider
+        self.mock = mock  # Use the offline 'mock' generator whatever the generator asked for (MOCK_PROVIDERS)
         self.imggen = self._create_imggen_instance()
 
     def _create_imggen_instance(self):
-        ImgGenClass = self.IMGGEN_CLASSES.get(self.imggen_provider)
+        ImgGenClass = self.IMGGEN_CLASSES.get('mock' if self.mock else self.imggen_provider)
         if ImgGenClass is None:
             raise ValueError(f'Unsupported image generator: {self.imggen_provider}')
         return ImgGenClass()
@@ -1,34 +1,64 @@
 import os
 import json
 import re
-import subprocess
-import stable_whisper
+import threading
 import pysubs2
-import configparser
+from functools import lru_cache
 from pathlib import Path
 
+from ..editors._ffmpeg import FFmpegCommand, escape_filter_value, filter_path, run_command
+from ..editors._probe import get_stream
+from ..editors._profiles import load_encoder_profile
+from ..settings import Settings, get_settings
+from ..utils.scheduler import get_scheduler
+from ..utils.timing import timed
+
+
+# The whisper model is shared by every SubtitleGenerator, so transcriptions run one at a time
+_transcribe_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _load_whisper_model(name: str):
+    # Loaded once per process and shared by every SubtitleGenerator (e.g. one per job)
+    import stable_whisper
+    return stable_whisper.load_model(name)
+
 
 class SubtitleGenerator:
     def __init__(self,
                  model=None,
                  assets_dir=None,
                  input_dir=None,
-                 processed_dir=None):
+                 processed_dir=None,
+                 encoder_profile=None,
+                 settings: Settings = None):
 
-        self.model = model or stable_whisper.load_model('base')
+        # The whisper model (and torch) is only loaded when the first transcription is requested
+        self._model = model
+        self._model_lock = threading.Lock()
 
-        # Get the project folder (VideoFactory)
-        project_folder = Path(__file__).resolve().parent.parent.parent
+        self.settings = settings or get_settings()
 
-        # Read the configuration file
-        config = configparser.ConfigParser()
-        config_path = project_folder / "config.ini"
-        config.read(config_path)
+        # Explicit arguments take precedence over the paths from the settings (config.ini)
+        self.assets_dir = Path(assets_dir or self.settings.assets_dir)
+        self.input_dir = Path(input_dir or self.settings.input_dir)
+        self.processed_dir = Path(processed_dir or self.settings.processed_dir)
 
-        # Use Path concatenation for assets_dir, input_dir, and processed_dir
-        self.assets_dir = assets_dir or (project_folder / config.get('paths', 'assets_dir'))
-        self.input_dir = input_dir or (project_folder / config.get('paths', 'input_dir'))
-        self.processed_dir = Path(processed_dir or (project_folder / config.get('paths', 'processed_dir')))
+        # Encoding settings used when burning the subtitles
+        self.encoder_profile = load_encoder_profile(encoder_profile or self.settings.encoder_profile,
+                                                    self.assets_dir)
+
+    @property
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                self._model = _load_whisper_model('base')
+            return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
 
     def modify_text(self, subtitle_file, videos_dir=None, case=None):
         videos_dir = Path(videos_dir or self.processed_dir)
@@ -45,7 +75,7 @@ class SubtitleGenerator:
             tag_groups = re.findall(TAG_PATTERN, sub.text)
             non_tag_groups = re.split(TAG_PATTERN, sub.text)
 
-            case = case or os.environ.get("SUBTITLE_CASE", None)
+            case = case or self.settings.subtitle_case
 
             if case is not None:
                 case = case.lower()
@@ -73,7 +103,7 @@ class SubtitleGenerator:
 
     def prepend_string_to_subtitle(self, subtitle_file, prepend_string=None, videos_dir=None):
         # Load subtitle styling parameters
-        prepend_string = prepend_string or os.environ.get("SUBTITLE_PREPEND_STRING", None)
+        prepend_string = prepend_string or self.settings.subtitle_prepend_string
         print('Subtitle prepend string:', prepend_string)
         videos_dir = videos_dir or self.processed_dir
 
@@ -93,13 +123,38 @@ class SubtitleGenerator:
         else:
             print("Subtitle modified without prepend string.")
 
+    @staticmethod
+    def run_command(command) -> bool:
+        # Run an FFmpegCommand (or argv list) without a shell. On failure the captured stderr is printed
+        # and False is returned.
+        return run_command(command)
+
+    def _burn_subtitle_command(self, input_video, subtitle_file, output_filepath,
+                               play_res_x, play_res_y) -> FFmpegCommand:
+        force_style = escape_filter_value(f'PlayResX={play_res_x},PlayResY={play_res_y}')
+        command = FFmpegCommand()
+        command.input(input_video)
+        command.output(output_filepath, '-vf', f'subtitles={filter_path(subtitle_file)}:force_style={force_style}',
+                       *self.encoder_profile.output_args(audio='copy'))
+        return command
+
+    def transcribe(self, input_video):
+        # Transcribe with the number of threads allocated by the scheduler (WHISPER_THREADS or measured)
+        model = self.model
+        with _transcribe_lock, get_scheduler().allocate('whisper') as allocation:
+            import torch
+            torch.set_num_threads(allocation.cores)
+            transcription_output = model.transcribe(str(input_video), regroup=False)
+            segments = getattr(transcription_output, 'segments', None)
+            if segments:
+                allocation.record(segments[-1].end)  # Seconds of audio transcribed
+        return transcription_output
+
     def get_video_dimensions(self, input_file):
-        # Get the size of the video using ffprobe
-        ffprobe_cmd = (f'ffprobe -v error -select_streams v:0 -show_entries stream=width,'
-                       f'height -of csv=s=x:p=0 "{input_file}"')
-        video_size = subprocess.check_output(ffprobe_cmd, shell=True).decode().strip().split("x")
-        play_res_x = video_size[0]
-        play_res_y = video_size[1]
+        # Get the size of the video using ffprobe (cached, the video was usually probed by an earlier step)
+        video_stream = get_stream(input_file, 'video')
+        play_res_x = video_stream['width']
+        play_res_y = video_stream['height']
         print(f'Video Resolution: {play_res_x}x{play_res_y}')
         return play_res_x, play_res_y
 
@@ -121,7 +176,7 @@ class SubtitleGenerator:
                 output_file = f'{f.stem}_subtitled.mp4'
                 output_filepath = videos_dir_path / output_file
 
-                transcription_output = self.model.transcribe(input_filepath, regroup=False)
+                transcription_output = self.transcribe(input_filepath)
                 (
                     transcription_output
                     .split_by_punctuation([('.', ' '), '。', '?', '？', ',', '，'])
@@ -156,21 +211,10 @@ class SubtitleGenerator:
                 play_res_x, play_res_y = self.get_video_dimensions(input_filepath)
 
                 # Burn subtitle into the video file
-                # Use forward slash instead of backslash and additional escaping for colon
-                normalized_input_filepath = input_filepath.replace("\\", "/")
-                normalized_subtitle_filepath = subtitle_filepath.replace("\\", "/").replace(":", "\\\\:")
-                normalized_output_filepath = output_filepath.replace("\\", "/")
-
-                ffmpeg_cmd = (
-                    f'ffmpeg -i "{normalized_input_filepath}" -vf "subtitles={normalized_subtitle_filepath}:'
-                    f'force_style=\'PlayResX={play_res_x},PlayResY={play_res_y}\'" -c:a copy '
-                    f'"{normalized_output_filepath}" -y'
-                )
-                # print(ffmpeg_cmd)
-                # Execute the ffmpeg command
-                subprocess.call(ffmpeg_cmd, shell=True, check=True,
-                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                self.run_command(self._burn_subtitle_command(input_filepath, subtitle_filepath, output_filepath,
+                                                             play_res_x, play_res_y))
 
+    @timed('transcription')
     def generate_subtitle(self, input_video, style=None):
         input_video_path = Path(input_video)
         subtitle_file = f'{input_video_path.stem}.ass'
@@ -179,7 +223,7 @@ class SubtitleGenerator:
         # output_filepath = input_video_path.parent / output_file
 
         # Load subtitle styling parameters
-        style = style or os.environ.get("SUBTITLE_STYLE", "default")
+        style = style or self.settings.subtitle_style
         print('Subtitle style:', style)
 
         with open(self.assets_dir / 'subtitle-styles.json', 'r') as f:
@@ -188,7 +232,7 @@ class SubtitleGenerator:
             gap_merge_value = subtitle_style['gap_merge_value']
             max_words_in_merge = subtitle_style['max_words_in_merge']
 
-        transcription_output = self.model.transcribe(str(input_video), regroup=False)
+        transcription_output = self.transcribe(input_video)
         (
             transcription_output
             .split_by_punctuation([('.', ' '), '。', '?', '？', ',', '，'])
@@ -211,7 +255,7 @@ class SubtitleGenerator:
 
     def modify_subtitle(self, subtitle_file, style=None):
         # Load subtitle styling parameters
-        style = style or os.environ.get("SUBTITLE_STYLE", "default")
+        style = style or self.settings.subtitle_style
 
         with open(subtitle_file, 'r', encoding='utf-8') as file:
             text = file.read()
@@ -232,6 +276,7 @@ class SubtitleGenerator:
 
             return modified_subtitle_file
 
+    @timed('subtitle_burn')
     def burn_subtitle(self, input_video, subtitle_file):
 
         # Get video dimensions
@@ -240,17 +285,7 @@ class SubtitleGenerator:
         output_file = f'{input_video.stem}_subtitled.mp4'
         output_filepath = input_video.parent / output_file
         # Burn subtitle into the video file
-        # Use forward slash instead of backslash and additional escaping for colon
-        normalized_input_filepath = str(input_video).replace("\\", "/")
-        normalized_subtitle_filepath = str(subtitle_file).replace("\\", "/").replace(":", "\\\\:")
-        normalized_output_filepath = str(output_filepath).replace("\\", "/")
-
-        ffmpeg_cmd = (
-            f'ffmpeg -i "{normalized_input_filepath}" -vf "subtitles={normalized_subtitle_filepath}:'
-            f'force_style=\'PlayResX={play_res_x},PlayResY={play_res_y}\'" -c:a copy "{normalized_output_filepath}" -y'
-        )
-        # print(ffmpeg_cmd)
-        # Execute the ffmpeg command
-        subprocess.call(ffmpeg_cmd, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.run_command(self._burn_subtitle_command(input_video, subtitle_file, output_filepath,
+                                                     play_res_x, play_res_y))
 
         return output_filepath
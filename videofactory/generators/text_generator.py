@@ -1,21 +1,25 @@
 from .apis.llm.gpt4free_llm import gpt4freeLLM
-from langchain import PromptTemplate, FewShotPromptTemplate
+from .apis.llm.mock_llm import MockLLM
 from typing import List
 from ._prompts import examples_quote, prefix_quote, examples_image, prefix_image
 
-import configparser
 from pathlib import Path
 
+from ..settings import Settings, get_settings
+
 
 class TextGenerator:
     LLM_CLASSES = {
         'g4f': gpt4freeLLM,
+        'mock': MockLLM,
     }
 
     def __init__(self, llm_provider, processed_dir=None,
                  examples_quote=examples_quote, prefix_quote=prefix_quote,
-                 examples_image=examples_image, prefix_image=prefix_image) -> None:
+                 examples_image=examples_image, prefix_image=prefix_image, settings: Settings = None,
+                 mock: bool = False) -> None:
         self.llm_provider = llm_provider
+        self.mock = mock  # Use the offline 'mock' provider whatever the provider asked for (MOCK_PROVIDERS)
         self.llm = self._create_llm_instance()
         self.processed_dir = processed_dir
 
@@ -24,22 +28,12 @@ class TextGenerator:
         self.examples_image = examples_image  # Add examples_image as a class variable
         self.prefix_image = prefix_image      # Add prefix_image as a class variable
 
-        # Get the path of the current script (absolute path)
-        current_script_path = Path(__file__).resolve()
-        # Get the project folder (VideoFactory)
-        project_folder = current_script_path.parent.parent.parent
-        # Construct the path to config.ini in the parent folder
-        config_path = project_folder / "config.ini"
-        # Read the configuration file
-        config = configparser.ConfigParser()
-        config.read(config_path)
-
-        # Use Path concatenation for processed_dir
-        self.processed_dir = Path(processed_dir or
-                                  project_folder / config.get('paths', 'processed_dir'))
+        # Use the processed_dir from the settings (config.ini) unless one is given
+        self.settings = settings or get_settings()
+        self.processed_dir = Path(processed_dir or self.settings.processed_dir)
 
     def _create_llm_instance(self):
-        LLMClass = self.LLM_CLASSES.get(self.llm_provider)
+        LLMClass = self.LLM_CLASSES.get('mock' if self.mock else self.llm_provider)
         if LLMClass is None:
             raise ValueError(f'Unsupported LLM provider: {self.llm_provider}')
         return LLMClass()
@@ -52,6 +46,8 @@ class TextGenerator:
         return self.llm.generate_chat_responses(query)
 
     def create_few_shot_prompt_template(self, query: str, examples: str, prefix: str) -> str:
+        from langchain import PromptTemplate, FewShotPromptTemplate  # langchain is slow to import
+
         # create an example template
         example_template = """
         User: {query}
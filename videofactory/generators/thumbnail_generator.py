@@ -1,9 +1,66 @@
 import os
 import subprocess
 from pathlib import Path
-import configparser
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from typing import List
 from PIL import Image, ImageDraw, ImageFont
 
+from ..editors._probe import get_stream
+from ..editors._concat import concat_with_stream_copy
+from ..editors._ffmpeg import FFmpegCommand, FFmpegError, filter_node, run_command
+from ..editors._frames import grab_first_frame
+from ..editors._profiles import load_encoder_profile
+from ..settings import Settings, get_settings
+from ..utils.atomic import atomic_write
+from ..utils.timing import timed
+
+
+@lru_cache(maxsize=16)
+def _load_font(font_path: str, size: int):
+    return ImageFont.truetype(font_path, size)
+
+
+@lru_cache(maxsize=16)
+def _load_overlay(overlay_path: str, size: tuple):
+    # Callers only composite onto other images, so the cached image is never modified
+    return Image.open(overlay_path).convert('RGBA').resize(size)
+
+
+class _GlyphWidthTable:
+    # Advance widths of single characters, measured once per character and font
+    def __init__(self, font):
+        self.font = font
+        self.widths = {}
+
+    def width(self, text: str) -> float:
+        total = 0
+        for char in text:
+            char_width = self.widths.get(char)
+            if char_width is None:
+                char_width = self.widths[char] = self.font.getlength(char)
+            total += char_width
+        return total
+
+
+@lru_cache(maxsize=16)
+def _load_glyph_widths(font_path: str, size: int) -> _GlyphWidthTable:
+    return _GlyphWidthTable(_load_font(font_path, size))
+
+
+def _text_size(draw, text, font):
+    # ImageDraw.textsize was removed in Pillow 10; textbbox gives the same size on newer versions
+    if hasattr(draw, 'textsize'):
+        return draw.textsize(text, font=font)
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    return right, bottom
+
+
+def _generate_thumbnail_image(thumbnail_generator, thumbnail: dict):
+    # Module-level so it can be pickled and run in a worker process
+    return thumbnail_generator.generate_thumbnail_image(**thumbnail)
+
 
 # self.fonts_dir = os.path.join(self.assets_dir, 'fonts')
 # self.images_dir = os.path.join(self.assets_dir, 'images')
@@ -12,51 +69,39 @@ from PIL import Image, ImageDraw, ImageFont
 
 
 class ThumbnailGenerator:
+    # Encoders used to re-create a stream with the same codec as the probed main video
+    VIDEO_ENCODERS = {'h264': 'libx264', 'hevc': 'libx265'}
+    AUDIO_ENCODERS = {'aac': 'aac', 'mp3': 'libmp3lame', 'opus': 'libopus'}
+
     def __init__(self, overlay=None, font=None, assets_dir=None, input_dir=None,
                  processed_dir=None, temp_dir=None, audio_dir=None, processed_videos_dir=None,
-                 fonts_dir=None, images_dir=None, thumbnail_overlays_dir=None, output_dir=None):
-        self.overlay = overlay or os.environ.get('THUMBNAIL_OVERLAY', 'glitch')
-        self.font = font or os.environ.get('THUMBNAIL_FONT', 'Anton-Regular')
-
-        # Get the path of the current script (absolute path)
-        current_script_path = Path(__file__).resolve()
-        # Get the project folder (VideoFactory)
-        project_folder = current_script_path.parent.parent.parent
-        # Construct the path to config.ini in the parent folder
-        config_path = project_folder / "config.ini"
-        # Read the configuration file
-        config = configparser.ConfigParser()
-        config.read(config_path)
-
-        # Use Path concatenation for input_dir, processed_dir, temp_dir, audio_dir, and processed_videos_dir
-        self.input_dir = input_dir or project_folder / config.get('paths', 'input_dir')
-        self.processed_dir = processed_dir or project_folder / config.get('paths', 'processed_dir')
-        self.temp_dir = temp_dir or project_folder / config.get('paths', 'temp_dir')
-        self.audio_dir = audio_dir or project_folder / config.get('paths', 'audio_dir')
-        self.processed_videos_dir = processed_videos_dir or project_folder / config.get('paths', 'processed_videos_dir')
-        self.assets_dir = assets_dir or project_folder / config.get('paths', 'assets_dir')
+                 fonts_dir=None, images_dir=None, thumbnail_overlays_dir=None, output_dir=None,
+                 encoder_profile=None, settings: Settings = None):
+        self.settings = settings or get_settings()
+        self.overlay = overlay or self.settings.thumbnail_overlay
+        self.font = font or self.settings.thumbnail_font
+
+        # Explicit arguments take precedence over the paths from the settings (config.ini)
+        self.input_dir = Path(input_dir or self.settings.input_dir)
+        self.processed_dir = Path(processed_dir or self.settings.processed_dir)
+        self.temp_dir = Path(temp_dir or self.settings.temp_dir)
+        self.audio_dir = Path(audio_dir or self.settings.audio_dir)
+        self.processed_videos_dir = Path(processed_videos_dir or self.settings.processed_videos_dir)
+        self.assets_dir = Path(assets_dir or self.settings.assets_dir)
         self.fonts_dir = self.assets_dir / 'fonts'
         self.images_dir = self.assets_dir / 'images'
         self.thumbnail_overlays_dir = self.assets_dir / 'thumbnail_overlays'
-        self.output_dir = project_folder / 'data' / 'output'
+        self.output_dir = Path(output_dir or self.settings.output_dir)
 
-        # Convert all paths to Path objects
-        self.assets_dir = Path(self.assets_dir)
-        self.input_dir = Path(self.input_dir)
-        self.processed_dir = Path(self.processed_dir)
-        self.temp_dir = Path(self.temp_dir)
-        self.audio_dir = Path(self.audio_dir)
-        self.processed_videos_dir = Path(self.processed_videos_dir)
+        # Encoding settings used for the thumbnail intro and, when it can't be joined as is, the whole video
+        self.encoder_profile = load_encoder_profile(encoder_profile or self.settings.encoder_profile,
+                                                    self.assets_dir)
 
     @staticmethod
-    def run_command(command):
-        # Run the command with subprocess, using shell mode to execute the command as a string.
-        # Set check=True to raise an exception if the command returns a non-zero exit code.
-        # Redirect the standard output (stdout) and standard error (stderr) to /dev/null to suppress any output.
-        try:
-            subprocess.run(command, shell=True, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except subprocess.CalledProcessError as e:
-            print(f"Command failed: {e}")
+    def run_command(command) -> bool:
+        # Run an FFmpegCommand (or argv list) without a shell. On failure the captured stderr is printed
+        # and False is returned.
+        return run_command(command)
 
     def extract_first_frame(self, video_file, output_path=None):
         if output_path is None:
@@ -66,13 +111,9 @@ class ThumbnailGenerator:
         output_path = Path(output_path)
         video_file = Path(video_file)
 
-        command = [
-            'ffmpeg',
-            '-i', str(video_file),
-            '-vframes', '1',
-            str(output_path.with_suffix('.png')),
-            '-y'
-        ]
+        command = FFmpegCommand()
+        command.input(video_file)
+        command.output(output_path.with_suffix('.png'), '-vframes', '1')
 
         # Execute the command
         self.run_command(command)
@@ -80,21 +121,36 @@ class ThumbnailGenerator:
         # Return the output path
         return output_path.with_suffix('.png')
 
+    def grab_first_frame(self, video_file, as_array=False):
+        # Return the first frame as a PIL Image (or a NumPy array) decoded straight from an ffmpeg pipe
+        try:
+            return grab_first_frame(video_file, as_array=as_array)
+        except (OSError, ValueError, subprocess.CalledProcessError, FFmpegError) as e:
+            print(f"Frame grab failed ({e}), extracting the first frame to a PNG file instead...")
+
+        first_frame_path = self.extract_first_frame(video_file)
+        with Image.open(first_frame_path) as first_frame:
+            first_frame = first_frame.convert('RGB')
+        first_frame_path.unlink()
+        return first_frame
+
     def merge_images(self, input_filename, overlay_filename, text,
                      output_filename=None, input_image_path=None):
 
-        # Open the input and overlay images
+        # Open the input image; 'input_image_path' may also be an already decoded PIL Image
         if input_image_path is None:
-            input_image_path = Image.open(os.path.join(self.images_dir, input_filename))
+            input_image_path = os.path.join(self.images_dir, input_filename)
 
-        input_image = Image.open(input_image_path)
-        overlay_image = Image.open(os.path.join(self.thumbnail_overlays_dir, overlay_filename))
+        if isinstance(input_image_path, Image.Image):
+            input_image = input_image_path
+        else:
+            input_image = Image.open(input_image_path)
 
         # Resize the input image to 540x960
         input_image = input_image.resize((540, 960))
 
-        # Resize the overlay image to match the size of the input image
-        overlay_image = overlay_image.resize(input_image.size)
+        # The overlay resized to the size of the input image is cached, so it is only decoded once per process
+        overlay_image = _load_overlay(str(self.thumbnail_overlays_dir / overlay_filename), input_image.size)
 
         # Create a new blank image with the same size as the input image
         merged_image = Image.new("RGBA", input_image.size, (0, 0, 0, 0))
@@ -107,17 +163,25 @@ class ThumbnailGenerator:
 
         # Add text to the image within the specified area
         draw = ImageDraw.Draw(merged_image)
-        font_name = ImageFont.truetype(os.path.join(self.fonts_dir, self.font + '.ttf'), 40)
+        font_path = str(self.fonts_dir / (self.font + '.ttf'))
+        font_name = _load_font(font_path, 40)
+        glyph_widths = _load_glyph_widths(font_path, 40)
         max_width = 366
+        space_width = glyph_widths.width(' ')
         words = text.split()
         lines = []
         line = ''
+        line_width = 0
         for word in words:
-            if draw.textsize(line + ' ' + word, font=font_name)[0] <= max_width:
+            # Measure with the cached glyph-width table instead of rendering the candidate line
+            word_width = glyph_widths.width(word)
+            if not line or line_width + space_width + word_width <= max_width:
+                line_width = line_width + space_width + word_width if line else word_width
                 line += ' ' + word if line else word
             else:
                 lines.append(line)
                 line = word
+                line_width = word_width
         if line:
             lines.append(line)
 
@@ -131,7 +195,7 @@ class ThumbnailGenerator:
             y = 620
 
         for line in lines:
-            text_width, text_height = draw.textsize(line.strip(), font=font_name)
+            text_width, text_height = _text_size(draw, line.strip(), font_name)
             x = (merged_image.width - text_width) // 2
             if self.overlay in ['tint', 'skew']:
                 draw.text((x, y), line.strip(), font=font_name, fill=(0, 0, 0))  # black
@@ -142,11 +206,12 @@ class ThumbnailGenerator:
         # Save the result to a file
         if output_filename is None:
             output_filename = input_filename[:-4]
-        if not os.path.exists(self.temp_dir):
-            os.mkdir(self.temp_dir)
+        os.makedirs(self.temp_dir, exist_ok=True)
 
         output_path = os.path.join(self.temp_dir, output_filename + "_thumbnail.png")
-        merged_image.save(os.path.join(self.temp_dir, output_filename + "_thumbnail.png"))
+        # The thumbnail is an intermediate file read back by ffmpeg, so favour encoding speed over file size
+        with atomic_write(output_path) as part:
+            merged_image.save(part, format='PNG', compress_level=1)
 
         return output_path
 
@@ -155,20 +220,22 @@ class ThumbnailGenerator:
         if os.path.exists(os.path.join(self.input_dir, 'thumbnail_lines.txt')):
             with open(os.path.join(self.input_dir, 'thumbnail_lines.txt'), 'r') as f:
                 lines = f.readlines()
+                thumbnails = []
                 line_number = 1
                 for line in lines:
                     if line:  # Check if line is not empty
                         if '[' in line and ']' in line:  # Check if line contains [ and ]
-                            input_filename = line[line.find('[')+1:line.find(']')] + '.png'
-                            overlay_filename = self.overlay + '.png'
+                            input_filename = line[line.find('[')+1:line.find(']')]
                             text = line[line.find(']')+1:]
-                            self.merge_images(input_filename, overlay_filename, text)
+                            thumbnails.append({'input_filename': input_filename, 'text': text})
                         else:
                             print("Line " + str(line_number) + " does not contain the characters")
                     line_number += 1
+                self.generate_thumbnail_images_parallel(thumbnails)
         else:
             print("File not found")
 
+    @timed('thumbnail_image')
     def generate_thumbnail_image(self, input_filename, text, output_filename=None, input_image_path=None):
         input_filename = input_filename + '.png'
         overlay_filename = self.overlay + '.png'
@@ -177,6 +244,19 @@ class ThumbnailGenerator:
 
         return output_path
 
+    def generate_thumbnail_images_parallel(self, thumbnails, max_workers=None) -> List[str]:
+        # 'thumbnails' is a list of dicts with the keyword arguments of generate_thumbnail_image
+        # (input_filename, text and optionally output_filename and input_image_path).
+        # Each worker process keeps its own font, overlay and glyph-width caches across thumbnails.
+        thumbnails = list(thumbnails)
+        if len(thumbnails) <= 1:
+            return [self.generate_thumbnail_image(**thumbnail) for thumbnail in thumbnails]
+
+        max_workers = max_workers or min(len(thumbnails), os.cpu_count() or 1)
+        chunksize = max(1, len(thumbnails) // (max_workers * 4))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_generate_thumbnail_image, repeat(self), thumbnails, chunksize=chunksize))
+
     def generate_thumbnail_videos(self):
         # Get all files in temp directory
         files = os.listdir(self.temp_dir)
@@ -188,37 +268,99 @@ class ThumbnailGenerator:
                 thumbnail_file = file
                 self.generate_thumbnail_video(thumbnail_file)
 
-    def generate_thumbnail_video(self, thumbnail_image_name):
+    def _intro_encoding_args(self, mp4_filepath):
+        # Build ffmpeg arguments that encode the intro clip with exactly the stream parameters of the main video,
+        # so both can be joined with the concat demuxer without re-encoding. Returns None if that's not possible.
+        try:
+            video = get_stream(mp4_filepath, 'video')
+            audio = get_stream(mp4_filepath, 'audio')
+        except (OSError, subprocess.CalledProcessError, ValueError):
+            return None
+        if video is None or audio is None:
+            return None
+
+        video_encoder = self.VIDEO_ENCODERS.get(video.get('codec_name'))
+        audio_encoder = self.AUDIO_ENCODERS.get(audio.get('codec_name'))
+        if video_encoder is None or audio_encoder is None:
+            return None
+
+        width, height = video['width'], video['height']
+        pix_fmt = video.get('pix_fmt', 'yuv420p')
+        frame_rate = video.get('r_frame_rate', '30/1')
+        channel_layout = audio.get('channel_layout') or ('mono' if audio.get('channels') == 1 else 'stereo')
+        sample_rate = audio.get('sample_rate', '44100')
+
+        # Silent audio source (lavfi input) with the layout and rate of the main video's audio
+        anullsrc = f'anullsrc=channel_layout={channel_layout}:sample_rate={sample_rate}'
+        video_args = [
+            '-vf', f'scale={width}:{height},setsar=1,format={pix_fmt}',
+            '-r', frame_rate,
+            '-c:v', video_encoder,
+            '-pix_fmt', pix_fmt,
+        ]
+        # x264 names its profiles in lowercase without spaces ('High' -> 'high', 'Constrained Baseline' -> 'baseline')
+        profile = video.get('profile')
+        if profile and video_encoder == 'libx264':
+            video_args += ['-profile:v', profile.lower().replace('constrained ', '').replace(' ', '')]
+        level = video.get('level')
+        if level and level > 0 and video_encoder == 'libx264':
+            video_args += ['-level:v', f'{level / 10:.1f}']
+        time_base = video.get('time_base', '')
+        if time_base.startswith('1/'):
+            video_args += ['-video_track_timescale', time_base[2:]]
+
+        audio_args = ['-c:a', audio_encoder, '-ar', str(sample_rate), '-ac', str(audio.get('channels', 2))]
+        if audio.get('bit_rate'):
+            audio_args += ['-b:a', audio['bit_rate']]
+
+        return anullsrc, video_args + audio_args
+
+    @timed('thumbnail_video')
+    def generate_thumbnail_video(self, thumbnail_image_name, video_file=None):
         # Get the part before _
         name = thumbnail_image_name.split('_')[0]
 
-        # Look for the mp4 file in the 'processed_videos' folder
-        mp4_filepath = self.processed_videos_dir / (name + '_output_wm.mp4')
+        # Join the thumbnail to the given video, or look for the mp4 file in the 'processed_videos' folder
+        mp4_filepath = Path(video_file) if video_file else self.processed_videos_dir / (name + '_output_wm.mp4')
 
-        # All paths use forward slash instead of backslash
         thumbnail_filepath = self.temp_dir / thumbnail_image_name
-        thumbnail_resized_filepath = self.temp_dir / (name + '_thumbnail_resized.png')
         mp4_thumbnail_filepath = self.temp_dir / (name + '_thumbnail.mp4')
         mp4_output_wm_cover_filepath = self.processed_videos_dir / (name + '_output_wm_thumbnail.mp4')
 
-        command = (
-            # Resize the thumbnail image to 540x960
-            f'ffmpeg -i "{thumbnail_filepath}" -s 540x960 "{thumbnail_resized_filepath}" -y && '
+        encoding_args = self._intro_encoding_args(mp4_filepath)
+        joined = None
+        if encoding_args is not None:
+            anullsrc, output_args = encoding_args
+            # Encode a 0.5s loop of the thumbnail that matches the main video, then join both with stream copy
+            command = FFmpegCommand()
+            command.input(thumbnail_filepath, '-loop', '1')
+            command.input(anullsrc, '-f', 'lavfi')
+            command.output(mp4_thumbnail_filepath, *output_args, *self.encoder_profile.speed_args(),
+                           '-t', '0.5', '-shortest')
+            if self.run_command(command):
+                joined = concat_with_stream_copy([mp4_thumbnail_filepath, mp4_filepath], mp4_output_wm_cover_filepath)
+
+        if joined is None:
+            # Fall back to re-encoding the whole video when the intro can't be matched to it
             # Generate a loop video from the thumbnail image with a duration of 0.5s
-            f'ffmpeg -loop 1 -i "{thumbnail_resized_filepath}" -f lavfi -i '
-            f'anullsrc=channel_layout=stereo:sample_rate=44100 -c:v libx264 '
-            f'-t 0.5 -r 30 -pix_fmt yuv420p -c:a aac -shortest "{mp4_thumbnail_filepath}" -y && '
+            cmd_intro = FFmpegCommand()
+            cmd_intro.input(thumbnail_filepath, '-loop', '1')
+            cmd_intro.input('anullsrc=channel_layout=stereo:sample_rate=44100', '-f', 'lavfi')
+            cmd_intro.output(mp4_thumbnail_filepath, '-vf', 'scale=540:960', '-t', '0.5', '-r', '30',
+                             *self.encoder_profile.output_args(), '-shortest')
+
             # Concatenate the thumbnail loop video with the watermarked video
-            f'ffmpeg -i "{mp4_thumbnail_filepath}" -i "{mp4_filepath}" -filter_complex '
-            f'"[0:v][0:a][1:v][1:a]concat=n=2:v=1:a=1" -c:v libx264 -preset veryfast '
-            f'-crf 23 -c:a aac -b:a 128k "{mp4_output_wm_cover_filepath}" -y && '
-            # Delete temporary files
-            f'del "{thumbnail_filepath}" '
-            f'"{thumbnail_resized_filepath}" '
-            f'"{mp4_thumbnail_filepath}" && '
-            f'rmdir /q "{self.temp_dir}"'
-        )
-        # print(command)
-        # Run the command
-        self.run_command(command)
+            cmd_concat = FFmpegCommand()
+            cmd_concat.input(mp4_thumbnail_filepath)
+            cmd_concat.input(mp4_filepath)
+            cmd_concat.filter(filter_node('concat', 'n=2:v=1:a=1', ['0:v', '0:a', '1:v', '1:a']))
+            cmd_concat.output(mp4_output_wm_cover_filepath, *self.encoder_profile.output_args())
+
+            if self.run_command(cmd_intro):
+                self.run_command(cmd_concat)
+
+        # Delete temporary files
+        thumbnail_filepath.unlink(missing_ok=True)
+        mp4_thumbnail_filepath.unlink(missing_ok=True)
+
         return mp4_output_wm_cover_filepath
@@ -6,6 +6,7 @@ from pathlib import Path
 from .apis.tts.coqui_tts import CoquiTTS
 from .apis.tts.elevenlabs_tts import ElevenLabsTTS
 from .apis.tts.fpt_tts import FptTTS
+from .apis.tts.mock_tts import MockTTS
 from ._utils import process_text
 
 
@@ -13,12 +14,14 @@ class TTSGenerator:
     TTS_CLASSES = {
         'coqui': CoquiTTS,
         'elevenlabs': ElevenLabsTTS,
-        'fpt': FptTTS
+        'fpt': FptTTS,
+        'mock': MockTTS
     }
 
-    def __init__(self, tts_provider='', key: str = None) -> None:
+    def __init__(self, tts_provider='', key: str = None, mock: bool = False) -> None:
         self.tts_provider = tts_provider
         self.key = key
+        self.mock = mock  # Use the offline 'mock' provider whatever the provider asked for (MOCK_PROVIDERS)
         self.tts = self._create_tts_instance()
 
     def _create_tts_instance(self) -> None:
@@ -26,7 +29,7 @@ class TTSGenerator:
             # If tts_provider is an empty string, return None
             return None
 
-        TTSClass = self.TTS_CLASSES.get(self.tts_provider)
+        TTSClass = self.TTS_CLASSES.get('mock' if self.mock else self.tts_provider)
         if TTSClass is None:
             raise ValueError(f'Unsupported TTS provider: {self.tts_provider}')
         return TTSClass(key=self.key)
@@ -6,6 +6,7 @@ import threading
 
 from .apis.video.d_id_video import DidVideo
 from .apis.video.gen_2_video import Gen2Video
+from .apis.video.mock_video import MockDidVideo, MockGen2Video
 
 
 class LastKeyReachedException(Exception):
@@ -15,12 +16,17 @@ class LastKeyReachedException(Exception):
 class VideoGenerator:
     VIDGEN_CLASSES = {
         'd-id': DidVideo,
-        'gen-2': Gen2Video
+        'gen-2': Gen2Video,
+        'mock-d-id': MockDidVideo,
+        'mock-gen-2': MockGen2Video
     }
 
-    def __init__(self, vidgen_provider='', key: str = None) -> None:
+    def __init__(self, vidgen_provider='', key: str = None, mock: bool = False) -> None:
         self.vidgen_provider = vidgen_provider
         self.key = key
+        # Use the offline 'mock-<provider>' stand-in (MOCK_PROVIDERS); vidgen_provider keeps the real name, so the
+        # provider-specific methods stay available
+        self.mock = mock
         self.vidgen = self._create_vidgen_instance()
         self.key_lock = threading.Lock()
 
@@ -29,7 +35,7 @@ class VideoGenerator:
             # If vidgen_provider is an empty string, return None
             return None
 
-        VidGenClass = self.VIDGEN_CLASSES.get(self.vidgen_provider)
+        VidGenClass = self.VIDGEN_CLASSES.get(f'mock-{self.vidgen_provider}' if self.mock else self.vidgen_provider)
         if VidGenClass is None:
             raise ValueError(f'Unsupported video generator: {self.vidgen_provider}')
         return VidGenClass(key=self.key)
@@ -251,6 +257,12 @@ class VideoGenerator:
             return
 
         image_filename = image_path.name
+        prepared_upload = self.prepare_image_upload(image_filename)
+        return self.finish_image_upload(image_filename, image_path, prepared_upload)
+
+    @_required_vidgen_provider('gen-2')
+    def prepare_image_upload(self, image_filename: str) -> dict:
+        # Steps 1 and 4 only need the filename, so they can run before the image itself is available
 
         # region: Step 1
         upload_id, upload_url = self.vidgen.step_1_upload_image(image_filename)
@@ -259,37 +271,50 @@ class VideoGenerator:
         print("(Step 1) Image uploaded successfully.")
         # endregion
 
+        # region: Step 4
+        preview_upload_id, preview_upload_url = self.vidgen.step_4_upload_preview_image(image_filename)
+        # print('preview_upload_id', preview_upload_id)
+        # print('preview_upload_url', preview_upload_url)
+        print("(Step 4) Preview image uploaded successfully.")
+        # endregion
+
+        return {
+            'upload_id': upload_id,
+            'upload_url': upload_url,
+            'preview_upload_id': preview_upload_id,
+            'preview_upload_url': preview_upload_url,
+        }
+
+    @_required_vidgen_provider('gen-2')
+    def finish_image_upload(self, image_filename: str, image, prepared_upload: dict):
+        # 'image' is either a path to a PNG file or the PNG bytes themselves
+
         # region: Step 2
-        status_code, etag = self.vidgen.step_2_put_image(upload_url, image_path)
+        status_code, etag = self.vidgen.step_2_put_image(prepared_upload['upload_url'], image)
         print("(Step 2) PUT request status code:", status_code)
         # endregion
 
         # region: Step 3
-        complete_upload_url = self.vidgen.step_3_complete_upload(upload_id, etag)
+        complete_upload_url = self.vidgen.step_3_complete_upload(prepared_upload['upload_id'], etag)
         print("(Step 3) Upload completed successfully.")
         # print("Complete Upload URL:", complete_upload_url)
         # endregion
 
-        # region: Step 4
-        preview_upload_id, preview_upload_url = self.vidgen.step_4_upload_preview_image(image_filename)
-        # print('preview_upload_id', preview_upload_id)
-        # print('preview_upload_url', preview_upload_url)
-        print("(Step 4) Preview image uploaded successfully.")
-        # endregion
-
         # region: Step 5
-        status_code, etag = self.vidgen.step_2_put_image(preview_upload_url, image_path)
+        status_code, etag = self.vidgen.step_2_put_image(prepared_upload['preview_upload_url'], image)
         print("(Step 5) PUT request status code:", status_code)
         # endregion
 
         # region: Step 6
-        complete_preview_upload_url = self.vidgen.step_6_complete_upload_preview(preview_upload_id, etag)
+        complete_preview_upload_url = self.vidgen.step_6_complete_upload_preview(
+                                                    prepared_upload['preview_upload_id'], etag)
         print("(Step 6) Upload completed successfully.")
         # print("Complete Preview Upload URL:", complete_preview_upload_url)
         # endregion
 
         # region: Step 7
-        dataset_id = self.vidgen.step_7_create_dataset(image_filename, upload_id, preview_upload_id)
+        dataset_id = self.vidgen.step_7_create_dataset(image_filename, prepared_upload['upload_id'],
+                                                       prepared_upload['preview_upload_id'])
         print("(Step 7) Dataset created:", dataset_id)
         # print("Dataset ID:", dataset_id)
 
@@ -297,10 +322,8 @@ class VideoGenerator:
         # endregion
 
     @_required_vidgen_provider('gen-2')
-    def generate_video_from_image(self, image_path: Path, username: str,
-                                  upload_url: str, preview_upload_url: str,
-                                  output_dir: str = None, output_path: str = None,
-                                  seed=None, interpolate=False) -> Path:
+    def submit_video_from_image(self, username: str, upload_url: str, preview_upload_url: str,
+                                seed=None, interpolate=False):
         seed = seed or self.vidgen.generate_random_seed()
 
         # Step 1: Get the team ID
@@ -323,8 +346,19 @@ class VideoGenerator:
         print(f'(Step 12) Generation ID: {generation_id}')
         print(f'Seed: {seed}')
 
-        # Step 5: Check task status and get the generated video URL
-        generated_video_url = self.vidgen.step_13_check_task_status_and_get_url(task_id, team_id)
+        # Step 5: Let the shared poller watch the task; the future resolves to the generated video URL
+        return self.vidgen.step_13_watch_task(task_id, team_id)
+
+    @_required_vidgen_provider('gen-2')
+    def generate_video_from_image(self, image_path: Path, username: str,
+                                  upload_url: str, preview_upload_url: str,
+                                  output_dir: str = None, output_path: str = None,
+                                  seed=None, interpolate=False) -> Path:
+        seed = seed or self.vidgen.generate_random_seed()
+
+        # Steps 8 to 12, then wait for the task to finish
+        generated_video_url = self.submit_video_from_image(username, upload_url, preview_upload_url,
+                                                           seed, interpolate).result()
         print(f'(Step 13) Generated video URL: {generated_video_url}')
 
         # Step 6: Download the video
@@ -0,0 +1,387 @@
+import json
+import time
+import uuid
+import base64
+import shutil
+import asyncio
+import traceback
+from dataclasses import dataclass, field, asdict
+from http import HTTPStatus
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import unquote, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils.atomic import atomic_write
+
+# Job statuses
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+# Largest accepted request body (images are sent base64-encoded in the job)
+MAX_BODY_BYTES = 256 * 1024 * 1024
+
+# Size of the chunks artifacts are streamed in
+CHUNK_SIZE = 1024 * 1024
+
+# Fields of a submission that describe the input files of the job rather than workflow arguments
+INPUT_FIELDS = ('lines', 'thumbnail_lines', 'images')
+
+
+class RequestError(Exception):
+    """Invalid request; reported to the client with its HTTP status."""
+
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Job:
+    id: str
+    spec: dict
+    priority: int = 0
+    status: str = QUEUED
+    submitted_at: float = None
+    started_at: float = None
+    finished_at: float = None
+    result: object = None
+    error: str = None
+    artifacts: List[str] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        summary = {name: value for name, value in asdict(self).items() if name not in ('spec', 'artifacts')}
+        summary.update(name=self.spec.get('name'), workflow=self.spec.get('workflow'))
+        return summary
+
+
+def _to_json(value):
+    # Workflow results are paths, lists of paths or plain values
+    if isinstance(value, Path):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return [_to_json(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _to_json(item) for key, item in value.items()}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+class JobService:
+    """
+    Long-running job service in front of one warm WorkflowManager.
+
+    Jobs are submitted over HTTP (see handle_request), queued by priority and run one after another (or
+    'concurrency' at a time) in this process, so the heavy imports (torch, langchain, g4f), the whisper model,
+    the cached fonts and profiles and the pooled HTTP sessions are loaded once instead of once per job. Every job
+    is saved to <jobs_dir>/<id>/job.json: after a restart, queued and interrupted jobs are queued again.
+    """
+
+    def __init__(self, workflow_manager, jobs_dir: Path, concurrency: int = 1, options: dict = None) -> None:
+        self.workflow_manager = workflow_manager
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.concurrency = max(1, concurrency)
+        self.options = options or {}
+
+        self.jobs: Dict[str, Job] = {}
+        self._queue = None
+        self._sequence = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job')
+
+    # region Jobs
+    def _job_dir(self, job_id: str) -> Path:
+        return self.jobs_dir / job_id
+
+    def _save(self, job: Job) -> None:
+        with atomic_write(self._job_dir(job.id) / 'job.json') as part:
+            part.write_text(json.dumps(asdict(job), indent=2), encoding='utf-8')
+
+    def _enqueue(self, job: Job) -> None:
+        # Highest priority first, then in submission order
+        self._sequence += 1
+        self._queue.put_nowait((-job.priority, self._sequence, job.id))
+
+    def load_jobs(self) -> None:
+        # Reload the jobs of a previous run; the interrupted ones start again (with RESUME, from their last stage)
+        for job_file in sorted(self.jobs_dir.glob('*/job.json')):
+            try:
+                job = Job(**json.loads(job_file.read_text(encoding='utf-8')))
+            except (ValueError, TypeError) as e:
+                print(f'Invalid job file "{job_file}": {e}. Skipping...')
+                continue
+            self.jobs[job.id] = job
+            if job.status in (QUEUED, RUNNING):
+                job.status = QUEUED
+                self._save(job)
+                self._enqueue(job)
+
+    def _write_inputs(self, spec: dict, job_dir: Path) -> dict:
+        # Write the lines, thumbnail lines and images of a submission to the job directory, which becomes the
+        # input directory of the workflow. Images are file paths on this machine or {"name", "data" (base64)}.
+        args = {name: value for name, value in spec.items() if name not in INPUT_FIELDS}
+        if not any(name in spec for name in INPUT_FIELDS):
+            return args
+
+        for name in ('lines', 'thumbnail_lines'):
+            lines = spec.get(name) or []
+            if isinstance(lines, str):
+                lines = lines.splitlines()
+            (job_dir / f'{name}.txt').write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+        for image in spec.get('images') or []:
+            if isinstance(image, str):
+                source = Path(image)
+                if not source.is_file():
+                    raise RequestError(HTTPStatus.BAD_REQUEST, f'Image not found: {image}')
+                shutil.copy(source, job_dir / source.name)
+            elif isinstance(image, dict) and image.get('name') and image.get('data'):
+                try:
+                    data = base64.b64decode(image['data'], validate=True)
+                except ValueError:
+                    raise RequestError(HTTPStatus.BAD_REQUEST, f'Invalid base64 data for image {image["name"]}')
+                (job_dir / Path(image['name']).name).write_bytes(data)
+            else:
+                raise RequestError(HTTPStatus.BAD_REQUEST, 'Images are paths or {"name": ..., "data": <base64>}')
+
+        args.setdefault('workflow', 'talking-heads')
+        args['input_dir'] = str(job_dir)
+        return args
+
+    def _create_job(self, spec: dict) -> Job:
+        # Validate the submission and write its job directory; blocking, so it runs in a thread (see submit)
+        from .cli import WORKFLOWS
+
+        if not isinstance(spec, dict):
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'The job must be a JSON object')
+        spec = dict(spec)
+        try:
+            priority = int(spec.pop('priority', 0))
+        except (TypeError, ValueError):
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'The priority must be an integer')
+
+        job_id = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:6]}'
+        job_dir = self._job_dir(job_id)
+        job_dir.mkdir(parents=True)
+        try:
+            job_spec = self._write_inputs(spec, job_dir)
+            if job_spec.get('workflow') not in WORKFLOWS:
+                raise RequestError(HTTPStatus.BAD_REQUEST, f'Unsupported workflow: {job_spec.get("workflow")} '
+                                                           f'(available: {", ".join(WORKFLOWS)})')
+        except RequestError:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        job = Job(job_id, job_spec, priority, submitted_at=time.time())
+        self._save(job)
+        return job
+
+    async def submit(self, spec: dict) -> Job:
+        # Decoding the images and writing the inputs (up to MAX_BODY_BYTES) would stall the other requests,
+        # including the artifact downloads, so it runs in a thread; the job is registered and queued on the loop.
+        job = await asyncio.get_running_loop().run_in_executor(None, self._create_job, spec)
+        self.jobs[job.id] = job
+        self._enqueue(job)
+        return job
+
+    def cancel(self, job: Job) -> None:
+        if job.status != QUEUED:
+            raise RequestError(HTTPStatus.CONFLICT, f'Job {job.id} is {job.status}')
+        job.status = CANCELLED
+        job.finished_at = time.time()
+        self._save(job)
+
+    def find_artifacts(self, job: Job) -> List[str]:
+        # Videos written to the job directory (final videos and their renditions) and files returned by the workflow
+        artifacts = [str(path) for path in sorted(self._job_dir(job.id).glob('*.mp4'))]
+        results = job.result if isinstance(job.result, list) else [job.result]
+        for result in results:
+            if isinstance(result, str) and Path(result).is_file() and result not in artifacts:
+                artifacts.append(result)
+        return artifacts
+
+    def _run_job(self, job: Job) -> None:
+        # Runs in a thread of the executor
+        from .cli import run_job
+
+        spec = dict(job.spec)
+        spec.setdefault('name', job.id)
+        try:
+            job.result = _to_json(run_job(self.workflow_manager, spec, self.options))
+            job.status = DONE
+        except Exception as e:
+            traceback.print_exc()
+            job.error = f'{type(e).__name__}: {e}'
+            job.status = FAILED
+        job.finished_at = time.time()
+        job.artifacts = self.find_artifacts(job)
+        self._save(job)
+
+    async def _run_jobs(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                continue  # Cancelled meanwhile
+            job.status = RUNNING
+            job.started_at = time.time()
+            self._save(job)
+            print(f'\033[1;33m[{job.id}] {job.spec.get("workflow")} (priority {job.priority})\033[0m')
+            await loop.run_in_executor(self._executor, self._run_job, job)
+            color = '\033[92m' if job.status == DONE else '\033[91m'
+            print(color + f'[{job.id}] {job.status} in {job.finished_at - job.started_at:.1f}s' + '\033[0m')
+    # endregion
+
+    def warm_up(self) -> None:
+        # Load what every job would otherwise load on first use; missing optional libraries are skipped.
+        # The loaded components go to the pool shared with the managers of the jobs, which take them when
+        # they run with the same settings.
+        components = (
+            ('whisper model', lambda: self.workflow_manager.subtitle_generator.model),
+            ('thumbnail generator', lambda: self.workflow_manager.thumbnail_generator),
+            ('TTS generator', lambda: self.workflow_manager.tts_generator),
+            ('video generator', lambda: self.workflow_manager.video_generator),
+            ('text generator', lambda: self.workflow_manager.text_generator),
+        )
+        for name, load in components:
+            start = time.perf_counter()
+            try:
+                load()
+                print(f'Loaded {name} in {time.perf_counter() - start:.1f}s')
+            except Exception as e:
+                print(f'Could not load {name} ({e}). Skipping...')
+        self.workflow_manager.release_components()
+
+    # region HTTP
+    async def handle_request(self, method: str, path: str, body: bytes):
+        # Return (status, JSON value) or (status, Path of a file to stream)
+        parts = [unquote(part) for part in urlsplit(path).path.strip('/').split('/') if part]
+
+        if parts == ['health'] and method == 'GET':
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return HTTPStatus.OK, {'status': 'ok', 'jobs': counts}
+
+        if parts == ['jobs'] and method == 'GET':
+            return HTTPStatus.OK, [job.summary() for job in self.jobs.values()]
+
+        if parts == ['jobs'] and method == 'POST':
+            try:
+                spec = await asyncio.get_running_loop().run_in_executor(None, json.loads, body or b'{}')
+            except ValueError as e:
+                raise RequestError(HTTPStatus.BAD_REQUEST, f'Invalid JSON: {e}')
+            job = await self.submit(spec)
+            return HTTPStatus.ACCEPTED, job.summary()
+
+        if len(parts) >= 2 and parts[0] == 'jobs':
+            job = self.jobs.get(parts[1])
+            if job is None:
+                raise RequestError(HTTPStatus.NOT_FOUND, f'Unknown job: {parts[1]}')
+
+            if len(parts) == 2 and method == 'GET':
+                return HTTPStatus.OK, {**job.summary(), 'spec': job.spec, 'artifacts': job.artifacts}
+            if len(parts) == 2 and method == 'DELETE':
+                self.cancel(job)
+                return HTTPStatus.OK, job.summary()
+            if len(parts) == 3 and parts[2] == 'artifacts' and method == 'GET':
+                return HTTPStatus.OK, [{'name': Path(artifact).name, 'size': Path(artifact).stat().st_size,
+                                        'url': f'/jobs/{job.id}/artifacts/{Path(artifact).name}'}
+                                       for artifact in job.artifacts if Path(artifact).is_file()]
+            if len(parts) == 4 and parts[2] == 'artifacts' and method == 'GET':
+                # Only the recorded artifacts are served, never arbitrary paths
+                for artifact in job.artifacts:
+                    if Path(artifact).name == parts[3] and Path(artifact).is_file():
+                        return HTTPStatus.OK, Path(artifact)
+                raise RequestError(HTTPStatus.NOT_FOUND, f'Unknown artifact: {parts[3]}')
+
+        raise RequestError(HTTPStatus.NOT_FOUND, f'Not found: {method} {path}')
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # One request per connection (HTTP/1.1 with "Connection: close")
+        try:
+            try:
+                request_line = (await reader.readline()).decode('latin-1').strip()
+                method, path, _ = request_line.split(' ', 2)
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode('latin-1').strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Request body too large')
+                body = await reader.readexactly(length) if length else b''
+                status, value = await self.handle_request(method.upper(), path, body)
+            except RequestError as e:
+                status, value = e.status, {'error': str(e)}
+            except (ValueError, asyncio.IncompleteReadError):
+                status, value = HTTPStatus.BAD_REQUEST, {'error': 'Malformed request'}
+            except Exception as e:
+                traceback.print_exc()
+                status, value = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+
+            if isinstance(value, Path):
+                await self._send_file(writer, value)
+            else:
+                payload = json.dumps(value, indent=2).encode('utf-8')
+                self._send_headers(writer, status, 'application/json', len(payload))
+                writer.write(payload)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _send_headers(writer: asyncio.StreamWriter, status: HTTPStatus, content_type: str, length: int) -> None:
+        writer.write((f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                      f'Content-Type: {content_type}\r\n'
+                      f'Content-Length: {length}\r\n'
+                      'Connection: close\r\n\r\n').encode('latin-1'))
+
+    async def _send_file(self, writer: asyncio.StreamWriter, path: Path) -> None:
+        content_type = 'video/mp4' if path.suffix == '.mp4' else 'application/octet-stream'
+        self._send_headers(writer, HTTPStatus.OK, content_type, path.stat().st_size)
+        loop = asyncio.get_running_loop()
+        with open(path, 'rb') as f:
+            # Reads run in the executor's default pool, so a large download never blocks the other requests
+            while chunk := await loop.run_in_executor(None, f.read, CHUNK_SIZE):
+                writer.write(chunk)
+                await writer.drain()
+    # endregion
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765, warm: bool = True) -> None:
+        self._queue = asyncio.PriorityQueue()
+        self.load_jobs()
+        if warm:
+            await asyncio.get_running_loop().run_in_executor(None, self.warm_up)
+
+        runners = [asyncio.create_task(self._run_jobs()) for _ in range(self.concurrency)]
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f'\033[92mJob service listening on http://{host}:{port} ({len(self.jobs)} jobs loaded)\033[0m')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for runner in runners:
+                runner.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_service(workflow_manager, jobs_dir: Optional[Path] = None, host: str = '127.0.0.1', port: int = 8765,
+                concurrency: int = 1, warm: bool = True, options: dict = None) -> int:
+    jobs_dir = Path(jobs_dir or workflow_manager.settings.input_dir / 'jobs')
+    service = JobService(workflow_manager, jobs_dir, concurrency=concurrency, options=options)
+    try:
+        asyncio.run(service.serve(host, port, warm=warm))
+    except KeyboardInterrupt:
+        print('Stopping...')
+    return 0
@@ -0,0 +1,233 @@
+import os
+import contextvars
+import configparser
+import dataclasses
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Mapping
+
+# Project folder (VideoFactory)
+PROJECT_FOLDER = Path(__file__).resolve().parent.parent
+
+# Directories read from the [paths] section of config.ini
+PATH_FIELDS = (
+    'input_dir', 'conversations_dir',
+    'output_dir', 'processed_dir', 'processed_videos_dir', 'temp_dir',
+    'assets_dir', 'audio_dir', 'fonts_dir', 'images_dir', 'thumbnail_overlays_dir',
+)
+
+# Settings read from environment variables: field -> (variable, default)
+ENV_FIELDS = {
+    'tts_provider': ('TTS_PROVIDER', None),
+    'd_id_keys': ('D-ID_BASIC_TOKENS', None),
+    'gen_2_keys': ('GEN_2_BEARER_TOKENS', None),
+    'tvai_working_dir': ('TVAI_WORKING_DIR', None),
+    'subtitle_style': ('SUBTITLE_STYLE', 'default'),
+    'subtitle_case': ('SUBTITLE_CASE', None),
+    'subtitle_prepend_string': ('SUBTITLE_PREPEND_STRING', None),
+    'thumbnail_overlay': ('THUMBNAIL_OVERLAY', 'glitch'),
+    'thumbnail_font': ('THUMBNAIL_FONT', 'Anton-Regular'),
+    'watermark_text': ('WATERMARK_TEXT', '@YourChannel'),
+    'audio_normalize': ('AUDIO_NORMALIZE', False),
+    'audio_target_lufs': ('AUDIO_TARGET_LUFS', -16.0),
+    'audio_silence_threshold_db': ('AUDIO_SILENCE_THRESHOLD_DB', -50.0),
+    'scratch_on_tmpfs': ('SCRATCH_ON_TMPFS', False),
+    'keep_failed_scratch': ('KEEP_FAILED_SCRATCH', False),
+    'report_dir': ('RUN_REPORT_DIR', None),
+    'ffmpeg_progress': ('FFMPEG_PROGRESS', False),
+    'encoder_profile': ('ENCODER_PROFILE', 'balanced'),
+    'renditions': ('RENDITIONS', None),
+    'max_cores': ('MAX_CORES', None),
+    'max_memory_mb': ('MAX_MEMORY_MB', None),
+    'ffmpeg_threads': ('FFMPEG_THREADS', None),
+    'whisper_threads': ('WHISPER_THREADS', None),
+    'state_db': ('STATE_DB', None),
+    'resume': ('RESUME', False),
+    'task_queue': ('TASK_QUEUE', None),
+    'task_lease_seconds': ('TASK_LEASE_SECONDS', 120),
+    'mock_providers': ('MOCK_PROVIDERS', False),
+}
+
+
+def _parse_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Immutable settings shared by the workflows, generators and editors.
+
+    Loaded once from config.ini and the environment (see `get_settings`). Per-job values are applied with
+    `with_overrides`, which returns a new object, and the variables of a job are carried in `env`, so concurrent
+    jobs never have to modify `os.environ`.
+    """
+
+    project_folder: Path = PROJECT_FOLDER
+
+    # Paths ([paths] in config.ini, relative to the project folder)
+    input_dir: Path = None
+    conversations_dir: Path = None
+    output_dir: Path = None
+    processed_dir: Path = None
+    processed_videos_dir: Path = None
+    temp_dir: Path = None
+    assets_dir: Path = None
+    audio_dir: Path = None
+    fonts_dir: Path = None
+    images_dir: Path = None
+    thumbnail_overlays_dir: Path = None
+
+    # Providers and API keys
+    tts_provider: str = None
+    d_id_keys: str = None
+    gen_2_keys: str = None
+    tvai_working_dir: str = None
+
+    # Subtitles
+    subtitle_style: str = 'default'
+    subtitle_case: str = None
+    subtitle_prepend_string: str = None
+
+    # Thumbnails and watermark
+    thumbnail_overlay: str = 'glitch'
+    thumbnail_font: str = 'Anton-Regular'
+    watermark_text: str = '@YourChannel'
+
+    # Audio
+    audio_normalize: bool = False
+    audio_target_lufs: float = -16.0
+    audio_silence_threshold_db: float = -50.0
+
+    # Per-job scratch directories (created under temp_dir, or /dev/shm when scratch_on_tmpfs is set)
+    scratch_on_tmpfs: bool = False
+    keep_failed_scratch: bool = False
+
+    # Encoding (a profile from assets/encoder-profiles.json: draft, balanced, archive, tiktok, reels, shorts)
+    encoder_profile: str = 'balanced'
+    # Extra renditions of the final video, e.g. "tiktok@1080x1920,reels,shorts" (see VideoEditor.render_renditions)
+    renditions: str = None
+
+    # Scheduling of concurrent ffmpeg/whisper jobs (see videofactory/utils/scheduler.py). Cores and memory default
+    # to the whole machine; the threads per job are chosen from the measured throughput unless they are set.
+    max_cores: int = None
+    max_memory_mb: int = None
+    ffmpeg_threads: int = None
+    whisper_threads: int = None
+
+    # SQLite store of the items and stages of the workflows (default: <output_dir>/state.db)
+    state_db: Path = None
+    # Skip the stages whose recorded artifact still exists and matches its recorded hash
+    resume: bool = False
+
+    # Task queue shared by a distributed coordinator and its workers: a directory on a shared mount or
+    # redis://host:port/db (default: <output_dir>/queue). Tasks of a worker silent for the lease are queued again.
+    task_queue: str = None
+    task_lease_seconds: float = 120
+
+    # Offline stand-ins for the TTS, D-ID, Gen-2, LLM and Stable Diffusion services (generators/apis/*/mock_*.py),
+    # for load tests and benchmarks without credits or network access
+    mock_providers: bool = False
+
+    # Instrumentation: per-stage timing reports (JSON and Chrome trace) and live ffmpeg progress
+    report_dir: Path = None
+    ffmpeg_progress: bool = False
+
+    # Variables set for the job (--env, "env" in a job file) on top of the process environment: API keys, voices
+    # and mock behaviour, read by the API clients with `getenv` while the job runs (see `job_environ`)
+    env: Mapping[str, str] = None
+
+    def __post_init__(self):
+        # Normalize types so overrides can be given as strings (command line, JSON job files)
+        for name in PATH_FIELDS:
+            value = getattr(self, name)
+            if value is not None and not isinstance(value, Path):
+                object.__setattr__(self, name, Path(value))
+        for name in ('report_dir', 'state_db'):
+            value = getattr(self, name)
+            if value is not None and not isinstance(value, Path):
+                object.__setattr__(self, name, Path(value))
+        for name in ('audio_normalize', 'scratch_on_tmpfs', 'keep_failed_scratch', 'ffmpeg_progress', 'resume',
+                     'mock_providers'):
+            object.__setattr__(self, name, _parse_bool(getattr(self, name)))
+        for name in ('max_cores', 'max_memory_mb', 'ffmpeg_threads', 'whisper_threads'):
+            value = getattr(self, name)
+            if value is not None:
+                object.__setattr__(self, name, int(value))
+        object.__setattr__(self, 'audio_target_lufs', float(self.audio_target_lufs))
+        object.__setattr__(self, 'task_lease_seconds', float(self.task_lease_seconds))
+        if self.task_queue is not None:
+            object.__setattr__(self, 'task_queue', str(self.task_queue))
+        object.__setattr__(self, 'audio_silence_threshold_db', float(self.audio_silence_threshold_db))
+        object.__setattr__(self, 'env', {var: str(value) for var, value in (self.env or {}).items()})
+
+    def with_overrides(self, **overrides) -> 'Settings':
+        # None means "not overridden", so unset command line options can be passed straight through
+        overrides = {name: value for name, value in overrides.items() if value is not None}
+        if not overrides:
+            return self
+        return dataclasses.replace(self, **overrides)
+
+
+@lru_cache(maxsize=None)
+def _read_paths(config_path: Path) -> dict:
+    # Parse config.ini once per process
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    project_folder = config_path.parent
+    return {name: project_folder / config.get('paths', name) for name in PATH_FIELDS
+            if config.has_option('paths', name)}
+
+
+def load_settings(environ: Mapping[str, str] = None, config_path: Path = None,
+                  env: Mapping[str, str] = None) -> Settings:
+    # 'env' holds the variables set for a job: they take precedence over 'environ' and are kept in the settings
+    environ = {**(os.environ if environ is None else environ), **(env or {})}
+    config_path = Path(config_path or PROJECT_FOLDER / 'config.ini')
+
+    values = dict(_read_paths(config_path))
+    values['project_folder'] = config_path.parent
+    for name, (variable, default) in ENV_FIELDS.items():
+        value = environ.get(variable)
+        values[name] = value if value not in (None, '') else default
+    values['env'] = env
+
+    return Settings(**values)
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    # Settings of the current process, loaded on first use
+    return load_settings()
+
+
+def reload_settings() -> Settings:
+    # Call after changing environment variables (e.g. from the interactive menu)
+    get_settings.cache_clear()
+    return get_settings()
+
+
+# Variables of the job running in the current thread (and the threads it starts with `with_current_context`)
+_job_environ = contextvars.ContextVar('job_environ', default=None)
+
+
+@contextmanager
+def job_environ(env: Mapping[str, str]):
+    # Make the variables of a job visible to `getenv` for its duration, without modifying os.environ
+    token = _job_environ.set(dict(env or {}))
+    try:
+        yield
+    finally:
+        _job_environ.reset(token)
+
+
+def getenv(name: str, default: str = None) -> str:
+    # Variable of the current job, or of the process environment
+    env = _job_environ.get()
+    if env and name in env:
+        return env[name]
+    return os.environ.get(name, default)
@@ -0,0 +1,242 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    workflow TEXT NOT NULL,
+    key TEXT NOT NULL,
+    data TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (workflow, key)
+);
+CREATE TABLE IF NOT EXISTS stages (
+    item_id INTEGER NOT NULL REFERENCES items (id) ON DELETE CASCADE,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    artifact TEXT,
+    artifact_hash TEXT,
+    provider_job_id TEXT,
+    error TEXT,
+    started_at REAL,
+    finished_at REAL,
+    wall_s REAL,
+    PRIMARY KEY (item_id, stage)
+);
+CREATE INDEX IF NOT EXISTS stages_by_status ON stages (stage, status);
+"""
+
+# Stage statuses
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def file_hash(path, chunk_size: int = 1024 * 1024) -> Optional[str]:
+    # SHA-256 of an artifact, or None if it doesn't exist
+    path = Path(path)
+    if not path.is_file():
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StageRecord:
+    """Values a running stage reports (see StateStore.stage); saved when the stage finishes."""
+
+    def __init__(self) -> None:
+        self.artifact = None
+        self.provider_job_id = None
+
+
+class StateStore:
+    """
+    SQLite store of the workflow items (e.g. one talking head video) and of the stages each of them went through,
+    with their artifacts, hashes, timings, provider job ids and errors.
+
+    Workflows query it instead of scanning directories for file name conventions, so resuming or reporting on
+    a large backlog is a single indexed query. Safe to use from several threads and processes (one connection
+    per thread, WAL journal).
+    """
+
+    def __init__(self, path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA foreign_keys=ON')
+            self._local.connection = connection
+        return connection
+
+    def close(self) -> None:
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    # region Items
+    def item(self, workflow: str, key, data: dict = None) -> int:
+        # Return the id of the item, creating it on first use (key: e.g. the path of the item's source file)
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT INTO items (workflow, key, data, created_at, updated_at) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (workflow, key) DO UPDATE SET updated_at = excluded.updated_at, '
+                'data = COALESCE(excluded.data, items.data)',
+                (workflow, str(key), json.dumps(data) if data is not None else None, now, now))
+            row = connection.execute('SELECT id FROM items WHERE workflow = ? AND key = ?',
+                                     (workflow, str(key))).fetchone()
+        return row['id']
+
+    def items(self, workflow: str) -> List[dict]:
+        with self._connection() as connection:
+            rows = connection.execute('SELECT * FROM items WHERE workflow = ? ORDER BY id', (workflow,)).fetchall()
+        return [dict(row) for row in rows]
+    # endregion
+
+    # region Stages
+    def record(self, item_id: int, stage: str, status: str, artifact=None, provider_job_id=None, error=None,
+               started_at: float = None, wall_s: float = None, hash_artifact: bool = True) -> None:
+        finished_at = time.time() if status != RUNNING else None
+        artifact_hash = file_hash(artifact) if artifact is not None and status == DONE and hash_artifact else None
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT INTO stages (item_id, stage, status, artifact, artifact_hash, provider_job_id, error, '
+                'started_at, finished_at, wall_s) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (item_id, stage) DO UPDATE SET status = excluded.status, '
+                'artifact = COALESCE(excluded.artifact, stages.artifact), '
+                'artifact_hash = COALESCE(excluded.artifact_hash, stages.artifact_hash), '
+                'provider_job_id = COALESCE(excluded.provider_job_id, stages.provider_job_id), '
+                'error = excluded.error, started_at = COALESCE(excluded.started_at, stages.started_at), '
+                'finished_at = excluded.finished_at, wall_s = COALESCE(excluded.wall_s, stages.wall_s)',
+                (item_id, stage, status, str(artifact) if artifact is not None else None, artifact_hash,
+                 str(provider_job_id) if provider_job_id is not None else None, error,
+                 started_at, finished_at, wall_s))
+
+    @contextmanager
+    def stage(self, item_id: int, stage: str):
+        # Record a stage as running, then as done (with the artifact and provider job id set on the yielded
+        # record) or as failed with the error
+        record = StageRecord()
+        started_at = time.time()
+        start = time.perf_counter()
+        self.record(item_id, stage, RUNNING, started_at=started_at)
+        try:
+            yield record
+        except BaseException as e:
+            self.record(item_id, stage, FAILED, record.artifact, record.provider_job_id, error=str(e) or repr(e),
+                        wall_s=time.perf_counter() - start)
+            raise
+        # Most steps report failures by printing them, so a missing artifact also means the stage failed
+        if record.artifact is not None and not Path(record.artifact).exists():
+            self.record(item_id, stage, FAILED, record.artifact, record.provider_job_id,
+                        error=f'Artifact not created: {record.artifact}', wall_s=time.perf_counter() - start)
+            return
+        self.record(item_id, stage, DONE, record.artifact, record.provider_job_id,
+                    wall_s=time.perf_counter() - start)
+
+    def record_existing(self, item_id: int, stage: str, artifact) -> None:
+        # Record an artifact made by an earlier run (before the store existed, or by hand) as a finished stage
+        if self.artifact(item_id, stage) is None and Path(artifact).exists():
+            self.record(item_id, stage, DONE, artifact)
+
+    def get_stage(self, item_id: int, stage: str) -> Optional[dict]:
+        with self._connection() as connection:
+            row = connection.execute('SELECT * FROM stages WHERE item_id = ? AND stage = ?',
+                                     (item_id, stage)).fetchone()
+        return dict(row) if row else None
+
+    def artifact(self, item_id: int, stage: str) -> Optional[Path]:
+        # Artifact of a finished stage, if the file is still there
+        row = self.get_stage(item_id, stage)
+        if row is None or row['status'] != DONE or not row['artifact']:
+            return None
+        artifact = Path(row['artifact'])
+        return artifact if artifact.exists() else None
+
+    def verified_artifact(self, item_id: int, stage: str) -> Optional[Path]:
+        # Artifact of a finished stage, if the file is still there and unchanged since it was recorded
+        row = self.get_stage(item_id, stage)
+        if row is None or row['status'] != DONE or not row['artifact'] or not row['artifact_hash']:
+            return None
+        artifact = Path(row['artifact'])
+        return artifact if file_hash(artifact) == row['artifact_hash'] else None
+
+    def artifacts(self, workflow: str, stage: str, keys=None) -> Dict[str, Path]:
+        # {item key: artifact} of the items of the workflow whose stage is done (optionally only these keys)
+        with self._connection() as connection:
+            rows = connection.execute(
+                'SELECT items.key, stages.artifact FROM stages JOIN items ON items.id = stages.item_id '
+                'WHERE items.workflow = ? AND stages.stage = ? AND stages.status = ? AND stages.artifact IS NOT NULL '
+                'ORDER BY items.id', (workflow, stage, DONE)).fetchall()
+        keys = {str(key) for key in keys} if keys is not None else None
+        return {row['key']: Path(row['artifact']) for row in rows if keys is None or row['key'] in keys}
+
+    def pending(self, workflow: str, stage: str) -> List[dict]:
+        # Items of the workflow whose stage is not done yet
+        with self._connection() as connection:
+            rows = connection.execute(
+                'SELECT items.* FROM items LEFT JOIN stages ON stages.item_id = items.id AND stages.stage = ? '
+                'WHERE items.workflow = ? AND (stages.status IS NULL OR stages.status != ?) ORDER BY items.id',
+                (stage, workflow, DONE)).fetchall()
+        return [dict(row) for row in rows]
+
+    def summary(self, workflow: str = None) -> Dict[str, Dict[str, int]]:
+        # {stage: {status: count}}, e.g. to report on a backlog
+        query = 'SELECT stages.stage, stages.status, COUNT(*) AS count FROM stages'
+        params = ()
+        if workflow is not None:
+            query += ' JOIN items ON items.id = stages.item_id WHERE items.workflow = ?'
+            params = (workflow,)
+        query += ' GROUP BY stages.stage, stages.status'
+        with self._connection() as connection:
+            rows = connection.execute(query, params).fetchall()
+        summary = {}
+        for row in rows:
+            summary.setdefault(row['stage'], {})[row['status']] = row['count']
+        return summary
+
+    def stage_timings(self, workflow: str = None) -> Dict[str, List[float]]:
+        # {stage: [wall seconds of every finished run]}, e.g. for the latency percentiles of a benchmark
+        query = ('SELECT stages.stage, stages.wall_s FROM stages JOIN items ON items.id = stages.item_id '
+                 'WHERE stages.status = ? AND stages.wall_s IS NOT NULL')
+        params = [DONE]
+        if workflow is not None:
+            query += ' AND items.workflow = ?'
+            params.append(workflow)
+        with self._connection() as connection:
+            rows = connection.execute(query, params).fetchall()
+        timings = {}
+        for row in rows:
+            timings.setdefault(row['stage'], []).append(row['wall_s'])
+        return timings
+
+    def errors(self, workflow: str = None) -> List[dict]:
+        query = ('SELECT items.workflow, items.key, stages.stage, stages.error, stages.finished_at FROM stages '
+                 'JOIN items ON items.id = stages.item_id WHERE stages.status = ?')
+        params = [FAILED]
+        if workflow is not None:
+            query += ' AND items.workflow = ?'
+            params.append(workflow)
+        with self._connection() as connection:
+            rows = connection.execute(query + ' ORDER BY stages.finished_at', params).fetchall()
+        return [dict(row) for row in rows]
+    # endregion
@@ -0,0 +1,386 @@
+import os
+import json
+import time
+import uuid
+import socket
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from .utils.atomic import atomic_write
+
+# Task statuses
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+# Priorities range from 0 (default) to MAX_PRIORITY (claimed first)
+MAX_PRIORITY = 999
+
+
+def default_worker_id() -> str:
+    # "<host>-<pid>", unique across the machines sharing a queue
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+@dataclass
+class Task:
+    """One stage of a workflow item, run by whichever worker claims it (see videofactory/worker.py)."""
+
+    id: str
+    kind: str
+    payload: dict = field(default_factory=dict)
+    priority: int = 0
+    status: str = QUEUED
+    attempts: int = 0
+    worker: str = None
+    result: dict = None
+    error: str = None
+    created_at: float = None
+    updated_at: float = None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, text) -> 'Task':
+        return cls(**json.loads(text))
+
+
+class TaskQueue:
+    """
+    Queue of tasks shared by a coordinator and its workers.
+
+    Workers claim tasks with a lease and renew it with heartbeats while they run; the task of a worker that dies
+    (or loses its network) is queued again once its lease expires, up to max_attempts times. Results are kept
+    until the coordinator reads them.
+    """
+
+    def __init__(self, lease_seconds: float = 120, max_attempts: int = 3) -> None:
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def put(self, kind: str, payload: dict, priority: int = 0) -> str:
+        raise NotImplementedError
+
+    def claim(self, worker: str, kinds: Iterable[str] = None) -> Optional[Task]:
+        # Lease the next task (highest priority first, then oldest) of one of these kinds, or return None
+        raise NotImplementedError
+
+    def heartbeat(self, task: Task) -> bool:
+        # Renew the lease; False if it was lost (the task expired and was queued again)
+        raise NotImplementedError
+
+    def complete(self, task: Task, result: dict = None) -> bool:
+        raise NotImplementedError
+
+    def fail(self, task: Task, error: str, retry: bool = True) -> None:
+        raise NotImplementedError
+
+    def get(self, task_id: str) -> Optional[Task]:
+        raise NotImplementedError
+
+    def reap(self) -> int:
+        # Queue again (or fail, after max_attempts) the tasks whose lease expired; returns their number
+        raise NotImplementedError
+
+    def counts(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def _expired_status(self, task: Task) -> str:
+        return FAILED if task.attempts >= self.max_attempts else QUEUED
+
+
+class FileTaskQueue(TaskQueue):
+    """
+    Task queue in a shared directory (e.g. an NFS mount seen by every render box), one JSON file per task in
+    queued/, leased/, done/ and failed/.
+
+    Claims rely on rename() being atomic, which NFS guarantees unlike the file locks SQLite needs, so only one
+    worker wins a task. Leases are the modification time of the file in leased/ (renewed by heartbeats), which
+    requires the clocks of the machines to be in sync (NTP).
+    """
+
+    def __init__(self, path, lease_seconds: float = 120, max_attempts: int = 3) -> None:
+        super().__init__(lease_seconds, max_attempts)
+        self.path = Path(path)
+        for status in (QUEUED, LEASED, DONE, FAILED):
+            (self.path / status).mkdir(parents=True, exist_ok=True)
+
+    def _file(self, status: str, task_id: str) -> Path:
+        return self.path / status / f'{task_id}.json'
+
+    def _write(self, status: str, task: Task) -> None:
+        task.updated_at = time.time()
+        with atomic_write(self._file(status, task.id)) as part:
+            part.write_text(task.to_json(), encoding='utf-8')
+
+    @staticmethod
+    def _read(path: Path) -> Optional[Task]:
+        try:
+            return Task.from_json(path.read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            # Moved by another process meanwhile (or still being written)
+            return None
+
+    def put(self, kind: str, payload: dict, priority: int = 0) -> str:
+        # Ids sort by priority, then by creation time, so listing queued/ gives the claim order
+        priority = min(max(int(priority), 0), MAX_PRIORITY)
+        task_id = f'{MAX_PRIORITY - priority:03d}-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}-{kind}'
+        now = time.time()
+        self._write(QUEUED, Task(task_id, kind, payload, priority, created_at=now))
+        return task_id
+
+    def claim(self, worker: str, kinds: Iterable[str] = None) -> Optional[Task]:
+        self.reap()
+        kinds = set(kinds) if kinds else None
+        for queued_file in sorted((self.path / QUEUED).glob('*.json')):
+            if kinds is not None and queued_file.stem.split('-', 3)[-1] not in kinds:
+                continue
+            leased_file = self.path / LEASED / queued_file.name
+            try:
+                # Touch first: rename keeps the modification time, which is the start of the lease
+                os.utime(queued_file)
+                os.rename(queued_file, leased_file)
+            except FileNotFoundError:
+                continue  # Claimed by another worker
+            task = self._read(leased_file)
+            if task is None:
+                continue
+            task.status = LEASED
+            task.worker = worker
+            task.attempts += 1
+            self._write(LEASED, task)
+            return task
+        return None
+
+    def heartbeat(self, task: Task) -> bool:
+        leased_file = self._file(LEASED, task.id)
+        current = self._read(leased_file)
+        if current is None or (current.worker, current.attempts) != (task.worker, task.attempts):
+            return False
+        try:
+            os.utime(leased_file)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _take(self, leased_file: Path) -> Optional[Path]:
+        # Rename a leased file to a name private to this process, so the worker finishing the task and the
+        # processes reaping it never both move it (the file is not visible in any directory meanwhile)
+        taken_file = leased_file.with_name(f'{leased_file.name}.{uuid.uuid4().hex[:8]}.taken')
+        try:
+            os.rename(leased_file, taken_file)
+        except FileNotFoundError:
+            return None
+        return taken_file
+
+    def _finish(self, task: Task, status: str) -> bool:
+        # Move the leased task to its final directory, unless its lease was lost meanwhile
+        leased_file = self._file(LEASED, task.id)
+        current = self._read(leased_file)
+        if current is None or (current.worker, current.attempts) != (task.worker, task.attempts):
+            return False
+        taken_file = self._take(leased_file)
+        if taken_file is None:
+            return False
+        task.status = status
+        self._write(status, task)
+        taken_file.unlink()
+        return True
+
+    def complete(self, task: Task, result: dict = None) -> bool:
+        task.result = result
+        task.error = None
+        return self._finish(task, DONE)
+
+    def fail(self, task: Task, error: str, retry: bool = True) -> None:
+        task.error = error
+        if retry and task.attempts < self.max_attempts:
+            self._finish(task, QUEUED)
+        else:
+            self._finish(task, FAILED)
+
+    def get(self, task_id: str) -> Optional[Task]:
+        for status in (DONE, FAILED, LEASED, QUEUED):
+            task = self._read(self._file(status, task_id))
+            if task is not None:
+                return task
+        return None
+
+    def reap(self) -> int:
+        reaped = 0
+        deadline = time.time() - self.lease_seconds
+        for leased_file in (self.path / LEASED).glob('*.json'):
+            try:
+                if leased_file.stat().st_mtime > deadline:
+                    continue
+            except FileNotFoundError:
+                continue
+            taken_file = self._take(leased_file)
+            if taken_file is None:
+                continue
+            task = self._read(taken_file)
+            if task is not None:
+                task.status = self._expired_status(task)
+                task.error = f'Lease of worker {task.worker} expired'
+                self._write(task.status, task)
+                reaped += 1
+            taken_file.unlink()
+        return reaped
+
+    def counts(self) -> Dict[str, int]:
+        return {status: sum(1 for _ in (self.path / status).glob('*.json'))
+                for status in (QUEUED, LEASED, DONE, FAILED)}
+
+
+# Lease the first queued task (highest priority, then oldest) of one of the kinds, atomically.
+# KEYS: queued ids, kind of every queued id, leased ids. ARGV: lease expiry, then the kinds (none: any kind).
+_REDIS_CLAIM = """
+local wanted = {}
+for i = 2, #ARGV do wanted[ARGV[i]] = true end
+local offset = 0
+while true do
+    local ids = redis.call('ZRANGE', KEYS[1], offset, offset + 99)
+    if #ids == 0 then return nil end
+    for _, id in ipairs(ids) do
+        if #ARGV < 2 or wanted[redis.call('HGET', KEYS[2], id)] then
+            redis.call('ZREM', KEYS[1], id)
+            redis.call('HDEL', KEYS[2], id)
+            redis.call('ZADD', KEYS[3], ARGV[1], id)
+            return id
+        end
+    end
+    offset = offset + 100
+end
+"""
+
+
+class RedisTaskQueue(TaskQueue):
+    """
+    Task queue in Redis (redis://host:port/db), for render boxes without a shared file system. Requires the
+    redis package, unless a client is given (e.g. fakeredis.FakeRedis(decode_responses=True) as a local stand-in).
+
+    Tasks are JSON strings; queued ids are in one sorted set (by priority, then creation, like the file queue)
+    with their kind in a hash, and leased ids in a sorted set by lease expiry.
+    """
+
+    def __init__(self, url: str = None, lease_seconds: float = 120, max_attempts: int = 3,
+                 prefix: str = 'videofactory', client=None) -> None:
+        super().__init__(lease_seconds, max_attempts)
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError('The Redis task queue requires the redis package (pip install redis)')
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.redis = client
+        self.prefix = prefix
+        self._claim = self.redis.register_script(_REDIS_CLAIM)
+
+    def _key(self, *parts) -> str:
+        return ':'.join((self.prefix,) + parts)
+
+    def _save(self, task: Task) -> None:
+        task.updated_at = time.time()
+        self.redis.set(self._key('task', task.id), task.to_json())
+
+    def _queue(self, task: Task) -> None:
+        # Score by priority first, then by creation time
+        score = (MAX_PRIORITY - task.priority) * 10 ** 10 + task.created_at
+        pipeline = self.redis.pipeline()
+        pipeline.hset(self._key('queued-kinds'), task.id, task.kind)
+        pipeline.zadd(self._key('queued'), {task.id: score})
+        pipeline.execute()
+
+    def put(self, kind: str, payload: dict, priority: int = 0) -> str:
+        priority = min(max(int(priority), 0), MAX_PRIORITY)
+        task = Task(f'{time.time_ns():020d}-{uuid.uuid4().hex[:8]}', kind, payload, priority, created_at=time.time())
+        self._save(task)
+        self._queue(task)
+        return task.id
+
+    def claim(self, worker: str, kinds: Iterable[str] = None) -> Optional[Task]:
+        self.reap()
+        # Priorities are compared across kinds: the script walks the single queue and skips the other kinds
+        task_id = self._claim(keys=[self._key('queued'), self._key('queued-kinds'), self._key('leased')],
+                              args=[time.time() + self.lease_seconds, *(kinds or ())])
+        if task_id is None:
+            return None
+        task = self.get(task_id)
+        task.status = LEASED
+        task.worker = worker
+        task.attempts += 1
+        self._save(task)
+        return task
+
+    def heartbeat(self, task: Task) -> bool:
+        current = self.get(task.id)
+        if current is None or current.status != LEASED or \
+                (current.worker, current.attempts) != (task.worker, task.attempts):
+            return False
+        # XX: only renew a lease that still exists
+        self.redis.zadd(self._key('leased'), {task.id: time.time() + self.lease_seconds}, xx=True)
+        return self.redis.zscore(self._key('leased'), task.id) is not None
+
+    def _finish(self, task: Task, status: str) -> bool:
+        current = self.get(task.id)
+        if current is None or (current.worker, current.attempts) != (task.worker, task.attempts) \
+                or not self.redis.zrem(self._key('leased'), task.id):
+            return False
+        task.status = status
+        self._save(task)
+        if status == QUEUED:
+            self._queue(task)
+        else:
+            self.redis.sadd(self._key(status), task.id)
+        return True
+
+    def complete(self, task: Task, result: dict = None) -> bool:
+        task.result = result
+        task.error = None
+        return self._finish(task, DONE)
+
+    def fail(self, task: Task, error: str, retry: bool = True) -> None:
+        task.error = error
+        self._finish(task, QUEUED if retry and task.attempts < self.max_attempts else FAILED)
+
+    def get(self, task_id: str) -> Optional[Task]:
+        text = self.redis.get(self._key('task', task_id))
+        return Task.from_json(text) if text else None
+
+    def reap(self) -> int:
+        reaped = 0
+        for task_id in self.redis.zrangebyscore(self._key('leased'), '-inf', time.time()):
+            # Only one process removes the lease
+            if not self.redis.zrem(self._key('leased'), task_id):
+                continue
+            task = self.get(task_id)
+            if task is None:
+                continue
+            task.status = self._expired_status(task)
+            task.error = f'Lease of worker {task.worker} expired'
+            self._save(task)
+            if task.status == QUEUED:
+                self._queue(task)
+            else:
+                self.redis.sadd(self._key(FAILED), task.id)
+            reaped += 1
+        return reaped
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            QUEUED: self.redis.zcard(self._key('queued')),
+            LEASED: self.redis.zcard(self._key('leased')),
+            DONE: self.redis.scard(self._key(DONE)),
+            FAILED: self.redis.scard(self._key(FAILED)),
+        }
+
+
+def open_task_queue(location, lease_seconds: float = 120, max_attempts: int = 3) -> TaskQueue:
+    # "redis://host:port/db" for Redis, otherwise the directory of a shared file queue
+    location = str(location)
+    if location.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisTaskQueue(location, lease_seconds, max_attempts)
+    return FileTaskQueue(location, lease_seconds, max_attempts)
@@ -0,0 +1,35 @@
+import os
+import shutil
+from pathlib import Path
+from contextlib import contextmanager
+
+# Suffix of files being written; they are renamed to their final name only once complete
+PART_SUFFIX = '.part'
+
+
+def part_path(path) -> Path:
+    # "video.mp4" -> "video.mp4.part" (the suffix is appended, so globs like "*.mp4" never match partial files)
+    path = Path(path)
+    return path.with_name(path.name + PART_SUFFIX)
+
+
+@contextmanager
+def atomic_write(path):
+    # Yield a temporary path to write to; it replaces 'path' when the block succeeds and is removed otherwise,
+    # so an interrupted write never leaves a truncated file under the final name
+    path = Path(path)
+    part = part_path(path)
+    try:
+        yield part
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    # Writers that report errors by printing them may not have created anything
+    if part.exists():
+        os.replace(part, path)
+
+
+def atomic_copy(source, destination) -> Path:
+    with atomic_write(destination) as part:
+        shutil.copy(source, part)
+    return Path(destination)
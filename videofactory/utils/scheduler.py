@@ -0,0 +1,173 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from .timing import with_current_context
+
+# Memory reserved by one job of each kind when no amount is given (MB)
+DEFAULT_MEMORY_MB = {'ffmpeg': 512, 'whisper': 1500}
+
+# Number of measured jobs per width before the scheduler trusts its throughput
+MIN_SAMPLES = 2
+
+# Allocation held by the current thread (see current_allocation)
+_local = threading.local()
+
+
+def physical_memory_mb():
+    # Total physical memory, or None where it can't be read (the memory budget is then not enforced)
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def current_allocation():
+    # Allocation of the job running in this thread, or None
+    return getattr(_local, 'allocation', None)
+
+
+class Allocation:
+    """Cores and memory granted to one job; the job reports the work it did (seconds of media) with record()."""
+
+    def __init__(self, kind: str, cores: int, memory_mb: int) -> None:
+        self.kind = kind
+        self.cores = cores
+        self.memory_mb = memory_mb
+        self.work = 0.0
+
+    def record(self, work_seconds) -> None:
+        # Seconds of media processed (ffmpeg's out_time, duration of a transcribed video)
+        if work_seconds:
+            self.work += work_seconds
+
+
+class CoreScheduler:
+    """
+    Local scheduler for ffmpeg and whisper jobs running in threads of this process.
+
+    Every job gets a number of cores (its width) and reserves some memory; jobs wait until both are available,
+    so concurrent jobs never oversubscribe the machine. The width is fixed when given (FFMPEG_THREADS,
+    WHISPER_THREADS), otherwise it is chosen from the measured throughput of each width: with many jobs waiting,
+    narrow jobs usually give more throughput in total, a single job runs faster when wide.
+    """
+
+    def __init__(self, cores: int = None, memory_mb: int = None, widths: dict = None) -> None:
+        self.total_cores = max(1, int(cores or os.cpu_count() or 1))
+        self.total_memory_mb = memory_mb or physical_memory_mb()
+        self.widths = {kind: width for kind, width in (widths or {}).items() if width}
+
+        self._condition = threading.Condition()
+        self.free_cores = self.total_cores
+        self.free_memory_mb = self.total_memory_mb
+        self.waiting = 0
+        self.running = 0
+        # (kind, width) -> [jobs, work, wall]
+        self.stats = {}
+
+    def candidate_widths(self, demand: int):
+        # Powers of two up to the fair share of the cores for the current demand (and the whole machine)
+        fair = max(1, self.total_cores // max(1, demand))
+        widths = {self.total_cores}
+        width = 1
+        while width < self.total_cores:
+            widths.add(width)
+            width *= 2
+        return sorted(width for width in widths if max(1, fair // 4) <= width <= fair) or [fair]
+
+    def throughput(self, kind: str, width: int, demand: int):
+        # Media seconds per second for the whole machine if every job ran with this width
+        jobs, work, wall = self.stats.get((kind, width), (0, 0.0, 0.0))
+        if jobs < MIN_SAMPLES or wall <= 0:
+            return None
+        return work / wall * min(self.total_cores // width, demand)
+
+    def choose_width(self, kind: str) -> int:
+        if kind in self.widths:
+            return min(self.widths[kind], self.total_cores)
+
+        # The caller is already counted in 'waiting'
+        demand = self.waiting + self.running
+        candidates = self.candidate_widths(demand)
+        # Measure every candidate first, widest first (the safest choice when little is running)
+        for width in reversed(candidates):
+            if self.throughput(kind, width, demand) is None:
+                return width
+        return max(candidates, key=lambda width: self.throughput(kind, width, demand))
+
+    @contextmanager
+    def allocate(self, kind: str = 'ffmpeg', cores: int = None, memory_mb: int = None):
+        # Hold cores and memory for one job. Nested requests in the same thread share the outer allocation.
+        outer = current_allocation()
+        if outer is not None:
+            yield outer
+            return
+
+        memory_mb = memory_mb if memory_mb is not None else DEFAULT_MEMORY_MB.get(kind, 0)
+        with self._condition:
+            self.waiting += 1
+            cores = min(cores or self.choose_width(kind), self.total_cores)
+            if self.total_memory_mb is not None:
+                memory_mb = min(memory_mb, self.total_memory_mb)
+            while self.free_cores < cores or (self.free_memory_mb is not None and self.free_memory_mb < memory_mb):
+                self._condition.wait()
+            self.waiting -= 1
+            self.running += 1
+            self.free_cores -= cores
+            if self.free_memory_mb is not None:
+                self.free_memory_mb -= memory_mb
+
+        allocation = Allocation(kind, cores, memory_mb)
+        _local.allocation = allocation
+        start = time.perf_counter()
+        try:
+            yield allocation
+        finally:
+            wall = time.perf_counter() - start
+            _local.allocation = None
+            with self._condition:
+                self.running -= 1
+                self.free_cores += cores
+                if self.free_memory_mb is not None:
+                    self.free_memory_mb += memory_mb
+                if allocation.work:
+                    jobs, work, total_wall = self.stats.get((kind, cores), (0, 0.0, 0.0))
+                    self.stats[(kind, cores)] = (jobs + 1, work + allocation.work, total_wall + wall)
+                self._condition.notify_all()
+
+    def map(self, func, items, kind: str = 'ffmpeg', cores: int = None, memory_mb: int = None) -> list:
+        # Run func(item) for every item in threads, each inside its own allocation, and return the results in
+        # order. Concurrency is limited by the core and memory budget, not by the number of threads.
+        # The items run in the caller's context, so their stages are timed into the caller's run report.
+        @with_current_context
+        def run(item):
+            with self.allocate(kind, cores, memory_mb):
+                return func(item)
+
+        items = list(items)
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(items), self.total_cores)) as executor:
+            return list(executor.map(run, items))
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(settings=None) -> CoreScheduler:
+    # Scheduler shared by the whole process, created from the settings of the first caller: the command line
+    # creates it at start-up (see cli.configure_scheduler), so MAX_CORES, MAX_MEMORY_MB, FFMPEG_THREADS and
+    # WHISPER_THREADS are process-level settings that the settings of a job can't change
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            if settings is None:
+                from ..settings import get_settings
+                settings = get_settings()
+            _scheduler = CoreScheduler(cores=settings.max_cores, memory_mb=settings.max_memory_mb,
+                                       widths={'ffmpeg': settings.ffmpeg_threads,
+                                               'whisper': settings.whisper_threads})
+        return _scheduler
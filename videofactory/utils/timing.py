@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import threading
+import functools
+import contextvars
+from pathlib import Path
+from contextlib import contextmanager
+
+# Report of the run in progress (None when timing is disabled). A context variable, so concurrent jobs (each in
+# its own thread) record their stages into their own report; threads fanned out by a job run in a copy of its
+# context (see with_current_context) so their stages go to the job's report too
+_active_report = contextvars.ContextVar('run_report', default=None)
+
+
+def _cpu_time() -> float:
+    # CPU time of this process and of its finished child processes (ffmpeg), in seconds.
+    # Process-wide: with several threads, a stage also counts the CPU used by the other threads meanwhile.
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class RunReport:
+    """Wall and CPU time of the stages of one run, written as JSON and as a Chrome trace (chrome://tracing)."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.events = []
+
+    def add(self, event: dict) -> None:
+        with self._lock:
+            self.events.append(event)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def summary(self) -> dict:
+        # Total per stage name, slowest first
+        stages = {}
+        for event in self.events:
+            stage = stages.setdefault(event['name'], {'category': event['category'], 'count': 0,
+                                                      'wall_s': 0.0, 'cpu_s': 0.0})
+            stage['count'] += 1
+            stage['wall_s'] += event['wall_s']
+            stage['cpu_s'] += event['cpu_s']
+        return dict(sorted(stages.items(), key=lambda item: item[1]['wall_s'], reverse=True))
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'started_at': self.started_at,
+            'wall_s': self.elapsed(),
+            'stages': self.summary(),
+            'events': sorted(self.events, key=lambda event: event['start_s']),
+        }
+
+    def to_trace(self) -> dict:
+        # Trace Event Format: one complete ("X") event per stage, timestamps in microseconds
+        pid = os.getpid()
+        trace_events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': self.name}}]
+        threads = {}
+        for event in self.events:
+            threads.setdefault(event['tid'], event['thread'])
+            trace_events.append({
+                'name': event['name'],
+                'cat': event['category'],
+                'ph': 'X',
+                'ts': round(event['start_s'] * 1e6),
+                'dur': round(event['wall_s'] * 1e6),
+                'pid': pid,
+                'tid': event['tid'],
+                'args': {**event['args'], 'cpu_s': round(event['cpu_s'], 3), 'ok': event['ok']},
+            })
+        for tid, thread in threads.items():
+            trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread}})
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def write(self, output_dir: Path) -> Path:
+        # Write <name>.json and <name>.trace.json; returns the path of the JSON report
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        report_path = output_dir / f'{self.name}.json'
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        with open(output_dir / f'{self.name}.trace.json', 'w', encoding='utf-8') as f:
+            json.dump(self.to_trace(), f, default=str)
+        return report_path
+
+    def print_summary(self) -> None:
+        print(f'{"wall s":>9} {"cpu s":>9} {"count":>6}  stage')
+        for name, stage in self.summary().items():
+            print(f'{stage["wall_s"]:>9.2f} {stage["cpu_s"]:>9.2f} {stage["count"]:>6}  {name}')
+
+
+def get_run_report():
+    return _active_report.get()
+
+
+def with_current_context(func):
+    # Wrap func so that it runs in a copy of the caller's context (run report, ffmpeg progress callback)
+    # whichever thread calls it; new threads otherwise start with an empty context
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so every call gets its own copy
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def run_report(name: str, output_dir: Path = None):
+    # Record the stages run inside the block (by this thread, and the threads it fans out to); the report is
+    # written to output_dir (if given) at the end
+    report = RunReport(name)
+    token = _active_report.set(report)
+    try:
+        yield report
+    finally:
+        _active_report.reset(token)
+        if output_dir is not None:
+            report_path = report.write(output_dir)
+            print(f'Run report saved to "{report_path}"')
+
+
+@contextmanager
+def stage(name: str, category: str = 'stage', **args):
+    # Time a stage of the active run report. Yields a dict of arguments that the stage can complete
+    # (e.g. ffmpeg's final speed); does nothing when no report is active.
+    report = _active_report.get()
+    if report is None:
+        yield args
+        return
+
+    start = report.elapsed()
+    cpu_start = _cpu_time()
+    ok = False
+    try:
+        yield args
+        ok = True
+    finally:
+        report.add({
+            'name': name,
+            'category': category,
+            'thread': threading.current_thread().name,
+            'tid': threading.get_ident(),
+            'start_s': start,
+            'wall_s': report.elapsed() - start,
+            'cpu_s': _cpu_time() - cpu_start,
+            'args': args,
+            'ok': ok,
+        })
+
+
+def timed(name: str, category: str = 'stage'):
+    # Decorator form of stage()
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,48 @@
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from contextlib import contextmanager
+
+# tmpfs mount used for scratch files when enabled (Linux only)
+TMPFS_DIR = Path('/dev/shm')
+
+
+class JobWorkdir:
+    """Scratch directory owned by a single job."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.failed = False
+
+    def mark_failed(self) -> None:
+        # Keep the directory for inspection if keep-on-failure is enabled
+        self.failed = True
+
+
+def scratch_base_dir(temp_dir: Path, on_tmpfs: bool = False) -> Path:
+    # Scratch directories are created under /dev/shm when requested and available, otherwise under temp_dir
+    if on_tmpfs and TMPFS_DIR.is_dir() and os.access(TMPFS_DIR, os.W_OK):
+        return TMPFS_DIR / 'videofactory'
+    return Path(temp_dir)
+
+
+@contextmanager
+def job_workdir(name: str, temp_dir: Path, on_tmpfs: bool = False, keep_on_failure: bool = False):
+    # Create a unique directory for the job, so concurrent jobs never share (or delete) each other's files
+    base_dir = scratch_base_dir(temp_dir, on_tmpfs)
+    base_dir.mkdir(parents=True, exist_ok=True)
+    prefix = re.sub(r'[^\w.-]+', '_', str(name or 'job'))[:40] + '_'
+    workdir = JobWorkdir(Path(tempfile.mkdtemp(prefix=prefix, dir=base_dir)))
+
+    try:
+        yield workdir
+    except BaseException:
+        workdir.mark_failed()
+        raise
+    finally:
+        if workdir.failed and keep_on_failure:
+            print('\033[91m' + f'Job failed, keeping its scratch directory: "{workdir.path}"' + '\033[0m')
+        else:
+            shutil.rmtree(workdir.path, ignore_errors=True)
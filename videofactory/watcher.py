@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import traceback
+from pathlib import Path
+from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+from ._utils import read_lines, process_text
+from .state import DONE, FAILED
+
+# Files that make an input set (a directory with lines.txt, thumbnail_lines.txt and the PNG of every line)
+LINES_FILE = 'lines.txt'
+THUMBNAIL_LINES_FILE = 'thumbnail_lines.txt'
+
+# Directory of an input set where the outputs of changed items are moved before they are made again
+PREVIOUS_DIR = '.previous'
+
+# A failed video is tried again after RETRY_DELAY seconds, doubled after every failure, at most MAX_ATTEMPTS times
+# with the same inputs (a change of its inputs always gets a new attempt)
+RETRY_DELAY = 60.0
+MAX_ATTEMPTS = 5
+
+
+def input_set_signature(set_dir: Path) -> Tuple:
+    # (name, size, mtime) of the files of an input set; changes whenever one of them is written, added or removed
+    signature = []
+    try:
+        with os.scandir(set_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and (entry.name in (LINES_FILE, THUMBNAIL_LINES_FILE)
+                                        or entry.name.lower().endswith('.png')):
+                    stat = entry.stat()
+                    signature.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    except FileNotFoundError:
+        return ()
+    return tuple(sorted(signature))
+
+
+def item_fingerprint(line: str, thumbnail_line: str, image_file: Path) -> str:
+    # Identifies the inputs of one video; the video is made again when it changes
+    stat = image_file.stat()
+    digest = hashlib.sha1(f'{line}\n{thumbnail_line}\n{stat.st_size}:{stat.st_mtime_ns}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class _InputSet:
+    def __init__(self) -> None:
+        self.signature = None
+        self.changed_at = None
+        self.pending = False
+        self.retry_at = None  # Earliest retry of a failed video of the set (time.time())
+
+
+class FolderWatcher:
+    """
+    Watches input sets (the input directory and its subdirectories holding lines.txt and thumbnail_lines.txt)
+    and makes the talking head videos of the lines that are new or changed.
+
+    Directories are polled, which works the same on Linux, Windows and network mounts and only stats the few files
+    of each set. A set is processed once it has been quiet for 'debounce' seconds, so copying many files or
+    editing the lines several times in a row triggers one run. The inputs of every video are fingerprinted in the
+    state store once they are made: only the videos whose line, thumbnail line or image changed are made again (the
+    previous outputs are moved to .previous/), at most 'concurrency' at a time. Failed videos are tried again with
+    a growing delay, up to MAX_ATTEMPTS times.
+    """
+
+    def __init__(self, workflow_manager, watch_dir: Path = None, debounce: float = 10.0, poll_interval: float = 2.0,
+                 concurrency: int = 1) -> None:
+        self.workflow_manager = workflow_manager
+        self.watch_dir = Path(watch_dir or workflow_manager.settings.input_dir)
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.concurrency = max(1, concurrency)
+
+        self.sets: Dict[Path, _InputSet] = {}
+        self.running = set()  # Image files of the videos being made
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='watch')
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def find_input_sets(self) -> List[Path]:
+        candidates = [self.watch_dir]
+        try:
+            with os.scandir(self.watch_dir) as entries:
+                candidates += [Path(entry.path) for entry in entries
+                               if entry.is_dir() and not entry.name.startswith('.')]
+        except FileNotFoundError:
+            return []
+        return [candidate for candidate in candidates
+                if (candidate / LINES_FILE).is_file() and (candidate / THUMBNAIL_LINES_FILE).is_file()]
+
+    def input_items(self, set_dir: Path) -> List[Tuple[str, str, Path]]:
+        # (line, thumbnail line, image) of every video of the set, matched as in generate_multiple_talking_head_videos
+        lines = read_lines(set_dir / LINES_FILE)
+        thumbnail_lines = read_lines(set_dir / THUMBNAIL_LINES_FILE)
+        if len(lines) != len(thumbnail_lines):
+            print(f'Error: The number of lines in the files of "{set_dir}" does not match. Skipping...')
+            return []
+
+        items = []
+        for line, thumbnail_line in zip(lines, thumbnail_lines):
+            first_part = process_text(line)[0]
+            thumbnail_first_part, thumbnail_outside_text, _ = process_text(thumbnail_line)
+            if first_part != thumbnail_first_part:
+                print(f'Error: "{line}" and "{thumbnail_line}" don\'t match. Skipping...')
+                continue
+            items += [(line, thumbnail_outside_text, png_file)
+                      for png_file in sorted(set_dir.glob(f'{first_part}*.png'))]
+        return items
+
+    def _outputs(self, image_file: Path) -> List[Path]:
+        # Script folder, final video and renditions of a video
+        outputs = [image_file.parent / image_file.stem, image_file.parent / f'{image_file.stem}.mp4']
+        renditions = self.workflow_manager.settings.renditions
+        if renditions:
+            from .editors._profiles import parse_renditions
+            outputs += [image_file.parent / f'{image_file.stem}_{rendition.name}.mp4'
+                        for rendition in parse_renditions(renditions, self.workflow_manager.settings.assets_dir)]
+        return [output for output in outputs if output.exists()]
+
+    def _archive_outputs(self, image_file: Path) -> None:
+        # Outputs of the previous inputs would be skipped as "already exists", so move them out of the way
+        outputs = self._outputs(image_file)
+        if not outputs:
+            return
+        archive_dir = image_file.parent / PREVIOUS_DIR / time.strftime('%Y%m%d-%H%M%S')
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        for output in outputs:
+            shutil.move(str(output), str(archive_dir / output.name))
+        print(f'Moved the previous outputs of "{image_file.name}" to "{archive_dir}"')
+
+    def _schedule_retry(self, set_dir: Path, retry_at: float) -> None:
+        with self._lock:
+            input_set = self.sets.get(set_dir)
+            if input_set is not None and (input_set.retry_at is None or retry_at < input_set.retry_at):
+                input_set.retry_at = retry_at
+
+    def _make_video(self, line: str, thumbnail_line: str, image_file: Path, item: int, fingerprint: str,
+                    attempts: int = 0, last_fingerprint: str = None) -> None:
+        # Runs in a thread of the executor
+        state = self.workflow_manager.state
+        try:
+            with self.workflow_manager.job_scope(f'watch-{image_file.stem}') as job_workflow_manager:
+                job_workflow_manager.generate_talking_head_video(line, thumbnail_line, image_file)
+            final_video = image_file.parent / f'{image_file.stem}.mp4'
+            if final_video.is_file():
+                state.record(item, 'video', DONE, artifact=final_video)
+                # Only a made video saves the fingerprint of its inputs
+                state.item('watch', image_file, data={'fingerprint': fingerprint})
+                return
+            state.record(item, 'video', FAILED, error=f'Artifact not created: {final_video}')
+        except Exception as e:
+            traceback.print_exc()
+            state.record(item, 'video', FAILED, error=f'{type(e).__name__}: {e}')
+        finally:
+            with self._lock:
+                self.running.discard(image_file)
+
+        # Failed: record the attempt, so the same inputs are tried again after a growing delay, a limited number
+        # of times, instead of on every poll. The fingerprint of the last made video is kept ('data' is replaced).
+        attempts += 1
+        retry_at = time.time() + RETRY_DELAY * 2 ** (attempts - 1)
+        state.item('watch', image_file, data={'fingerprint': last_fingerprint, 'failed_fingerprint': fingerprint,
+                                              'attempts': attempts, 'retry_at': retry_at})
+        if attempts < MAX_ATTEMPTS:
+            print('\033[91m' + f'"{image_file.name}" failed (attempt {attempts}/{MAX_ATTEMPTS}). '
+                  f'Retrying in {retry_at - time.time():.0f}s...' + '\033[0m')
+            self._schedule_retry(image_file.parent, retry_at)
+        else:
+            print('\033[91m' + f'"{image_file.name}" failed {attempts} times. '
+                  'Skipping until its inputs change...' + '\033[0m')
+
+    def process_input_set(self, set_dir: Path) -> int:
+        # Schedule the videos of the set whose inputs changed; returns their number
+        state = self.workflow_manager.state
+        recorded = {item['key']: item for item in state.items('watch')}
+        scheduled = 0
+        for line, thumbnail_line, image_file in self.input_items(set_dir):
+            fingerprint = item_fingerprint(line, thumbnail_line, image_file)
+            previous = recorded.get(str(image_file))
+            previous_data = json.loads(previous['data']) if previous and previous['data'] else {}
+            previous_fingerprint = previous_data.get('fingerprint')
+            failed_fingerprint = previous_data.get('failed_fingerprint')
+            if previous_fingerprint == fingerprint and failed_fingerprint is None:
+                continue
+            attempts = 0
+            if failed_fingerprint == fingerprint:
+                # Failed with the same inputs: wait for its retry, or for a change after the last attempt
+                attempts = previous_data.get('attempts', 0)
+                if attempts >= MAX_ATTEMPTS:
+                    continue
+                if time.time() < previous_data.get('retry_at', 0):
+                    self._schedule_retry(set_dir, previous_data['retry_at'])
+                    continue
+            with self._lock:
+                if image_file in self.running:
+                    # Changed while it is being made: check the set again once the current run is over
+                    if set_dir in self.sets:
+                        self.sets[set_dir].pending = True
+                    continue
+
+            item = state.item('watch', image_file)
+            if not previous_data and (image_file.parent / f'{image_file.stem}.mp4').is_file():
+                # Made before the watcher saw it (e.g. by a batch run): adopt it
+                state.item('watch', image_file, data={'fingerprint': fingerprint})
+                continue
+            # Outputs of other inputs, made or left by a failed attempt, would be reused by the resumed stages.
+            # Those of a failed attempt with the same inputs are kept, so the retry resumes from them.
+            last_attempt = failed_fingerprint or previous_fingerprint
+            if last_attempt is not None and last_attempt != fingerprint:
+                self._archive_outputs(image_file)
+
+            reason = f'attempt {attempts + 1}' if attempts else 'changed' if last_attempt else 'new'
+            print(f'\033[1;33mScheduling "{image_file.name}" ({reason})\033[0m')
+            with self._lock:
+                self.running.add(image_file)
+            self._executor.submit(self._make_video, line, thumbnail_line, image_file, item, fingerprint, attempts,
+                                  previous_fingerprint)
+            scheduled += 1
+        return scheduled
+
+    def poll(self) -> int:
+        # Check every input set once; process those that have been quiet for the debounce period
+        now = time.monotonic()
+        scheduled = 0
+        for set_dir in self.find_input_sets():
+            input_set = self.sets.setdefault(set_dir, _InputSet())
+            signature = input_set_signature(set_dir)
+            if signature != input_set.signature:
+                input_set.signature = signature
+                input_set.changed_at = now
+                input_set.pending = True
+            elif (input_set.pending and now - input_set.changed_at >= self.debounce) or \
+                    (not input_set.pending and input_set.retry_at is not None and time.time() >= input_set.retry_at):
+                # Quiet for the debounce period, or a failed video is due for a retry
+                input_set.pending = False
+                with self._lock:
+                    input_set.retry_at = None
+                try:
+                    scheduled += self.process_input_set(set_dir)
+                except OSError as e:
+                    # A file was removed or renamed meanwhile; the set changed, so it is checked again
+                    print(f'Error: Could not read the input set "{set_dir}": {e}. Skipping...')
+        return scheduled
+
+    def run(self, once: bool = False) -> None:
+        # Poll until stopped; with 'once', process every set now and wait for its videos (e.g. from cron)
+        print(f'Watching "{self.watch_dir}" (debounce {self.debounce:g}s, {self.concurrency} at a time)...')
+        try:
+            if once:
+                for set_dir in self.find_input_sets():
+                    self.process_input_set(set_dir)
+                return
+            while not self._stopping.is_set():
+                self.poll()
+                self._stopping.wait(self.poll_interval)
+        finally:
+            self._executor.shutdown(wait=True)
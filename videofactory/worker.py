@@ -0,0 +1,174 @@
+import time
+import threading
+import traceback
+from pathlib import Path
+
+from .editors.video_editor import VideoEditor
+from .task_queue import TaskQueue, Task, default_worker_id
+from .utils.atomic import atomic_copy
+
+# Stages of a talking head video after its D-ID video, in order. The coordinator runs the API stages (TTS,
+# D-ID) itself and queues these CPU-heavy ones (ffmpeg, whisper) as tasks for the workers.
+PIPELINE = ('watermark_removal', 'subtitles', 'music_merge', 'watermark_text', 'thumbnail', 'final')
+
+# Settings sent with every task, so each worker encodes and styles the videos the same way as the coordinator.
+# The stages write their artifacts to processed_dir and processed_videos_dir, which must therefore be on the mount
+# shared by the coordinator and the workers (the path as seen by the coordinator is used on every worker).
+SHARED_OPTIONS = ('encoder_profile', 'renditions', 'subtitle_style', 'subtitle_case', 'subtitle_prepend_string',
+                  'thumbnail_overlay', 'thumbnail_font', 'watermark_text', 'processed_dir', 'processed_videos_dir')
+
+
+# region Stages
+# Each stage takes the workflow manager of the task and the task payload, and returns the path of its artifact.
+# Paths in the payload and the output directories of SHARED_OPTIONS must be visible to every worker (e.g. on a
+# shared mount).
+def remove_watermark(workflow_manager, payload: dict):
+    video_editor = VideoEditor(width=540, height=960, input_video=payload['video'], settings=workflow_manager.settings)
+    return video_editor.remove_d_id_watermark(input_image=payload['image'])
+
+
+def add_subtitles(workflow_manager, payload: dict):
+    video = Path(payload['video'])
+    subtitle_file = workflow_manager.subtitle_generator.generate_subtitle(input_video=video)
+    modified_subtitle_file = workflow_manager.subtitle_generator.modify_subtitle(subtitle_file)
+    return workflow_manager.subtitle_generator.burn_subtitle(input_video=video, subtitle_file=modified_subtitle_file)
+
+
+def merge_music(workflow_manager, payload: dict):
+    video_editor = VideoEditor(width=540, height=960, input_video=payload['video'], settings=workflow_manager.settings)
+    return video_editor.merge_audio_files_with_fading_effects()
+
+
+def add_watermark_text(workflow_manager, payload: dict):
+    video_editor = VideoEditor(width=540, height=960, input_video=payload['video'], settings=workflow_manager.settings)
+    return video_editor.add_watermark_text()
+
+
+def add_thumbnail(workflow_manager, payload: dict):
+    # The thumbnail is made from the first frame of the video without watermark, and joined to the watermarked one
+    # of the payload (the artifact of the previous stage, possibly made on another worker)
+    no_watermark_video = Path(payload['no_watermark_video'])
+    thumbnail_generator = workflow_manager.thumbnail_generator
+    first_frame = thumbnail_generator.grab_first_frame(video_file=no_watermark_video)
+    thumbnail_image = Path(thumbnail_generator.generate_thumbnail_image(
+        input_filename=no_watermark_video.name.split('_')[0],
+        input_image_path=first_frame,
+        text=payload['thumbnail_line']))
+    if not thumbnail_image.is_file():
+        return None
+    return thumbnail_generator.generate_thumbnail_video(thumbnail_image_name=thumbnail_image.name,
+                                                        video_file=Path(payload['video']))
+
+
+def finalize(workflow_manager, payload: dict):
+    final_video = Path(payload['final_video'])
+    atomic_copy(payload['video'], final_video)
+    workflow_manager.render_renditions(Path(payload['video']), final_video)
+    return final_video
+
+
+STAGE_TASKS = {
+    'watermark_removal': remove_watermark,
+    'subtitles': add_subtitles,
+    'music_merge': merge_music,
+    'watermark_text': add_watermark_text,
+    'thumbnail': add_thumbnail,
+    'final': finalize,
+}
+# endregion
+
+
+def run_task(workflow_manager, task: Task) -> dict:
+    # Run the stage in its own job scope (scratch directory, run report) with the coordinator's options
+    if task.kind not in STAGE_TASKS:
+        raise ValueError(f'Unsupported task: {task.kind}')
+    settings = workflow_manager.settings.with_overrides(**task.payload.get('options', {}))
+    with workflow_manager.job_scope(f'{task.kind}-{task.payload.get("item")}', settings) as job_workflow_manager:
+        artifact = STAGE_TASKS[task.kind](job_workflow_manager, task.payload)
+
+    # Most steps report failures by printing them, so a missing artifact also means the stage failed
+    if artifact is None or not Path(artifact).is_file():
+        raise RuntimeError(f'Artifact not created: {artifact}')
+    return {'artifact': str(artifact)}
+
+
+class Worker:
+    """
+    Claims tasks from a task queue and runs them, renewing the lease of each task with heartbeats while it runs.
+
+    Workers need no API keys: they only run the CPU-heavy stages, so more render boxes can be added to a batch
+    at any time. With several threads, the cores are shared by the local scheduler (MAX_CORES, FFMPEG_THREADS).
+    """
+
+    def __init__(self, task_queue: TaskQueue, workflow_manager=None, kinds=None, worker_id: str = None,
+                 poll_interval: float = 2.0) -> None:
+        if workflow_manager is None:
+            from .workflows import WorkflowManager
+            workflow_manager = WorkflowManager()
+        self.task_queue = task_queue
+        self.workflow_manager = workflow_manager
+        self.kinds = list(kinds) if kinds else list(STAGE_TASKS)
+        self.worker_id = worker_id or default_worker_id()
+        self.poll_interval = poll_interval
+        self._stopping = threading.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def _heartbeat(self, task: Task, done: threading.Event) -> None:
+        # Renew the lease well before it expires; a lost lease means another worker runs the task now
+        interval = max(1.0, self.task_queue.lease_seconds / 3)
+        while not done.wait(interval):
+            if not self.task_queue.heartbeat(task):
+                print('\033[91m' + f'Lost the lease of task {task.id}; its result will be discarded.' + '\033[0m')
+                return
+
+    def run_once(self, worker_id: str = None) -> bool:
+        # Claim and run one task; False if there was none
+        task = self.task_queue.claim(worker_id or self.worker_id, self.kinds)
+        if task is None:
+            return False
+
+        print(f'\033[1;33m[{task.worker}] {task.kind} (task {task.id}, attempt {task.attempts})\033[0m')
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(task, done), daemon=True)
+        heartbeat.start()
+        try:
+            result = run_task(self.workflow_manager, task)
+        except Exception as e:
+            traceback.print_exc()
+            self.task_queue.fail(task, f'{type(e).__name__}: {e}')
+            print('\033[91m' + f'{task.kind} failed: {e}' + '\033[0m')
+        else:
+            if self.task_queue.complete(task, result):
+                print('\033[92m' + f'{task.kind} finished: "{result["artifact"]}"' + '\033[0m')
+        finally:
+            done.set()
+            heartbeat.join()
+        return True
+
+    def _run_loop(self, worker_id: str, max_idle: float = None) -> None:
+        idle_since = time.monotonic()
+        while not self._stopping.is_set():
+            if self.run_once(worker_id):
+                idle_since = time.monotonic()
+            elif max_idle is not None and time.monotonic() - idle_since >= max_idle:
+                return
+            else:
+                self._stopping.wait(self.poll_interval)
+
+    def run(self, concurrency: int = 1, max_idle: float = None) -> None:
+        # Run tasks until stopped, or until no task was found for max_idle seconds
+        if concurrency <= 1:
+            self._run_loop(self.worker_id, max_idle)
+            return
+        threads = [threading.Thread(target=self._run_loop, args=(f'{self.worker_id}-{index}', max_idle))
+                   for index in range(1, concurrency + 1)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            self.stop()
+            raise
@@ -1,16 +1,14 @@
 import os
-import shutil
-import subprocess
+import json
+import time
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-import pandas as pd
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from .generators.text_generator import TextGenerator
-from .generators.image_generator import ImageGenerator
-from .generators.tts_generator import TTSGenerator
-from .generators.video_generator import VideoGenerator, LastKeyReachedException
-from .generators.subtitle_generator import SubtitleGenerator
-from .generators.thumbnail_generator import ThumbnailGenerator
+from .generators.video_generator import LastKeyReachedException
+from .settings import Settings, get_settings, job_environ
+from .state import DONE, FAILED, RUNNING
 
 from ._utils import (
     read_lines,
@@ -29,21 +27,166 @@ from ._utils import (
 
 from .editors.video_editor import VideoEditor
 from .editors.audio_editor import AudioEditor
+from .editors._ffmpeg import FFmpegCommand, FFmpegError, print_progress, set_progress_callback
+from .editors._profiles import load_encoder_profile
 
 from .utils.topaz import temp_working_directory, enhance_video_with_ai
+from .utils.atomic import atomic_copy
+from .utils.scheduler import get_scheduler
+from .utils.timing import run_report, stage, with_current_context
+from .utils.workdir import job_workdir
 
 
-class WorkflowManager:
+def _create_text_generator(settings):
+    from .generators.text_generator import TextGenerator
+    return TextGenerator('g4f', settings=settings, mock=settings.mock_providers)
+
+
+def _create_image_generator(settings):
+    from .generators.image_generator import ImageGenerator
+    return ImageGenerator('automatic1111', mock=settings.mock_providers)
+
+
+def _create_tts_generator(settings):
+    from .generators.tts_generator import TTSGenerator
+    return TTSGenerator(mock=settings.mock_providers)
+
+
+def _create_video_generator(settings):
+    from .generators.video_generator import VideoGenerator
+    return VideoGenerator(mock=settings.mock_providers)
+
+
+def _create_subtitle_generator(settings):
+    from .generators.subtitle_generator import SubtitleGenerator
+    return SubtitleGenerator(settings=settings)
+
+
+def _create_thumbnail_generator(settings):
+    from .generators.thumbnail_generator import ThumbnailGenerator
+    return ThumbnailGenerator(settings=settings)
+
+
+def _create_state_store(settings):
+    from .state import StateStore
+    return StateStore(settings.state_db or settings.output_dir / 'state.db')
+
+
+def _create_task_queue(settings):
+    from .task_queue import open_task_queue
+    return open_task_queue(settings.task_queue or settings.output_dir / 'queue',
+                           lease_seconds=settings.task_lease_seconds)
+
+
+class _ComponentPool:
+    # Components released by finished jobs, by name and the settings they were created with. A job with the same
+    # settings takes one instead of creating its own, so what it loaded (clients, sessions, models) is reused;
+    # a component is only ever held by one job at a time, as generators keep per-job state (provider, key).
     def __init__(self):
-        self.text_generator = TextGenerator('g4f')  # Initialize ImageGenerator object
-        self.image_generator = ImageGenerator('automatic1111')  # Initialize ImageGenerator object
-        self.tts_generator = TTSGenerator()  # Initialize TTSGenerator object
-        self.video_generator = VideoGenerator()  # Initialize VideoGenerator object
-        self.subtitle_generator = SubtitleGenerator()  # Initialize SubtitleGenerator object
-        self.thumbnail_generator = ThumbnailGenerator()  # Initialize ThumbnailGenerator object
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    def acquire(self, name, key):
+        with self._lock:
+            idle = self._idle.get((name, key))
+            return idle.pop() if idle else None
+
+    def release(self, name, key, component):
+        with self._lock:
+            self._idle.setdefault((name, key), []).append(component)
+
+
+class _LazyComponent:
+    # Creates the component on first access and stores it on the instance, so later accesses are plain
+    # attribute lookups. Assigning the attribute (e.g. to inject a preconfigured generator) also works.
+    # 'fields' are the settings the component is created from: components with fields are taken from and
+    # released to the pool of the manager, so the next job with the same values of these settings reuses them.
+    def __init__(self, factory, fields=None):
+        self.factory = factory
+        self.fields = fields
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def key(self, settings):
+        # The variables of the job are part of the key: API clients read their keys from them when created
+        return tuple(getattr(settings, field) for field in self.fields) + tuple(sorted(settings.env.items()))
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        with instance._components_lock:
+            if self.name not in instance.__dict__:
+                component = None
+                if self.fields is not None:
+                    component = instance._pool.acquire(self.name, self.key(instance.settings))
+                if component is None:
+                    component = self.factory(instance.settings)
+                instance.__dict__[self.name] = component
+        return instance.__dict__[self.name]
+
+    def release(self, instance):
+        # Give the component of 'instance' back to the pool, if it was created
+        if self.fields is not None and self.name in instance.__dict__:
+            instance._pool.release(self.name, self.key(instance.settings), instance.__dict__.pop(self.name))
+
 
-        self.video_editor = VideoEditor(width=540, height=960)  # Initialize VideoEditor object
-        self.audio_editor = AudioEditor()  # Initialize AudioEditor object
+class WorkflowManager:
+    # Generators are created on first use: they import heavy libraries (g4f, langchain, webuiapi,
+    # stable_whisper/torch, PIL) or create API clients, and most workflows only need a few of them
+    # (the thumbnail generator writes to the scratch directory of its job, so it isn't pooled)
+    text_generator = _LazyComponent(_create_text_generator, fields=('processed_dir', 'mock_providers'))
+    image_generator = _LazyComponent(_create_image_generator, fields=('mock_providers',))
+    tts_generator = _LazyComponent(_create_tts_generator, fields=('mock_providers',))
+    video_generator = _LazyComponent(_create_video_generator, fields=('mock_providers',))
+    subtitle_generator = _LazyComponent(_create_subtitle_generator, fields=(
+        'assets_dir', 'input_dir', 'processed_dir', 'encoder_profile',
+        'subtitle_style', 'subtitle_case', 'subtitle_prepend_string'))
+    thumbnail_generator = _LazyComponent(_create_thumbnail_generator)
+    state = _LazyComponent(_create_state_store, fields=('state_db', 'output_dir'))
+    task_queue = _LazyComponent(_create_task_queue, fields=('task_queue', 'output_dir', 'task_lease_seconds'))
+
+    def __init__(self, settings: Settings = None, pool: _ComponentPool = None):
+        # Settings are fixed for the lifetime of the manager; use with_settings() for per-job overrides.
+        # The managers of the jobs share the pool of the manager they were created from.
+        self.settings = settings or get_settings()
+        self._pool = pool or _ComponentPool()
+        self._components_lock = threading.RLock()
+
+        self.video_editor = VideoEditor(width=540, height=960, settings=self.settings)  # Initialize VideoEditor object
+        self.audio_editor = AudioEditor(settings=self.settings)  # Initialize AudioEditor object
+
+    def with_settings(self, settings: Settings = None, **overrides) -> 'WorkflowManager':
+        # Return a manager for one job, with its own settings. Its components come from the shared pool when
+        # they were created with the same settings; release_components() gives them back.
+        settings = (settings or self.settings).with_overrides(**overrides)
+        return WorkflowManager(settings=settings, pool=self._pool)
+
+    def release_components(self) -> None:
+        # Give the created components to the pool, for the next job with the same settings (see warm_up)
+        with self._components_lock:
+            for component in vars(type(self)).values():
+                if isinstance(component, _LazyComponent):
+                    component.release(self)
+
+    @contextmanager
+    def job_scope(self, name: str, settings: Settings = None):
+        # Yield a manager whose temporary files go to a scratch directory owned by this job. The directory is
+        # removed when the job finishes, or kept for inspection after a failure if keep_failed_scratch is set.
+        # The stages of the job are timed into a run report, written to report_dir when it is set, and the
+        # variables of the job (settings.env) are visible to the API clients it creates.
+        settings = settings or self.settings
+        with job_workdir(name, settings.temp_dir, on_tmpfs=settings.scratch_on_tmpfs,
+                         keep_on_failure=settings.keep_failed_scratch) as workdir, \
+                run_report(workdir.path.name, settings.report_dir), job_environ(settings.env):
+            previous_callback = set_progress_callback(print_progress) if settings.ffmpeg_progress else None
+            job_workflow_manager = self.with_settings(settings, temp_dir=workdir.path)
+            try:
+                yield job_workflow_manager
+            finally:
+                job_workflow_manager.release_components()
+                if settings.ffmpeg_progress:
+                    set_progress_callback(previous_callback)
 
     def check_talking_head_videos_resources(self, lines_file, thumbnail_lines_file, images_dir):
         try:
@@ -103,7 +246,7 @@ class WorkflowManager:
 
                 # Set the TTS provider to be used based on the environment variable 'TTS_PROVIDER'
                 # The TTS provider will determine which Text-to-Speech engine or service to use.
-                self.tts_generator.set_tts_provider(os.environ.get('TTS_PROVIDER'))
+                self.tts_generator.set_tts_provider(self.settings.tts_provider)
 
                 # Generate audio files from the text in 'lines_file' using TTS generator
                 # The output audio files will be saved in the 'script_folder' directory.
@@ -156,13 +299,24 @@ class WorkflowManager:
             output_ids_file = self.video_generator.create_talk_videos_from_images_and_audios(
                 images_and_audios_dict=images_and_audios_dict,
                 output_dir=output_dir,
-                keys=os.environ.get('D-ID_BASIC_TOKENS'))
+                keys=self.settings.d_id_keys)
 
             # # This line is only for debugging purposes.
             # output_ids_file = Path(output_dir) / 'd-id_output_ids.json'
 
+            # Record the D-ID talk ids in the state store, so they are known without reading the JSON file
+            d_id_items = {}
+            if output_ids_file.is_file():
+                with open(output_ids_file, 'r') as infile:
+                    for ids in json.load(infile).values():
+                        for basename, talk_id in ids.items():
+                            d_id_items[basename] = self.state.item('talking-heads', output_dir / basename)
+                            self.state.record(d_id_items[basename], 'd_id', RUNNING, provider_job_id=talk_id)
+
             # Download generated videos
             self.video_generator.get_talks_from_json(output_ids_file=output_ids_file, output_dir=output_dir)
+            for basename, item in d_id_items.items():
+                self.state.record_existing(item, 'd_id', output_dir / f'{basename}_d_id.mp4')
             # endregion
 
             return output_dir
@@ -180,56 +334,85 @@ class WorkflowManager:
             return False
         # endregion
 
+        # The videos are edited concurrently: the scheduler runs as many as the cores and memory allow, each with
+        # its own VideoEditor (the editor keeps the current video as state) and its share of the cores
+        scheduler = get_scheduler(self.settings)
+
+        # Every D-ID video is an item of the state store, and the items are taken from the store. videos_dir is
+        # only scanned to register the videos added since the last run; the next steps take their inputs from
+        # the artifacts recorded by the previous step
+        for d_id_mp4_file in videos_dir.glob('*_d_id.mp4'):
+            self.state.item('edit', d_id_mp4_file)
+        items = {row['key']: row['id'] for row in self.state.items('edit')
+                 if Path(row['key']).parent == Path(videos_dir) and Path(row['key']).is_file()}
+
         # region Step 2: REMOVE D-ID WATERMARKS
         # ------------------------------------
-        # Get all files in the videos_dir directory with the extension '_d_id.mp4'
-        d_id_mp4_files = list(videos_dir.glob('*_d_id.mp4'))
-        for d_id_mp4_file in d_id_mp4_files:
+        # Only the videos whose watermark removal isn't done, or whose artifact is gone (or changed, when resuming)
+        pending = {row['key'] for row in self.state.pending('edit', 'watermark_removal')}
+        get_artifact = self.state.verified_artifact if self.settings.resume else self.state.artifact
+        d_id_mp4_files = [Path(key) for key, item in items.items()
+                          if key in pending or get_artifact(item, 'watermark_removal') is None]
+
+        def remove_watermark(d_id_mp4_file):
             input_image = str(Path(images_dir) / (d_id_mp4_file.stem.replace('_d_id', '') + '.png'))
-            self.video_editor.input_video = str(d_id_mp4_file)
-            self.video_editor.remove_d_id_watermark(input_image=input_image)
+            with self.state.stage(items[str(d_id_mp4_file)], 'watermark_removal') as record:
+                video_editor = VideoEditor(width=540, height=960, input_video=str(d_id_mp4_file),
+                                           settings=self.settings)
+                record.artifact = video_editor.remove_d_id_watermark(input_image=input_image)
+
+        scheduler.map(remove_watermark, d_id_mp4_files)
         # endregion
 
         # region Step 3: ADD SUBTITLES
-        # Get all files in the videos_dir directory with the extension '_d_id.mp4'
-        no_watermark_mp4_files = list(videos_dir.glob('*_no_watermark.mp4'))
-        for no_watermark_mp4_file in no_watermark_mp4_files:
-            # Generate subtitle
+        no_watermark_mp4_files = self.state.artifacts('edit', 'watermark_removal', keys=items)
+        subtitle_files = []
+        for key, no_watermark_mp4_file in no_watermark_mp4_files.items():
+            # Generate subtitle (transcriptions share the whisper model and run one at a time)
             subtitle_file = self.subtitle_generator.generate_subtitle(input_video=no_watermark_mp4_file)
             # Modify subtitle with styles
             modified_subtitle_file = self.subtitle_generator.modify_subtitle(subtitle_file)
-            # Burn subtitle
-            # subtitled_file = self.subtitle_generator.burn_subtitle(
-            #                 input_video=no_watermark_mp4_file,
-            #                 subtitle_file=modified_subtitle_file)
-            self.subtitle_generator.burn_subtitle(
-                            input_video=no_watermark_mp4_file,
-                            subtitle_file=modified_subtitle_file)
+            subtitle_files.append((key, no_watermark_mp4_file, modified_subtitle_file))
+
+        # Burn subtitles
+        def burn_subtitle(files):
+            key, no_watermark_mp4_file, modified_subtitle_file = files
+            with self.state.stage(items[key], 'subtitles') as record:
+                record.artifact = self.subtitle_generator.burn_subtitle(input_video=no_watermark_mp4_file,
+                                                                        subtitle_file=modified_subtitle_file)
+
+        scheduler.map(burn_subtitle, subtitle_files)
         # endregion
 
         # region Step 4: EDIT
-        # Get all files in the videos_dir directory with the extension '_d_id.mp4'
-        subtitled_mp4_files = list(videos_dir.glob('*_subtitled.mp4'))
-        for subtitled_mp4_file in subtitled_mp4_files:
+        def edit(key_and_file):
+            key, subtitled_mp4_file = key_and_file
+            video_editor = VideoEditor(width=540, height=960, input_video=subtitled_mp4_file, settings=self.settings)
             # Add music
-            self.video_editor.input_video = subtitled_mp4_file
-            mp4_output_filepath = self.video_editor.merge_audio_files_with_fading_effects()
+            with self.state.stage(items[key], 'music_merge') as record:
+                mp4_output_filepath = video_editor.merge_audio_files_with_fading_effects()
+                record.artifact = mp4_output_filepath
 
             # Add watermark text
-            self.video_editor.input_video = mp4_output_filepath
-            # mp4_output_wm_filepath = self.video_editor.add_watermark_text()
-            self.video_editor.add_watermark_text()
+            with self.state.stage(items[key], 'watermark_text') as record:
+                video_editor.input_video = mp4_output_filepath
+                record.artifact = video_editor.add_watermark_text()
+
+        scheduler.map(edit, self.state.artifacts('edit', 'subtitles', keys=items).items())
         # endregion
 
         # region Step 5: ADD THUMBNAILS
+        no_watermark_mp4_files = {Path(key).name.removesuffix('_d_id.mp4'): no_watermark_mp4_file for
+                                  key, no_watermark_mp4_file in self.state.artifacts('edit', 'watermark_removal',
+                                                                                     keys=items).items()}
         thumbnail_lines = read_lines(thumbnail_lines_file)
         for thumbnail_line in thumbnail_lines:
             first_part, outside_text, _ = process_text(thumbnail_line)
-            no_watermark_mp4_file = videos_dir / f'{first_part}_no_watermark.mp4'
-            if Path(no_watermark_mp4_file).is_file():
-                first_frame = self.thumbnail_generator.extract_first_frame(video_file=no_watermark_mp4_file)
+            no_watermark_mp4_file = no_watermark_mp4_files.get(first_part)
+            if no_watermark_mp4_file is not None and no_watermark_mp4_file.is_file():
+                first_frame = self.thumbnail_generator.grab_first_frame(video_file=no_watermark_mp4_file)
                 self.thumbnail_generator.generate_thumbnail_image(
-                    input_filename=first_frame.name.split('_')[0],
+                    input_filename=no_watermark_mp4_file.name.split('_')[0],
                     input_image_path=first_frame,
                     text=outside_text)
 
@@ -238,6 +421,8 @@ class WorkflowManager:
         # endregion
 
     def generate_quotes(self, input_query: str = None):
+        import pandas as pd  # Only the quote/image prompt workflows need pandas
+
         input_query = normalize_string(input_query.strip())
 
         # Call the generate_chat_responses function with a query:
@@ -291,6 +476,8 @@ class WorkflowManager:
             return
 
     def generate_image_prompts_from_txt(self, input_file: Path, output_dir: Path = None) -> Path:
+        import pandas as pd
+
         quotes_list = read_lines(input_file)
         # Calculate the zero-padding for the index number based on the maximum line number
         max_line_number = len(str(len(quotes_list)))
@@ -369,6 +556,8 @@ class WorkflowManager:
         return Path(csv_dir)
 
     def generate_images_from_csv(self, csv_dir: Path, output_dir: Path = None) -> Path:
+        import pandas as pd
+
         # Scan csv_dir for csv files
         csv_files = csv_dir.glob('*.csv')
 
@@ -399,7 +588,26 @@ class WorkflowManager:
 
         return Path(output_dir)
 
-    def generate_talking_head_video(self, line: str, thumbnail_line: str, image_file: Path):
+    def _is_done(self, item: int, stage_name: str, artifact) -> bool:
+        # Whether a stage can be skipped, according to the state store: the stage finished and its artifact is
+        # still there. When resuming (RESUME), the artifact must also match the recorded hash, so a file left by a
+        # crashed or interrupted run is made again. Only stages the store doesn't know about (artifacts of runs made
+        # before it existed, or by hand) are found by their file name.
+        artifact = Path(artifact)
+        if self.state.get_stage(item, stage_name) is None:
+            return artifact.is_file()
+        get_artifact = self.state.verified_artifact if self.settings.resume else self.state.artifact
+        recorded = get_artifact(item, stage_name)
+        return recorded is not None and recorded.resolve() == artifact.resolve()
+
+    def _resumed_artifact(self, item: int, stage_name: str):
+        # Verified artifact of a stage whose output name isn't known in advance, when resuming
+        return self.state.verified_artifact(item, stage_name) if self.settings.resume else None
+
+    def generate_talking_head_sources(self, line: str, thumbnail_line: str, image_file: Path):
+        # Steps 1-2 of a talking head video, which use the TTS and D-ID APIs (and their keys and credits).
+        # Return (state store item, script folder, D-ID video), or None if the video is already done or a step
+        # failed.
         self.video_generator.set_vidgen_provider('d-id')
 
         # region Step 1: GENERATE AUDIO
@@ -412,26 +620,37 @@ class WorkflowManager:
         (script_folder / f'line_{image_file.stem}.txt').write_text(line, encoding='utf-8')
         (script_folder / f'thumbnail_line_{image_file.stem}.txt').write_text(thumbnail_line, encoding='utf-8')
 
+        # Stages, artifacts and provider job ids of this video are recorded in the state store
+        item = self.state.item('talking-head', script_folder,
+                               data={'line': line, 'thumbnail_line': thumbnail_line, 'image': str(image_file)})
+        final_video = Path(script_folder.parent / (f'{image_file.stem}.mp4'))
+        if self.settings.resume and self._is_done(item, 'final', final_video):
+            print(f'"{final_video}" already exists. Skipping...')
+            return
+
         audio_files = []
-        self.tts_generator.set_tts_provider(os.environ.get('TTS_PROVIDER'))
+        self.tts_generator.set_tts_provider(self.settings.tts_provider)
         script_file = script_folder / 'script.txt'
         # output_dir = script_folder.parent
         tts_file = None
 
         if script_file.is_file():
             audio_file = Path(script_folder / f'{script_folder.name}.wav')
-            if not audio_file.is_file():
+            if not self._is_done(item, 'tts', audio_file):
                 print(f'Generating audio... {line}')
-                audio_files = self.tts_generator.generate_audios_from_txt(
-                                                                    input_file=script_file,
-                                                                    output_dir=script_folder)
-                self.audio_editor.input_audio_files = audio_files
-                tts_file = self.audio_editor.merge_audios_with_padding(
-                                                output_dir=script_folder,
-                                                name=script_folder.name)
+                with self.state.stage(item, 'tts') as record:
+                    audio_files = self.tts_generator.generate_audios_from_txt(
+                                                                        input_file=script_file,
+                                                                        output_dir=script_folder)
+                    self.audio_editor.input_audio_files = audio_files
+                    tts_file = self.audio_editor.merge_audios_with_padding(
+                                                    output_dir=script_folder,
+                                                    name=script_folder.name)
+                    record.artifact = tts_file
             else:
                 print(f'{audio_file} already exists. Skipping...')
                 tts_file = audio_file
+                self.state.record_existing(item, 'tts', tts_file)
         # endregion
 
         # region Step 2: GENERATE D-ID VIDEO
@@ -441,40 +660,56 @@ class WorkflowManager:
         # Check if the Text-to-Speech (TTS) file exists
         if tts_file.is_file():
             # Check if the D-ID video file does not exist
-            if not d_id_video.is_file():
+            if not self._is_done(item, 'd_id', d_id_video):
                 print('Generating D-ID video...')
                 # Get the D-ID Basic API tokens from environment variables
-                keys = os.environ.get('D-ID_BASIC_TOKENS')
+                keys = self.settings.d_id_keys
                 # Rotate API keys to ensure a valid key is used for the video generation process
                 self.video_generator.rotate_key(keys=keys)
-                try:
-                    # Create the D-ID talk video using the image and audio from the specified files
-                    id = self.video_generator.create_talk_video(image=str(image_file), audio=str(tts_file))
-                except Exception as e:
-                    # If an error occurs during video generation, print the error and rotate the API keys
-                    print(str(e))
-                    self.video_generator.rotate_key(keys=keys)
-                # Retrieve the generated talk video from D-ID using the generated ID and save it
-                self.video_generator.get_talk(id=id, output_path=d_id_video)
+                with self.state.stage(item, 'd_id') as record:
+                    record.artifact = d_id_video
+                    try:
+                        # Create the D-ID talk video using the image and audio from the specified files
+                        id = self.video_generator.create_talk_video(image=str(image_file), audio=str(tts_file))
+                        record.provider_job_id = id
+                    except Exception as e:
+                        # If an error occurs during video generation, print the error and rotate the API keys
+                        print(str(e))
+                        self.video_generator.rotate_key(keys=keys)
+                    # Retrieve the generated talk video from D-ID using the generated ID and save it
+                    self.video_generator.get_talk(id=id, output_path=d_id_video)
             else:
                 print(f'"{d_id_video}" already exists. Skipping...')
+                self.state.record_existing(item, 'd_id', d_id_video)
         else:
             print(f'"{tts_file}" doesn\'t exists. Exiting...')
             return
         # endregion
 
+        return item, script_folder, d_id_video
+
+    def generate_talking_head_video(self, line: str, thumbnail_line: str, image_file: Path):
+        sources = self.generate_talking_head_sources(line, thumbnail_line, image_file)
+        if sources is None:
+            return
+        item, script_folder, d_id_video = sources
+        final_video = Path(script_folder.parent / (f'{image_file.stem}.mp4'))
+
         # region Step 3: REMOVE D-ID WATERMARK
         # ------------------------------------
         no_watermark_video = Path(script_folder / (image_file.stem + '_no_watermark.mp4'))
 
         if d_id_video.is_file():
-            if not no_watermark_video.is_file():
+            if not self._is_done(item, 'watermark_removal', no_watermark_video):
                 print('Removing watermark in D-ID video...')
-                self.video_editor.input_video = str(d_id_video)
-                no_watermark_video = Path(self.video_editor.remove_d_id_watermark(
-                                                    input_image=str(image_file)))
+                with self.state.stage(item, 'watermark_removal') as record:
+                    self.video_editor.input_video = str(d_id_video)
+                    no_watermark_video = Path(self.video_editor.remove_d_id_watermark(
+                                                        input_image=str(image_file)))
+                    record.artifact = no_watermark_video
             else:
                 print(f'"{no_watermark_video}" already exists. Skipping...')
+                self.state.record_existing(item, 'watermark_removal', no_watermark_video)
         else:
             print(f'"{d_id_video}" doesn\'t exists. Exiting...')
             return
@@ -485,15 +720,18 @@ class WorkflowManager:
         subtitled_video = Path(script_folder / (image_file.stem + '_no_watermark_subtitled.mp4'))
 
         if no_watermark_video.is_file():
-            if not subtitled_video.is_file():
+            if not self._is_done(item, 'subtitles', subtitled_video):
                 print('Generating subtitle...')
-                subtitle_file = self.subtitle_generator.generate_subtitle(input_video=no_watermark_video)
-                modified_subtitle_file = self.subtitle_generator.modify_subtitle(subtitle_file)
-                subtitled_video = Path(self.subtitle_generator.burn_subtitle(
-                                    input_video=no_watermark_video,
-                                    subtitle_file=modified_subtitle_file))
+                with self.state.stage(item, 'subtitles') as record:
+                    subtitle_file = self.subtitle_generator.generate_subtitle(input_video=no_watermark_video)
+                    modified_subtitle_file = self.subtitle_generator.modify_subtitle(subtitle_file)
+                    subtitled_video = Path(self.subtitle_generator.burn_subtitle(
+                                        input_video=no_watermark_video,
+                                        subtitle_file=modified_subtitle_file))
+                    record.artifact = subtitled_video
             else:
                 print(f'"{subtitled_video}" already exists. Skipping...')
+                self.state.record_existing(item, 'subtitles', subtitled_video)
         else:
             print("Video with watermark removed doesn't exists. Exiting...")
             return
@@ -503,15 +741,26 @@ class WorkflowManager:
         # ------------------------------------
         if subtitled_video.is_file():
             # Add music
-            print('Adding music...')
-            self.video_editor.input_video = subtitled_video
-            merged_video = Path(self.video_editor.merge_audio_files_with_fading_effects())
+            merged_video = self._resumed_artifact(item, 'music_merge')
+            if merged_video is None:
+                print('Adding music...')
+                with self.state.stage(item, 'music_merge') as record:
+                    self.video_editor.input_video = subtitled_video
+                    merged_video = Path(self.video_editor.merge_audio_files_with_fading_effects())
+                    record.artifact = merged_video
+            else:
+                print(f'"{merged_video}" already exists. Skipping...')
 
             # Add watermark text
-            print('Adding watermark text...')
             if merged_video.is_file():
-                self.video_editor.input_video = merged_video
-                self.video_editor.add_watermark_text()
+                watermarked_video = self._resumed_artifact(item, 'watermark_text')
+                if watermarked_video is None:
+                    print('Adding watermark text...')
+                    with self.state.stage(item, 'watermark_text') as record:
+                        self.video_editor.input_video = merged_video
+                        record.artifact = self.video_editor.add_watermark_text()
+                else:
+                    print(f'"{watermarked_video}" already exists. Skipping...')
             else:
                 print("Video with added music doesn't exists. Exiting...")
                 return
@@ -525,19 +774,28 @@ class WorkflowManager:
         thumbnail_line = process_text(thumbnail_line)[1]
 
         if no_watermark_video.is_file():
-            first_frame = self.thumbnail_generator.extract_first_frame(video_file=no_watermark_video)
-            thumbnail_image = Path(self.thumbnail_generator.generate_thumbnail_image(
-                input_filename=first_frame.name.split('_')[0],
-                input_image_path=first_frame,
-                text=thumbnail_line))
+            thumbnail_video = self._resumed_artifact(item, 'thumbnail')
+            if thumbnail_video is not None:
+                print(f'"{thumbnail_video}" already exists. Skipping...')
+                thumbnail_image = thumbnail_video
+            else:
+                first_frame = self.thumbnail_generator.grab_first_frame(video_file=no_watermark_video)
+                thumbnail_image = Path(self.thumbnail_generator.generate_thumbnail_image(
+                    input_filename=no_watermark_video.name.split('_')[0],
+                    input_image_path=first_frame,
+                    text=thumbnail_line))
             if thumbnail_image.is_file():
-                print('Generating video with thumbnail...')
-                thumbnail_video = Path(self.thumbnail_generator.generate_thumbnail_video(
-                                                    thumbnail_image_name=thumbnail_image.name))
+                if thumbnail_video is None:
+                    print('Generating video with thumbnail...')
+                    with self.state.stage(item, 'thumbnail') as record:
+                        thumbnail_video = Path(self.thumbnail_generator.generate_thumbnail_video(
+                                                            thumbnail_image_name=thumbnail_image.name))
+                        record.artifact = thumbnail_video
                 if thumbnail_video.is_file():
-                    final_video = Path(script_folder.parent / (f'{image_file.stem}.mp4'))
-                    shutil.copy(thumbnail_video, final_video)
+                    atomic_copy(thumbnail_video, final_video)
+                    self.state.record(item, 'final', DONE, artifact=final_video)
                     print(f'\033[92mFinal video with thumbnail saved to "{final_video}"\033[0m')
+                    self.render_renditions(thumbnail_video, final_video)
                     print()
             else:
                 print("Thumbnail image doesn't exists. Exiting...")
@@ -547,6 +805,18 @@ class WorkflowManager:
             return
         # endregion
 
+    def render_renditions(self, video: Path, final_video: Path):
+        # Write the platform renditions of the settings (RENDITIONS) next to the final video,
+        # e.g. "<name>_tiktok_1080x1920.mp4", decoding the video only once
+        if not self.settings.renditions:
+            return {}
+        print('Rendering renditions...')
+        renditions = self.video_editor.render_renditions(video, self.settings.renditions,
+                                                         output_dir=final_video.parent, basename=final_video.stem)
+        for rendition_video in renditions.values():
+            print(f'\033[92mRendition saved to "{rendition_video}"\033[0m')
+        return renditions
+
     def generate_multiple_talking_head_videos(self, input_dir: Path):
         self.video_generator.set_vidgen_provider('d-id')
 
@@ -577,6 +847,99 @@ class WorkflowManager:
                                                      thumbnail_line=thumbnail_line_outside_text,
                                                      image_file=png_file)
 
+    def distribute_talking_head_videos(self, input_dir: Path, poll_interval: float = 2.0):
+        # Distributed version of generate_multiple_talking_head_videos. This process (the coordinator) runs the
+        # TTS and D-ID stages, which use the API keys and credits, and queues the next stages of every video as
+        # tasks for the workers of the render boxes sharing the task queue (see videofactory/worker.py). The
+        # artifacts reported by the workers are recorded in the state store before the next stage is queued.
+        from .task_queue import DONE as TASK_DONE, FAILED as TASK_FAILED
+        from .worker import PIPELINE, SHARED_OPTIONS
+
+        lines_file = input_dir / "lines.txt"
+        thumbnail_lines_file = input_dir / "thumbnail_lines.txt"
+        lines_list = read_lines(lines_file)
+        thumbnail_lines_list = read_lines(thumbnail_lines_file)
+
+        # Paths are sent as strings, so the payload can be stored as JSON
+        options = {}
+        for name in SHARED_OPTIONS:
+            value = getattr(self.settings, name)
+            options[name] = str(value) if isinstance(value, Path) else value
+        pending = {}  # Task id -> payload
+        finished = []
+
+        def advance(payload: dict, stage_name: str, artifact) -> dict:
+            # The artifact of a stage is the input video of the next one
+            payload = {**payload, 'video': str(artifact)}
+            if stage_name == 'watermark_removal':
+                payload['no_watermark_video'] = str(artifact)
+            return payload
+
+        def queue_next_stage(payload: dict, stage_name: str) -> None:
+            # Queue the first stage from stage_name on that isn't done yet (when resuming). Later stages have a
+            # higher priority, so the workers finish the videos already started before starting new ones.
+            for stage_name in PIPELINE[PIPELINE.index(stage_name):]:
+                artifact = self._resumed_artifact(payload['item'], stage_name)
+                if artifact is None:
+                    task_id = self.task_queue.put(stage_name, payload, priority=PIPELINE.index(stage_name))
+                    pending[task_id] = payload
+                    self.state.record(payload['item'], stage_name, RUNNING, started_at=time.time())
+                    return
+                print(f'"{artifact}" already exists. Skipping...')
+                payload = advance(payload, stage_name, artifact)
+            finished.append(payload['final_video'])
+
+        def collect_results() -> None:
+            for task_id, payload in list(pending.items()):
+                task = self.task_queue.get(task_id)
+                if task is None or task.status not in (TASK_DONE, TASK_FAILED):
+                    continue
+                del pending[task_id]
+                if task.status == TASK_FAILED:
+                    self.state.record(payload['item'], task.kind, FAILED, error=task.error)
+                    print('\033[91m' + f'{task.kind} of "{payload["image"]}" failed: {task.error}' + '\033[0m')
+                    continue
+
+                artifact = Path(task.result['artifact'])
+                self.state.record(payload['item'], task.kind, DONE, artifact=artifact)
+                print('\033[92m' + f'{task.kind} of "{payload["image"]}" done by {task.worker}' + '\033[0m')
+                if task.kind == PIPELINE[-1]:
+                    print(f'\033[92mFinal video with thumbnail saved to "{artifact}"\033[0m')
+                    finished.append(str(artifact))
+                else:
+                    queue_next_stage(advance(payload, task.kind, artifact), PIPELINE[PIPELINE.index(task.kind) + 1])
+
+        for line, thumbnail_line in zip(lines_list, thumbnail_lines_list):
+            line_first_part = process_text(line)[0]
+            thumbnail_first_part, thumbnail_line_outside_text, _ = process_text(thumbnail_line)
+            if line_first_part != thumbnail_first_part:
+                continue
+
+            for png_file in input_dir.glob(f"{line_first_part}*.png"):
+                sources = self.generate_talking_head_sources(line=line, thumbnail_line=thumbnail_line_outside_text,
+                                                             image_file=png_file)
+                if sources is None:
+                    continue
+                item, script_folder, d_id_video = sources
+                queue_next_stage({
+                    'item': item,
+                    'video': str(d_id_video),
+                    'image': str(png_file),
+                    'thumbnail_line': thumbnail_line_outside_text,
+                    'final_video': str(script_folder.parent / f'{png_file.stem}.mp4'),
+                    'options': options,
+                }, PIPELINE[0])
+                # Workers start on the first videos while the next ones are generated
+                collect_results()
+
+        print(f'Waiting for the workers ({len(pending)} tasks pending)...')
+        while pending:
+            time.sleep(poll_interval)
+            collect_results()
+
+        print(f'{len(finished)} videos finished.')
+        return finished
+
     def generate_talking_head_conversation_video(self, input_file: Path, images_dir: Path):
         self.video_generator.set_vidgen_provider('d-id')
 
@@ -617,7 +980,7 @@ class WorkflowManager:
                                 parent_dir=conversation_dir,
                                 folder_name=str(i).zfill(max_line_number)))
             audio_files = []
-            self.tts_generator.set_tts_provider(os.environ.get('TTS_PROVIDER'))
+            self.tts_generator.set_tts_provider(self.settings.tts_provider)
             script_file = script_folder / 'script.txt'
             tts_file = None
 
@@ -643,7 +1006,7 @@ class WorkflowManager:
                 if not d_id_video.is_file():
                     image_file = images_dir / (f'{speakers_list[i-1]}.png')
                     print('Generating D-ID video...')
-                    keys = os.environ.get('D-ID_BASIC_TOKENS')
+                    keys = self.settings.d_id_keys
                     self.video_generator.rotate_key(keys=keys)
                     id = self.video_generator.create_talk_video(image=str(image_file), audio=str(tts_file))
                     self.video_generator.get_talk(id=id, output_path=d_id_video)
@@ -723,7 +1086,7 @@ class WorkflowManager:
         # Add thumbnail
         first_no_watermark_file = Path(conversation_dir / (f'{str(1).zfill(max_line_number)}_no_watermark.mp4'))
         if first_no_watermark_file.is_file():
-            first_frame = self.thumbnail_generator.extract_first_frame(video_file=first_no_watermark_file)
+            first_frame = self.thumbnail_generator.grab_first_frame(video_file=first_no_watermark_file)
             thumbnail_image = Path(self.thumbnail_generator.generate_thumbnail_image(
                 input_filename=input_file.stem,
                 input_image_path=first_frame,
@@ -734,8 +1097,9 @@ class WorkflowManager:
                                                     thumbnail_image_name=thumbnail_image.name))
                 if thumbnail_video.is_file():
                     final_video = Path(conversation_dir.parent / (f'{input_file.stem}.mp4'))
-                    shutil.copy(thumbnail_video, final_video)
+                    atomic_copy(thumbnail_video, final_video)
                     print(f'\033[92mFinal video with thumbnail saved to "{final_video}"\033[0m')
+                    self.render_renditions(thumbnail_video, final_video)
                     print()
             else:
                 print("Thumbnail image doesn't exists. Exiting...")
@@ -745,10 +1109,11 @@ class WorkflowManager:
             return
         # endregion
 
-    @staticmethod
-    def enhance_videos_with_ai(videos_dir: Path, encoder: str):
-        # Set the working directory from the environment variable
-        working_directory = os.getenv('TVAI_WORKING_DIR')
+    def enhance_videos_with_ai(self, videos_dir: Path, encoder: str):
+        # Set the working directory from the settings (TVAI_WORKING_DIR)
+        working_directory = self.settings.tvai_working_dir
+        # Encoding settings of the final H.264 conversion
+        encoder_profile = load_encoder_profile(self.settings.encoder_profile, self.settings.assets_dir)
 
         try:
             # Process all mp4 and mov files in the directory
@@ -765,10 +1130,15 @@ class WorkflowManager:
 
                     if output_path.is_file():
                         print(f'Converting the video to H.264 codec... "{output_h264_path}"')
-                        cmd_h264 = f'ffmpeg -i "{output_path}" -c:v libx264 -crf 23 -c:a aac -b:a 128k "{output_h264_path}"'  # noqa
-                        # Run the ffmpeg command and suppress output
-                        subprocess.run(cmd_h264, shell=True, check=True,
-                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                        cmd_h264 = FFmpegCommand()
+                        cmd_h264.input(output_path)
+                        # Only the speed settings of the profile: Topaz output is often upscaled (1440p, 4K) beyond
+                        # the H.264 level and bitrates the profile sets for the portrait videos, so x264 picks them
+                        cmd_h264.output(output_h264_path, '-c:v', encoder_profile.video_codec,
+                                        *encoder_profile.speed_args(), *encoder_profile.audio_args())
+                        # Run the ffmpeg command (stderr is only reported on failure)
+                        with stage('h264_conversion'):
+                            cmd_h264.run()
 
                         # Delete the original enhanced video file (output_path)
                         os.remove(output_path)
@@ -777,7 +1147,7 @@ class WorkflowManager:
                 else:
                     print(f'{output_h264_path} already exists. Skipping...')
 
-        except subprocess.CalledProcessError as e:
+        except FFmpegError as e:
             print("Command failed:", e)
 
     def generate_video_from_image(self, image_file: Path, output_dir=None, output_path=None,
@@ -786,7 +1156,7 @@ class WorkflowManager:
 
         print('Generating Gen-2 video...')
         # Get the Gen-2 Bearer API tokens from environment variables
-        keys = os.environ.get('GEN_2_BEARER_TOKENS')
+        keys = self.settings.gen_2_keys
         # Rotate API keys to ensure a valid key is used for the video generation process
         try:
             username, _, _, _ = self.video_generator.rotate_key(keys=keys)
@@ -809,7 +1179,8 @@ class WorkflowManager:
         return self.video_generator.generate_video_from_image(image_file, username, upload_url, preview_upload_url,
                                                               output_dir, output_path, seed, interpolate)
 
-    def generate_multiple_ai_videos_from_images(self, images_dir: Path):
+    def generate_multiple_ai_videos_from_images(self, images_dir: Path, num_repeats: int = None,
+                                                images_at_a_time: int = None):
         self.video_generator.set_vidgen_provider('gen-2')
         error_occurred = False  # Flag to track if an error occurred
 
@@ -818,13 +1189,26 @@ class WorkflowManager:
             if future.exception() is not None and isinstance(future.exception(), LastKeyReachedException):
                 error_occurred = True
 
+        def generate_checkpointed_video(png_file, repeat_index):
+            # Every (image, repeat) is an item of the state store, so a resumed run only generates the missing ones
+            item = self.state.item('ai-videos', f'{png_file}#{repeat_index}')
+            if self.settings.resume:
+                video = self.state.verified_artifact(item, 'gen_2')
+                if video is not None:
+                    print(f'"{video}" already exists. Skipping...')
+                    return video
+            with self.state.stage(item, 'gen_2') as record:
+                record.artifact = self.generate_video_from_image(png_file)
+            return record.artifact
+
         def process_single_image(png_file):
             with ThreadPoolExecutor() as inner_executor:
                 nonlocal error_occurred  # To access the flag variable defined in the outer function
                 futures = []
                 for repeat_index in range(1, num_repeats + 1):
                     print(f"Repeat: {repeat_index}/{num_repeats}")
-                    future = inner_executor.submit(self.generate_video_from_image, png_file)
+                    future = inner_executor.submit(with_current_context(generate_checkpointed_video),
+                                                   png_file, repeat_index)
                     futures.append(future)
 
                 # Check for exceptions
@@ -838,7 +1222,8 @@ class WorkflowManager:
             print("No PNG files found in the folder.")
             return
 
-        while True:
+        # Prompt only for the values that were not provided (non-interactive runs pass both)
+        while num_repeats is None:
             try:
                 num_repeats = int(input("Enter the number of times to process each image: "))
                 break
@@ -846,11 +1231,12 @@ class WorkflowManager:
                 print("Invalid input. Please enter a valid integer.")
 
         if num_repeats == 1:
-            while True:
+            while images_at_a_time is None:
                 try:
                     images_at_a_time = int(input("Enter the number of images to process at a time: "))
                     if images_at_a_time <= 0:
                         print("Please enter a positive integer.")
+                        images_at_a_time = None
                     else:
                         break
                 except ValueError:
@@ -863,7 +1249,7 @@ class WorkflowManager:
                         break  # Exit the loop if error_occurred is True
 
                     print(f"\nProcessing: {png_file.name} (File {png_index}/{len(png_files)})")
-                    future = executor.submit(process_single_image, png_file)
+                    future = executor.submit(with_current_context(process_single_image), png_file)
                     futures.append(future)
 
                     if png_index % images_at_a_time == 0:
@@ -890,9 +1276,14 @@ class WorkflowManager:
         if error_occurred:
             return
 
-    def generate_single_ai_video_from_image(self, image_file: Path, num_videos_to_generate: int, keep_same_seed: bool):
+    def generate_single_ai_video_from_image(self, image_file: Path, num_videos_to_generate: int, keep_same_seed: bool,
+                                            pipelined: bool = False):
         self.video_generator.set_vidgen_provider('gen-2')
 
+        if pipelined:
+            return self.generate_single_ai_video_from_image_pipelined(image_file, num_videos_to_generate,
+                                                                      keep_same_seed)
+
         seed = self.video_generator.generate_random_seed()
         init_video_file = self.generate_video_from_image(image_file=image_file, seed=seed)
         input_videos = [str(init_video_file)]
@@ -929,3 +1320,91 @@ class WorkflowManager:
             joined_video = self.video_editor.join_videos_without_audio(input_videos=input_videos,
                                                                        output_filepath=output_filepath)
             print('\033[92m' + f'Videos successfully joined and saved to "{joined_video}"' + '\033[0m')
+
+    def _prepare_gen_2_upload(self, keys: str, image_filename: str):
+        # Rotate API keys and reserve the upload slots (steps 0, 1 and 4) before the image exists
+        username, _, _, _ = self.video_generator.rotate_key(keys=keys)
+        return username, self.video_generator.prepare_image_upload(image_filename)
+
+    def generate_single_ai_video_from_image_pipelined(self, image_file: Path, num_videos_to_generate: int,
+                                                      keep_same_seed: bool):
+        self.video_generator.set_vidgen_provider('gen-2')
+
+        print('Generating Gen-2 videos (pipelined)...')
+        # Get the Gen-2 Bearer API tokens from environment variables
+        keys = self.settings.gen_2_keys
+
+        seed = self.video_generator.generate_random_seed()
+        image_filename = image_file.name
+        image = image_file
+        input_videos = []
+
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            username, prepared_upload = self._prepare_gen_2_upload(keys, image_filename)
+
+            for i in range(1, num_videos_to_generate + 1):
+                if not username:
+                    print("Username is missing or empty. Aborting...")
+                    return
+
+                # Finish the upload of the current image and start the generation task
+                upload_url, preview_upload_url = self.video_generator.finish_image_upload(
+                                                                image_filename, image, prepared_upload)
+                if not upload_url or not preview_upload_url:
+                    print("Upload URL is missing or empty. Aborting...")
+                    return
+                url_future = self.video_generator.submit_video_from_image(username, upload_url, preview_upload_url,
+                                                                          seed=seed, interpolate=True)
+
+                # While Gen-2 renders this iteration, reserve the upload slots for the next one.
+                # The key is rotated here rather than in the prefetch thread: rotating changes the key and headers
+                # of the shared client, and nothing of this iteration uses them any more (the poller keeps a copy
+                # of the task's headers, and the download needs none)
+                next_seed = seed if keep_same_seed else self.video_generator.generate_random_seed()
+                if i < num_videos_to_generate:
+                    next_image_filename = f'{image_file.stem}_{next_seed}_iteration_{i + 1}_last_frame.png'
+                    next_username, _, _, _ = self.video_generator.rotate_key(keys=keys)
+                    prepared_future = prefetcher.submit(with_current_context(self.video_generator.prepare_image_upload),
+                                                        next_image_filename)
+
+                generated_video_url = url_future.result()
+                print(f'(Step 13) Generated video URL: {generated_video_url}')
+                if not generated_video_url:
+                    print("Generated video URL is missing or empty. Aborting...")
+                    return
+
+                # Keep the same file names as the sequential mode
+                if i == 1:
+                    video_file = image_file.parent / f'{image_file.stem}_{seed}.mp4'
+                else:
+                    video_file = image_file.parent / f'{image_file.stem}_{seed}_iteration_{i}.mp4'
+                self.video_generator.vidgen.download_video(generated_video_url, video_file)
+                input_videos.append(str(video_file))
+
+                if i < num_videos_to_generate:
+                    # Grab the last frame in memory; it becomes the input image of the next iteration
+                    image = self.video_editor.extract_last_frame_data(video_file)
+                    if image is None:
+                        print(f'Failed to extract the last frame of "{video_file}". Aborting...')
+                        return
+                    image_filename = next_image_filename
+                    username, prepared_upload = next_username, prepared_future.result()
+                    seed = next_seed
+
+        if num_videos_to_generate == 1:
+            return Path(input_videos[0])
+
+        # Determine the base filename
+        init_video_file = Path(input_videos[0])
+        base_filename = f'{init_video_file.stem}_joined_{num_videos_to_generate}_iterations.mp4'
+        # Update the base filename if keep_same_seed is False
+        if not keep_same_seed:
+            base_filename = f'{image_file.stem}_joined_{num_videos_to_generate}_iterations.mp4'
+        output_filepath = init_video_file.with_name(base_filename)
+
+        print('\nJoining the videos...')
+        joined_video = self.video_editor.join_videos_without_audio(input_videos=input_videos,
+                                                                   output_filepath=output_filepath)
+        print('\033[92m' + f'Videos successfully joined and saved to "{joined_video}"' + '\033[0m')
+
+        return Path(joined_video)